@@ -0,0 +1,38 @@
+"""
+负载测试用的替身执行器，代替 `robocorp.tasks run robots/workflow_executor.py`。
+
+由 `webapp/app.py` 通过 `EXECUTOR_COMMAND` 启动，读取 `RC_WORKITEM_INPUT_PATH` 指向的工作项，
+在工作项目录中写入 `fake_executor.json`（启动时间，用于计算任务启动延迟），模拟执行耗时后退出：
+
+    python benchmarks/fake_executor.py --duration 2 --jitter 1 --fail-rate 0.05
+"""
+from typing import List, Optional
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    started_at = time.time()
+    parser = argparse.ArgumentParser(description="Stand-in for the workflow executor during load tests.")
+    parser.add_argument('--duration', type=float, default=1.0, help="Mean simulated run time in seconds.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- variation of the run time.")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fraction of runs exiting with code 1.")
+    args = parser.parse_args(argv)
+
+    input_path = os.environ['RC_WORKITEM_INPUT_PATH']
+    with open(input_path, 'r', encoding='utf-8') as f:
+        work_items = json.load(f)
+    file_paths = work_items[0]['payload'].get('file_paths', [])
+    with open(os.path.join(os.path.dirname(input_path), 'fake_executor.json'), 'w', encoding='utf-8') as f:
+        json.dump({'started_at': started_at, 'pid': os.getpid(), 'files': len(file_paths)}, f)
+
+    time.sleep(max(0.0, args.duration + random.uniform(-args.jitter, args.jitter)))
+    return 1 if random.random() < args.fail_rate else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+执行器启动基准：在全新的解释器中导入 `robots/workflow_executor.py`，测量导入耗时并列出最慢的模块。
+
+    python benchmarks/import_time.py               # 只导入执行器（浏览器动作工作流的启动开销）
+    python benchmarks/import_time.py --action ai_fill_reimbursement_excel --runs 10
+
+`--action` 额外加载该动作的处理模块，用于对比 AI/Excel 依赖的导入成本。
+"""
+from typing import Dict, List, Optional
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _import_statement(action: Optional[str]) -> str:
+    statement = "import robots.workflow_executor"
+    if action:
+        statement += f"; from src.action_registry import get_action_handler; get_action_handler({action!r})"
+    return statement
+
+
+def measure_once(action: Optional[str] = None) -> Dict:
+    """在子进程中执行一次导入，返回总耗时（秒）和 -X importtime 的每模块累计耗时（微秒）。"""
+    code = f"import time; t = time.perf_counter(); {_import_statement(action)}; print(time.perf_counter() - t)"
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True)
+    modules = {}
+    for line in completed.stderr.splitlines():
+        # 格式: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return {'seconds': float(completed.stdout.strip().splitlines()[-1]), 'modules': modules}
+
+
+def run_benchmark(runs: int = 5, action: Optional[str] = None, top: int = 15) -> Dict:
+    samples = [measure_once(action) for _ in range(runs)]
+    seconds = [s['seconds'] for s in samples]
+    # 只看顶层包，避免子模块重复计入
+    last = samples[-1]['modules']
+    slowest = sorted(((name, us) for name, us in last.items() if '.' not in name), key=lambda x: -x[1])[:top]
+    return {
+        'runs': runs,
+        'action': action,
+        'median_seconds': statistics.median(seconds),
+        'min_seconds': min(seconds),
+        'slowest_packages': slowest,
+        'loaded_ai_stack': 'src.ai_services' in last,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure workflow executor import time.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--action', help="Also load the handler module for this action.")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest packages to list.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.runs, args.action, args.top)
+    print(f"Import time over {report['runs']} runs: median {report['median_seconds'] * 1000:.1f} ms, "
+          f"min {report['min_seconds'] * 1000:.1f} ms (AI stack loaded: {report['loaded_ai_stack']})")
+    for name, us in report['slowest_packages']:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
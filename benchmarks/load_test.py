@@ -0,0 +1,277 @@
+"""
+`/api/tasks` 提交链路的负载测试。
+
+启动一个使用替身执行器（`benchmarks/fake_executor.py`）的 API 服务（`webapp/serve.py`），按场景
+（`benchmarks/load_scenarios.yaml`）逐级提高并发，提交不同大小的多文件 multipart 上传，报告每一级的:
+
+- 请求延迟 p50/p90/p99、吞吐量和错误率（非 2xx 或连接失败）；
+- 任务启动延迟：从发出请求到替身执行器进程开始运行的时间；
+- `devdata/running_work_items` 的磁盘增长和服务进程的内存峰值（RSS，仅 Linux）。
+
+    python benchmarks/load_test.py smoke
+    python benchmarks/load_test.py month_end_burst --threads 32 --report output/load_test/month_end.json
+    python benchmarks/load_test.py smoke --url http://127.0.0.1:5001  # 压测已在运行的服务（不启动替身执行器）
+
+默认在结束后删除本次产生的工作项目录，`--keep-artifacts` 保留。
+"""
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+import yaml
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCENARIOS_PATH = os.path.join(PROJECT_ROOT, 'benchmarks', 'load_scenarios.yaml')
+WORK_ITEMS_DIR = os.path.join(PROJECT_ROOT, 'devdata', 'running_work_items')
+
+
+def load_scenarios(path: str = SCENARIOS_PATH) -> Dict[str, Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)['scenarios']
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩百分位数，空列表返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def make_receipt(size_kb: int) -> bytes:
+    """随机内容的 "PDF"，内容各不相同，不会被幂等层合并。"""
+    header = b'%PDF-1.4\n'
+    return header + os.urandom(max(0, size_kb * 1024 - len(header)))
+
+
+def pick_files(scenario: Dict, rng: random.Random) -> List[tuple]:
+    low, high = scenario.get('files_per_request', [1, 1])
+    sizes = scenario.get('receipt_sizes_kb', {100: 1})
+    chosen = rng.choices([int(s) for s in sizes], weights=list(sizes.values()), k=rng.randint(low, high))
+    return [('files', (f"receipt_{i}_{size}kb.pdf", make_receipt(size), 'application/pdf'))
+            for i, size in enumerate(chosen)]
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass # 执行器可能正在写入或删除
+    return total
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """在后台线程中采样服务进程的 RSS，记录峰值。"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def start_server(port: int, threads: int, executor: Dict, drain_timeout: float) -> subprocess.Popen:
+    """启动使用替身执行器的 API 服务，等待其可以接受请求。"""
+    env = os.environ.copy()
+    env['WORK_QUEUE_ENABLED'] = 'false'
+    env['EXECUTOR_COMMAND'] = shlex.join([
+        sys.executable, os.path.join(PROJECT_ROOT, 'benchmarks', 'fake_executor.py'),
+        '--duration', str(executor.get('duration', 1.0)),
+        '--jitter', str(executor.get('jitter', 0.0)),
+        '--fail-rate', str(executor.get('fail_rate', 0.0)),
+    ])
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, 'webapp', 'serve.py'), '--port', str(port),
+         '--threads', str(threads), '--drain-timeout', str(drain_timeout)],
+        cwd=PROJECT_ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API server exited with code {server.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("API server did not start within 30 seconds")
+
+
+def submit(url: str, workflow_id: str, files: List[tuple]) -> Dict:
+    sent_at = time.time()
+    started = time.perf_counter()
+    result = {'sent_at': sent_at, 'bytes': sum(len(f[1][1]) for f in files), 'task_id': None, 'error': None}
+    try:
+        response = requests.post(f"{url}/api/tasks", data={'workflow_id': workflow_id}, files=files, timeout=300)
+        result['status'] = response.status_code
+        body = response.json() if response.headers.get('Content-Type', '').startswith('application/json') else {}
+        result['task_id'] = body.get('task_id')
+        if not response.ok:
+            result['error'] = body.get('error') or response.text[:200]
+    except requests.RequestException as e:
+        result['status'] = None
+        result['error'] = str(e)
+    result['latency'] = time.perf_counter() - started
+    return result
+
+
+def launch_lags(results: List[Dict], timeout: float) -> List[float]:
+    """等待替身执行器写入启动标记，返回每个任务从发出请求到执行器启动的秒数。"""
+    pending = {r['task_id']: r['sent_at'] for r in results if r['task_id'] and r['status'] == 200}
+    lags = []
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        for task_id, sent_at in list(pending.items()):
+            marker = os.path.join(WORK_ITEMS_DIR, task_id, 'fake_executor.json')
+            try:
+                with open(marker, 'r', encoding='utf-8') as f:
+                    lags.append(json.load(f)['started_at'] - sent_at)
+                del pending[task_id]
+            except (OSError, ValueError):
+                pass # 尚未写入或正在写入
+        if pending:
+            time.sleep(0.2)
+    return lags
+
+
+def run_stage(url: str, scenario: Dict, stage: Dict, rng: random.Random, server_pid: Optional[int],
+              measure_launch: bool) -> Dict:
+    # 先生成所有上传内容，避免把生成随机数据的时间算进请求延迟
+    uploads = [pick_files(scenario, rng) for _ in range(stage['requests'])]
+    disk_before = dir_size(WORK_ITEMS_DIR)
+    started = time.perf_counter()
+    with RssSampler(server_pid) as sampler, ThreadPoolExecutor(max_workers=stage['concurrency']) as pool:
+        results = list(pool.map(lambda files: submit(url, scenario['workflow_id'], files), uploads))
+        elapsed = time.perf_counter() - started
+        lags = launch_lags(results, timeout=30) if measure_launch else []
+
+    latencies = [r['latency'] for r in results]
+    errors = [r for r in results if r['error']]
+    return {
+        'concurrency': stage['concurrency'],
+        'requests': len(results),
+        'throughput_rps': len(results) / elapsed if elapsed else None,
+        'upload_mb': sum(r['bytes'] for r in results) / (1024 * 1024),
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'error_rate': len(errors) / len(results) if results else 0.0,
+        'errors': sorted({str(r['status']) + ': ' + str(r['error'])[:120] for r in errors})[:5],
+        'launch_lag_p50': percentile(lags, 50),
+        'launch_lag_p95': percentile(lags, 95),
+        'launched': len(lags),
+        'disk_growth_mb': (dir_size(WORK_ITEMS_DIR) - disk_before) / (1024 * 1024),
+        'server_rss_peak_mb': sampler.peak / (1024 * 1024) if sampler.peak else None,
+        'task_ids': [r['task_id'] for r in results if r['task_id']],
+    }
+
+
+def _fmt(value, spec: str = '.3f') -> str:
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(scenario_name: str, stages: List[Dict]):
+    print(f"\nScenario: {scenario_name}")
+    print(f"{'conc':>5} {'reqs':>5} {'rps':>7} {'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'err %':>6} "
+          f"{'lag p50':>8} {'lag p95':>8} {'disk MB':>8} {'rss MB':>7}")
+    for s in stages:
+        print(f"{s['concurrency']:>5} {s['requests']:>5} {_fmt(s['throughput_rps'], '.1f'):>7} "
+              f"{_fmt(s['latency_p50']):>7} {_fmt(s['latency_p90']):>7} {_fmt(s['latency_p99']):>7} "
+              f"{s['error_rate'] * 100:>6.1f} {_fmt(s['launch_lag_p50']):>8} {_fmt(s['launch_lag_p95']):>8} "
+              f"{s['disk_growth_mb']:>8.1f} {_fmt(s['server_rss_peak_mb'], '.0f'):>7}")
+        for error in s['errors']:
+            print(f"      ! {error}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the task submission API.")
+    parser.add_argument('scenario', help="Scenario name from the scenarios file.")
+    parser.add_argument('--scenarios', default=SCENARIOS_PATH)
+    parser.add_argument('--url', help="Target an already running server instead of starting one with the fake executor.")
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--threads', type=int, default=16, help="Server worker threads.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help="Write the JSON report to this path.")
+    parser.add_argument('--keep-artifacts', action='store_true', help="Keep the work item directories created by the run.")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenarios(args.scenarios)[args.scenario]
+    rng = random.Random(args.seed)
+    executor = scenario.get('executor', {})
+    server = None
+    if not args.url:
+        drain_timeout = executor.get('duration', 1.0) + executor.get('jitter', 0.0) + 5
+        server = start_server(args.port, args.threads, executor, drain_timeout)
+    url = (args.url or f"http://127.0.0.1:{args.port}").rstrip('/')
+
+    stages = []
+    try:
+        for stage in scenario['stages']:
+            stages.append(run_stage(url, scenario, stage, rng, server.pid if server else None,
+                                    measure_launch=server is not None))
+    finally:
+        if server is not None:
+            server.terminate() # 服务会排空替身执行器后退出
+            server.wait()
+        if not args.keep_artifacts:
+            for stage in stages:
+                for task_id in stage['task_ids']:
+                    shutil.rmtree(os.path.join(WORK_ITEMS_DIR, task_id), ignore_errors=True)
+
+    print_report(args.scenario, stages)
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'scenario': args.scenario, 'settings': scenario, 'threads': args.threads,
+                       'stages': [{k: v for k, v in s.items() if k != 'task_ids'} for s in stages]},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\nReport written to {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Work queue worker.
+
+Pulls tasks from the durable work queue (src/work_queue.py) and runs each one through the
+workflow executor in a subprocess. Start as many workers as the machine (or machines sharing
+the queue database) can afford:
+
+    python robots/queue_worker.py --worker-id host-a-1
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Add the project root to the Python path for module imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.metrics_config import configure_metrics_dir
+configure_metrics_dir() # Must run before anything imports prometheus_client
+
+from src.work_queue import WorkQueue, LeaseLostError
+from src.metrics import mark_process_dead
+from src.workflow_validator import validate_workflow_file, has_errors, format_issue
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+
+def run_work_item(queue: WorkQueue, item: dict, worker_id: str, visibility_timeout: float):
+    """Runs one leased item through the workflow executor and reports the outcome to the queue."""
+    payload = item['payload']
+    workflow_file = payload.get('workflow_file')
+
+    # Broken workflows will never succeed, so they go straight to the review queue.
+    issues = validate_workflow_file(workflow_file) if workflow_file else [
+        {'level': 'error', 'step': 'workflow', 'message': 'No workflow_file specified.'}]
+    if has_errors(issues):
+        errors = "; ".join(format_issue(i) for i in issues if i['level'] == 'error')
+        logging.error(f"Work item {item['id']} has an invalid workflow: {errors}")
+        queue.fail(item['id'], worker_id, errors, retryable=False)
+        return
+
+    run_dir = os.path.join(project_root, 'devdata', 'running_work_items', item['id'], f"attempt_{item['attempts']}")
+    os.makedirs(run_dir, exist_ok=True)
+    input_path = os.path.join(run_dir, 'work-items.json')
+    output_path = os.path.join(run_dir, 'work-items-out.json')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        json.dump([{"payload": payload, "files": {}}], f, ensure_ascii=False)
+
+    task_env = os.environ.copy()
+    task_env['RC_WORKITEM_INPUT_PATH'] = input_path
+    task_env['RC_WORKITEM_OUTPUT_PATH'] = output_path
+    command = [
+        sys.executable, '-m', 'robocorp.tasks',
+        'run', os.path.join(project_root, 'robots', 'workflow_executor.py'),
+        '--task', 'run_workflow'
+    ]
+
+    logging.info(f"Worker {worker_id} running work item {item['id']} (attempt {item['attempts']}/{item['max_attempts']})")
+    process = subprocess.Popen(command, cwd=project_root, env=task_env)
+    last_heartbeat = time.monotonic()
+    try:
+        while process.poll() is None:
+            time.sleep(1)
+            if time.monotonic() - last_heartbeat > visibility_timeout / 3:
+                queue.extend_lease(item['id'], worker_id, visibility_timeout)
+                last_heartbeat = time.monotonic()
+    except LeaseLostError:
+        logging.error(f"Lost the lease on {item['id']}; stopping the executor so the new owner runs it alone.")
+        process.terminate()
+        process.wait()
+        return
+    finally:
+        # The executor's own atexit hook does not run when it is killed or crashes
+        mark_process_dead(process.pid)
+
+    if process.returncode == 0:
+        result = None
+        if os.path.exists(output_path):
+            with open(output_path, 'r', encoding='utf-8') as f:
+                result = {"outputs": json.load(f)}
+        queue.complete(item['id'], worker_id, result)
+        logging.info(f"Work item {item['id']} completed.")
+    else:
+        queue.fail(item['id'], worker_id, f"Workflow executor exited with code {process.returncode}.")
+        logging.warning(f"Work item {item['id']} failed with exit code {process.returncode}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run workflow tasks from the durable work queue.")
+    parser.add_argument('--worker-id', default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument('--visibility-timeout', type=float, default=600, help="Lease duration in seconds.")
+    parser.add_argument('--poll-interval', type=float, default=2, help="Seconds to wait when the queue is empty.")
+    parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+    args = parser.parse_args()
+
+    queue = WorkQueue()
+    logging.info(f"Worker {args.worker_id} polling {queue.db_path}")
+    while True:
+        item = queue.lease(args.worker_id, args.visibility_timeout)
+        if item is None:
+            if args.once:
+                break
+            time.sleep(args.poll_interval)
+            continue
+        try:
+            run_work_item(queue, item, args.worker_id, args.visibility_timeout)
+        except LeaseLostError as e:
+            logging.error(str(e))
+
+if __name__ == '__main__':
+    main()
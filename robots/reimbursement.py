@@ -17,14 +17,23 @@ def run_reimbursement_process():
     
     try:
         for item in inputs:
-            process_single_item(item)
+            with ACTIVE_TASKS.labels(task='run_reimbursement_process').track_inprogress():
+                try:
+                    profiling = profiling_options(item.payload.get("profiling"))
+                except ValueError as e:
+                    logging.error(f"Invalid profiling options for work item {item.id}: {e}")
+                    profiling = None
+                with profile_task(profiling, f"reimbursement_{item.id}"):
+                    process_single_item(item)
     except Exception as e:
         logging.error(f"An unexpected error occurred in the main process: {e}")
 
     logging.info("Reimbursement process finished.")
 
 import os
+import csv
 import json
+import time
 
 REVIEW_QUEUE_DIR = "review_queue"
 
@@ -41,16 +50,26 @@ def process_single_item(item):
             raise FileNotFoundError(f"File not found at path: {file_path}")
         logging.info(f"Acquired file: {file_path}")
 
+        # Already submitted files are rejected before spending an LLM call on them
+        file_hash = file_content_hash(file_path)
+        index = get_invoice_index()
+        if index:
+            index.check(STAGE_SUBMISSION, file_hash=file_hash)
+
         # 2. Intelligent Recognition & Extraction Module
         extracted_data = extract_document_data(file_path)
         logging.info(f"Extracted data: {extracted_data}")
 
         # 3. Business System Interaction Module
-        reimbursement_id = interact_with_business_system(extracted_data)
+        reimbursement_id = interact_with_business_system(extracted_data, file_hash=file_hash)
         logging.info(f"Successfully created reimbursement with ID: {reimbursement_id}")
 
         item.done()
 
+    except DuplicateInvoiceError as e:
+        # Duplicates need no review; re-queueing them is what made them come back
+        logging.warning(f"Duplicate invoice in work item {item.id}: {e}")
+        item.fail(exception_type="BUSINESS", code="DUPLICATE_INVOICE", message=str(e))
     except (ValueError, ConnectionError) as e:
         logging.error(f"Data or AI Service Error for work item {item.id}: {e}")
         item.fail(exception_type="BUSINESS", code="DATA_AI_ERROR", message=str(e))
@@ -81,6 +100,10 @@ def save_for_review(item):
 
 
 from src.ai_services import extract_document_data
+from src.document_reader import file_content_hash
+from src.invoice_index import STAGE_SUBMISSION, DuplicateInvoiceError, get_invoice_index
+from src.metrics import ACTIVE_TASKS
+from src.task_profiler import profile_task, profiling_options
 
 @task
 def submit_reviewed_data(invoice_number: str, amount: str, date: str):
@@ -102,6 +125,117 @@ def submit_reviewed_data(invoice_number: str, amount: str, date: str):
         # In a real scenario, you might want to notify the user here
         raise
 
+@task
+def submit_reviewed_batch(source: str, report_path: str = "output/reviewed_batch_report.json", remove_from_queue: bool = False):
+    """
+    Submits a batch of manually reviewed records using a single browser session.
+
+    `source` is either a JSON/CSV file of corrected records or a comma-separated
+    list of review queue IDs. The task logs in once, submits every record by
+    re-navigating within the same session, keeps going past individual failures
+    and writes a per-record result report to `report_path`.
+    """
+    logging.info(f"Starting batch submission for reviewed data from: {source}")
+    records = load_reviewed_records(source)
+    results = submit_claims_in_session(records)
+
+    if remove_from_queue:
+        for result in results:
+            if result["status"] == "SUCCESS" and result.get("review_file"):
+                os.remove(result["review_file"])
+                logging.info(f"Removed submitted item from review queue: {result['review_file']}")
+
+    report_dir = os.path.dirname(report_path)
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+
+    succeeded = sum(1 for r in results if r["status"] == "SUCCESS")
+    logging.info(f"Batch submission finished: {succeeded}/{len(results)} succeeded. Report saved to {report_path}")
+
+def load_reviewed_records(source: str) -> list:
+    """
+    Loads corrected records from a JSON file, a CSV file or review queue IDs.
+    Every record is returned as {"record_id", "data", "review_file"}. A review queue ID
+    that is missing or has no reviewed data gets an "error" key instead of aborting the
+    batch, and is reported as FAILED without being submitted.
+    """
+    records = []
+    if source.lower().endswith(".json"):
+        with open(source, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        if isinstance(loaded, dict):
+            loaded = loaded.get("records", [])
+        for index, data in enumerate(loaded):
+            records.append({"record_id": str(data.get("id", index)), "data": data, "review_file": None})
+    elif source.lower().endswith(".csv"):
+        with open(source, 'r', encoding='utf-8-sig', newline='') as f:
+            for index, data in enumerate(csv.DictReader(f)):
+                records.append({"record_id": str(data.get("id") or index), "data": data, "review_file": None})
+    else:
+        for item_id in [i.strip() for i in source.split(",") if i.strip()]:
+            review_file_path = os.path.join(REVIEW_QUEUE_DIR, f"{item_id}.json")
+            record = {"record_id": item_id, "data": {}, "review_file": review_file_path}
+            if not os.path.exists(review_file_path):
+                record["error"] = f"Review queue item not found: {review_file_path}"
+                record["review_file"] = None
+            else:
+                with open(review_file_path, 'r', encoding='utf-8') as f:
+                    review_data = json.load(f)
+                # The raw payload only holds file paths; submitting it would file a blank claim
+                data = review_data.get("corrected_data") or review_data.get("extracted_data")
+                if data:
+                    record["data"] = data
+                else:
+                    record["error"] = f"Review queue item {item_id} has no corrected or extracted data."
+            records.append(record)
+    return records
+
+def submit_claims_in_session(records: list) -> list:
+    """
+    Logs in once and submits each record in the same browser session.
+    A failed record is reported and the session is re-established before the next one.
+    """
+    results = []
+    session_ready = False
+    for record in records:
+        data = record["data"]
+        result = {
+            "record_id": record["record_id"],
+            "invoice_number": str(data.get("invoice_number", "")),
+            "review_file": record.get("review_file"),
+        }
+        if record.get("error"):
+            logging.error(f"Skipping record {record['record_id']}: {record['error']}")
+            result.update(status="FAILED", error=record["error"], duration_seconds=0.0)
+            results.append(result)
+            continue
+        start_time = time.monotonic()
+        try:
+            if not session_ready:
+                open_business_system()
+                session_ready = True
+            result["reimbursement_id"] = submit_claim(data)
+            result["status"] = "SUCCESS"
+        except DuplicateInvoiceError as e:
+            logging.warning(f"Skipping duplicate record {record['record_id']}: {e}")
+            result["status"] = "DUPLICATE"
+            result["error"] = str(e)
+        except Exception as e:
+            logging.error(f"Failed to submit record {record['record_id']}: {e}")
+            result["status"] = "FAILED"
+            result["error"] = str(e)
+            session_ready = False
+            try:
+                os.makedirs("output", exist_ok=True)
+                page().screenshot(path=f"output/error_screenshot_batch_{record['record_id']}.png")
+            except Exception as screenshot_e:
+                logging.error(f"Failed to take screenshot for record {record['record_id']}: {screenshot_e}")
+        result["duration_seconds"] = round(time.monotonic() - start_time, 3)
+        results.append(result)
+    return results
+
 from robocorp.browser import page
 
 def login_to_system():
@@ -129,22 +263,58 @@ def verify_submission() -> str:
     logging.info(f"Got confirmation message: {success_message}")
     return success_message
 
-def interact_with_business_system(data: dict) -> str:
+BUSINESS_SYSTEM_URL = "http://127.0.0.1:5001/"
+
+def open_business_system():
+    """Opens the reimbursement system and logs in."""
+    logging.info(f"Opening browser to interact with local reimbursement system at {BUSINESS_SYSTEM_URL}")
+    page().goto(BUSINESS_SYSTEM_URL)
+    login_to_system()
+
+def submit_claim(data: dict) -> str:
     """
-    Interacts with the local web reimbursement system to file a claim.
+    Files a single claim within an already logged-in session.
+    Re-navigates to the form so that consecutive claims start from a clean page.
+    Raises DuplicateInvoiceError without touching the browser if the invoice was already submitted
+    or is being submitted by another worker.
     """
+    index = get_invoice_index()
+    claim_id = index.claim(STAGE_SUBMISSION, data=data) if index else None
     try:
-        url = "http://127.0.0.1:5001/"
-        logging.info(f"Opening browser to interact with local reimbursement system at {url}")
-        page().goto(url)
+        page().goto(BUSINESS_SYSTEM_URL)
+        page().wait_for_selector("#invoice_number")
+        fill_reimbursement_form(data)
+        verify_submission()
+    except Exception:
+        if claim_id:
+            index.release_claim(claim_id)
+        raise
+    reimbursement_id = str(data.get("invoice_number", ""))
+    if claim_id:
+        index.complete_claim(claim_id, reference=reimbursement_id)
+    return reimbursement_id
 
-        login_to_system()
+def interact_with_business_system(data: dict, file_hash: str = None) -> str:
+    """
+    Interacts with the local web reimbursement system to file a claim.
+    Raises DuplicateInvoiceError before opening the browser if the invoice was already submitted.
+    """
+    index = get_invoice_index()
+    # Claiming is atomic, so concurrent workers cannot both submit the same invoice
+    claim_id = index.claim(STAGE_SUBMISSION, data=data, file_hash=file_hash) if index else None
+    try:
+        open_business_system()
         fill_reimbursement_form(data)
         verify_submission()
 
-        return str(data.get("invoice_number", ""))
+        reimbursement_id = str(data.get("invoice_number", ""))
+        if claim_id:
+            index.complete_claim(claim_id, reference=reimbursement_id)
+        return reimbursement_id
 
     except Exception as e:
+        if claim_id:
+            index.release_claim(claim_id)
         logging.error(f"An error occurred during browser interaction: {e}")
         # 确保输出目录存在
         os.makedirs("output", exist_ok=True)
@@ -152,4 +322,3 @@ def interact_with_business_system(data: dict) -> str:
         raise
     finally:
         logging.info("Finished browser interaction.")
-
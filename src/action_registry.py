@@ -0,0 +1,45 @@
+"""
+工作流动作注册表：动作名 -> 实现它的处理模块。
+
+处理模块在某个动作第一次执行时才导入，只用浏览器动作的工作流（如 `test-google.yaml`）
+不会为 AI/Excel 依赖付出启动时间。新增动作时在对应模块中实现同名函数
+`handler(executor, step, params)` 并在这里登记，同时在 `src/workflow_validator.py` 的
+`ACTION_SCHEMAS` 中声明参数。`loop` 是控制结构，由执行器自身处理；带嵌套 `steps` 的动作
+（如 `browser_capture_responses`）通过 `executor._execute_steps` 执行其步骤。
+"""
+from typing import Callable, Dict, Optional
+import importlib
+
+ACTION_MODULES: Dict[str, str] = {
+    'browser_goto': 'src.actions.browser',
+    'browser_login_human_like': 'src.actions.browser',
+    'browser_fill': 'src.actions.browser',
+    'browser_click': 'src.actions.browser',
+    'browser_press': 'src.actions.browser',
+    'browser_select_option': 'src.actions.browser',
+    'browser_switch_to_frame': 'src.actions.browser',
+    'browser_wait_for_selector': 'src.actions.browser',
+    'browser_mouse_move': 'src.actions.browser',
+    'browser_wait_for_url': 'src.actions.browser',
+    'browser_wait_for_load_state': 'src.actions.browser',
+    'browser_evaluate': 'src.actions.browser',
+    'browser_js_click': 'src.actions.browser',
+    'browser_upload_file': 'src.actions.browser',
+    'browser_get_source': 'src.actions.capture',
+    'browser_screenshot': 'src.actions.capture',
+    'browser_wait_for_response': 'src.actions.capture',
+    'browser_capture_responses': 'src.actions.capture',
+    'ai_fill_reimbursement_excel': 'src.actions.ai',
+    'extract_data': 'src.actions.ai',
+}
+
+_handlers: Dict[str, Callable] = {}
+
+
+def get_action_handler(action: str) -> Optional[Callable]:
+    """返回动作的处理函数，首次调用时导入其模块；未注册的动作返回 None。"""
+    handler = _handlers.get(action)
+    if handler is None and action in ACTION_MODULES:
+        module = importlib.import_module(ACTION_MODULES[action])
+        handler = _handlers[action] = getattr(module, action)
+    return handler
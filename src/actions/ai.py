@@ -0,0 +1,20 @@
+"""
+AI 动作。只有工作流引用这些动作时才会加载 AI/Excel 依赖（openpyxl、LLM 路由、文档读取等）。
+"""
+from src.ai_services import process_receipts_and_fill_excel
+
+
+def ai_fill_reimbursement_excel(executor, step, params):
+    receipt_files = params.get('receipt_files')
+    excel_template_path = params.get('excel_template_path')
+
+    if not receipt_files or not excel_template_path:
+        raise ValueError("ai_fill_reimbursement_excel requires 'receipt_files' and 'excel_template_path'.")
+    
+    # Call the AI service to process receipts and fill the Excel
+    return process_receipts_and_fill_excel(receipt_files, excel_template_path, params.get('excel_description'),
+                                           params.get('refresh_mapping_plan'))
+
+
+def extract_data(executor, step, params): # Deprecated in favor of ai_fill_reimbursement_excel
+    raise NotImplementedError("'extract_data' is deprecated. Use 'ai_fill_reimbursement_excel' instead.")
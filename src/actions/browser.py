@@ -0,0 +1,252 @@
+"""
+浏览器交互动作：导航、登录、填写、点击、iframe 切换和各种等待。
+
+每个处理函数的签名为 `handler(executor, step, params)`，params 中的 `{{ }}` 变量已解析，
+返回值写入步骤的 `output_to` 变量。
+"""
+import logging
+import os
+
+from robocorp import browser
+
+
+def browser_goto(executor, step, params):
+    url = params.get('url')
+    if url:
+        browser.goto(url)
+        executor.current_context = browser.page()
+        executor.current_context.wait_for_load_state('networkidle')
+    else:
+        raise ValueError("Missing 'url' for browser_goto action.")
+
+
+def browser_login_human_like(executor, step, params):
+    url = params.get('url')
+    username = params.get('username')
+    password = params.get('password')
+    username_selector = params.get('username_selector')
+    password_selector = params.get('password_selector')
+    submit_selector = params.get('submit_selector')
+
+    if not all([url, username, password, username_selector, password_selector, submit_selector]):
+        raise ValueError("Missing one or more required parameters for browser_login_human_like.")
+
+    browser.goto(url)
+    page = browser.page()
+    page.wait_for_load_state('networkidle')
+    
+    page.fill(username_selector, username)
+    
+    encryption_script = """
+    (args) => {
+        const { password, pass_selector } = args;
+        try {
+            const seed = window._SecuritySeed;
+            const crypto_obj = window.CryptoJS;
+
+            if (!seed || !crypto_obj) {
+                return { error: 'CryptoJS or seed not found on page.' };
+            }
+
+            const encrypted = crypto_obj.DES.encrypt(password, seed);
+            
+            const hidden_pass_id = 'login_password';
+            let hidden_input = document.getElementById(hidden_pass_id);
+            if (!hidden_input) {
+                hidden_input = document.createElement('input');
+                hidden_input.type = 'hidden';
+                hidden_input.id = hidden_pass_id;
+                hidden_input.name = hidden_pass_id;
+                const form = document.querySelector('form');
+                if (form) form.appendChild(hidden_input);
+            }
+            hidden_input.value = encrypted.toString();
+
+            const visible_pass_field = document.querySelector(pass_selector);
+            if (visible_pass_field) visible_pass_field.value = password;
+
+            return { encrypted_password: encrypted.toString() };
+        } catch (e) {
+            return { error: `JS execution error: ${e.toString()}` };
+        }
+    }
+    """
+    
+    result = page.evaluate(encryption_script, {
+        'password': password,
+        'pass_selector': password_selector
+    })
+
+    if result.get('error'):
+        raise Exception(f"Failed to encrypt password on page: {result['error']}")
+    
+    logging.info(f"Successfully encrypted password and set hidden field. Encrypted value starts with: {result.get('encrypted_password', '')[:10]}...")
+
+    logging.info(f"Attempting to click submit button '{submit_selector}' using JavaScript.")
+    page.evaluate(f"document.querySelector('{submit_selector}').click()")
+    
+    page.wait_for_load_state('networkidle', timeout=30000)
+    logging.info("Login submitted successfully.")
+    return result
+
+
+def browser_fill(executor, step, params):
+    selector = params.get('selector')
+    value = params.get('value')
+    if selector and value is not None:
+        executor._locate(selector).fill(value)
+    else:
+        raise ValueError(f"Missing 'selector' or 'value' for browser_fill. Got selector='{selector}', value='{value}'")
+
+
+def browser_click(executor, step, params):
+    selector = params.get('selector')
+    step_name = step.get('name', f"Unnamed Step ({step.get('action')})")
+    if selector:
+        opens_new_window = params.get('opens_new_window', False) #or step_copy.get('opens_new_window', False)
+        if opens_new_window:
+            logging.info(f"Expecting new window after clicking {selector}")
+            new_page = None
+            try:
+                with browser.context().expect_event('page', timeout=15000) as new_page_info:
+                    executor._locate(selector).click()
+                
+                new_page = new_page_info.value
+                new_page.wait_for_load_state('load', timeout=60000)
+                
+                executor.current_context = new_page
+                logging.info(f"Successfully switched context to new page: {new_page.url}")
+                executor._proactively_save_source(f"new_window_from_click_on_{selector[:30]}")
+
+            except Exception as e:
+                logging.error(f"An error occurred while opening or waiting for the new window: {e}")
+                if executor.profile['error_screenshots']:
+                    if new_page and not new_page.is_closed():
+                        logging.info("Attempting to take a screenshot of the partially loaded new window.")
+                        safe_step_name = "".join(c if c.isalnum() or c in (' ', '_') else '_' for c in step_name).replace(' ', '_')
+                        error_screenshot_path = os.path.join(os.getcwd(), 'output', f"error_screenshot_NEW_WINDOW_{safe_step_name}.png")
+                        try:
+                            new_page.screenshot(path=error_screenshot_path)
+                            logging.info(f"Saved error screenshot of NEW window to: {error_screenshot_path}")
+                        except Exception as screenshot_e:
+                            logging.error(f"Failed to take screenshot of the new window: {screenshot_e}")
+                    else:
+                        logging.warning("New window was not created before the error. Taking screenshot of the original context.")
+                        executor._take_error_screenshot(step_name)
+                raise
+        else:
+            executor._locate(selector).click()
+    else:
+        raise ValueError("Missing 'selector' for browser_click.")
+
+
+def browser_press(executor, step, params):
+    selector = params.get('selector')
+    key = params.get('key')
+    if key:
+        executor.current_context.press(selector, key)
+    else:
+        raise ValueError("Missing 'selector' or 'key' for browser_press.")
+
+
+def browser_select_option(executor, step, params):
+    selector = params.get('selector')
+    value = params.get('value')
+    if selector and value is not None:
+        executor._locate(selector).select_option(value)
+    else:
+        raise ValueError("Missing 'selector' or 'value' for browser_select_option.")
+
+
+def browser_switch_to_frame(executor, step, params):
+    frame_selector = params.get('selector')
+    if frame_selector == '__main_page__':
+        if hasattr(executor.current_context, 'page'):  # Check if we are inside a frame
+            executor.current_context = executor.current_context.page # Correctly exit to the containing page
+        logging.info("Switched context back to the page level.")
+    elif frame_selector:
+        logging.info(f"Attempting to switch to frame: {frame_selector}")
+        if executor.profile['enumerate_frames']:
+            executor._log_frames()
+        if executor.selector_cache is not None:
+            executor.current_context = executor.selector_cache.locate_frame(executor.current_context, frame_selector, timeout=30000)
+        else:
+            frame_element = executor.current_context.wait_for_selector(frame_selector, timeout=30000, state='attached')
+            executor.current_context = frame_element.content_frame()
+        executor.current_context.wait_for_load_state('load', timeout=30000)
+        logging.info(f"Switched context to iframe: {frame_selector}")
+        executor._proactively_save_source(f"iframe_switch_{frame_selector}")
+    else:
+        raise ValueError("Missing 'selector' for browser_switch_to_frame.")
+
+
+def browser_wait_for_selector(executor, step, params):
+    selector = params.get('selector')
+    timeout = params.get('timeout')
+    state = params.get('state')
+    executor._locate(selector, state=state if state is not None else 'visible', timeout=timeout if timeout is not None else 30000)
+
+
+def browser_mouse_move(executor, step, params):
+    x = params.get('x')
+    y = params.get('y')
+    if x is not None and y is not None:
+        executor.current_context.mouse.move(int(x), int(y))
+        logging.info(f"Moved mouse to ({x}, {y})")
+    else:
+        raise ValueError("Missing 'x' or 'y' for browser_mouse_move.")
+
+
+def browser_wait_for_url(executor, step, params):
+    url_pattern = params.get('url_pattern')
+    timeout = params.get('timeout')
+    executor.current_context.wait_for_url(url_pattern, timeout=timeout if timeout is not None else 30000)
+
+
+def browser_wait_for_load_state(executor, step, params):
+    state = params.get('state')
+    timeout = params.get('timeout')
+    executor.current_context.wait_for_load_state(state if state is not None else 'domcontentloaded', timeout=timeout if timeout is not None else 30000)
+
+
+def browser_evaluate(executor, step, params):
+    expression = params.get('expression')
+    result = executor.current_context.evaluate(expression)
+    return result
+
+
+def browser_js_click(executor, step, params):
+    selector = params.get('selector')
+    if selector:
+        script = f"document.querySelector('{selector}').click();"
+        executor.current_context.evaluate(script)
+        logging.info(f"Clicked {selector} using JavaScript.")
+
+
+def browser_upload_file(executor, step, params):
+    file_path = params.get('file_path')
+    click_selector = params.get('selector') # The selector to click to trigger the file chooser
+
+    if not file_path or not click_selector:
+        raise ValueError("Missing 'file_path' or 'selector' for browser_upload_file.")
+
+    # The context for the operation should be the current frame/page
+    operation_context = executor.current_context
+
+    absolute_file_path = os.path.abspath(file_path)
+    if not os.path.exists(absolute_file_path):
+        raise FileNotFoundError(f"The file specified for upload does not exist: {absolute_file_path}")
+
+    is_input_file = operation_context.eval_on_selector(click_selector, "el => el.tagName === 'INPUT' && el.type === 'file'")
+
+    if is_input_file:
+        logging.info(f"Selector '{click_selector}' is a file input. Setting files directly.")
+        operation_context.set_input_files(click_selector, absolute_file_path)
+    else:
+        logging.info(f"Expecting a file chooser to open after clicking '{click_selector}'.")
+        with operation_context.expect_file_chooser(timeout=15000) as fc_info:
+            operation_context.click(click_selector)
+        file_chooser = fc_info.value
+        logging.info(f"File chooser opened. Setting file to: {absolute_file_path}")
+        file_chooser.set_files(absolute_file_path)
+    logging.info(f"Successfully handled file chooser and set file to: {absolute_file_path}")
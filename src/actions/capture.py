@@ -0,0 +1,121 @@
+"""
+采集动作：保存页面源码、截图和捕获网络响应，结果写入 `output/` 下的文件或 blob 存储。
+"""
+import logging
+import os
+import time
+
+from robocorp import browser
+
+from src.response_capture import DEFAULT_SETTLE_MS, ResponseCapture
+
+
+def browser_get_source(executor, step, params):
+    output_file = params.get('output_file')
+    source_dir = os.path.join(os.getcwd(), 'output', 'sources')
+    os.makedirs(source_dir, exist_ok=True)
+    timestamp = int(time.time())
+    # insert timestamp before the extension
+    base, ext = os.path.splitext(output_file)
+    filename = f"{base}_{timestamp}{ext}"
+    final_path = os.path.join(source_dir, filename)
+
+    source_code = executor.current_context.content()
+    with open(final_path, 'w', encoding='utf-8') as f:
+        f.write(source_code)
+    logging.info(f"Saved source code to: {final_path}")
+    return source_code
+
+
+def browser_screenshot(executor, step, params):
+    output_file = params.get('output_file')
+    screenshot_dir = os.path.join(os.getcwd(), 'output', 'screenshots')
+    os.makedirs(screenshot_dir, exist_ok=True)
+    timestamp = int(time.time())
+    base, ext = os.path.splitext(output_file)
+    filename = f"{base}_{timestamp}{ext}"
+    final_path = os.path.join(screenshot_dir, filename)
+    
+    target_page = None
+    if hasattr(executor.current_context, 'page'): # Frame context
+        target_page = executor.current_context.page
+    else: # Assume Page context
+        target_page = executor.current_context
+
+    if target_page and not target_page.is_closed():
+        target_page.screenshot(path=final_path)
+        logging.info(f"Saved screenshot to: {final_path}")
+        return final_path
+    else:
+        raise Exception(f"Could not take screenshot, target page for context is invalid or closed.")
+
+
+def browser_wait_for_response(executor, step, params):
+    url_pattern = params.get('url_pattern')
+    timeout = params.get('timeout')
+    output_file = params.get('output_file')
+    response_data = None
+    def match_url_pattern(url, pattern):
+        import re
+        pattern_regex = pattern.replace('**', '.*')
+        try:
+            return bool(re.match(pattern_regex, url))
+        except Exception as e:
+            logging.warning(f"URL pattern matching error: {e}")
+            return False
+    def handle_response(response):
+        nonlocal response_data
+        if match_url_pattern(response.url, url_pattern):
+            try:
+                response_data = response.json()
+            except Exception:
+                response_data = response.text()
+    browser.page().on('response', handle_response)
+    try:
+        executor.current_context.wait_for_event('response', predicate=lambda r: match_url_pattern(r.url, url_pattern), timeout=timeout if timeout is not None else 30000)
+    except Exception as e:
+        logging.warning(f"Wait for response timed out or failed: {e}")
+    browser.page().remove_listener('response', handle_response)
+    if response_data is not None:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if isinstance(response_data, dict):
+                import json
+                json.dump(response_data, f, ensure_ascii=False, indent=2)
+            else:
+                f.write(str(response_data))
+    else:
+        logging.warning(f"No response captured for URL pattern: {url_pattern}")
+    return response_data
+
+
+def browser_capture_responses(executor, step, params):
+    """在嵌套 steps 执行期间把匹配的响应流式写入 JSONL，返回 blob 引用（见 src/response_capture.py）。"""
+    steps = step.get('steps')
+    if not steps:
+        raise ValueError("browser_capture_responses requires nested 'steps'.")
+    writer = executor.blob_store.open_stream('jsonl')
+    try:
+        capture = ResponseCapture.from_params(writer, params)
+    except ValueError:
+        writer.discard()
+        raise
+    # 监听整个浏览器上下文，嵌套步骤打开的新窗口和 iframe 中的请求也会被捕获
+    context = browser.context()
+    handler = capture.handle
+    context.on('response', handler)
+    try:
+        executor._execute_steps(steps)
+        settle_ms = params.get('settle_ms', DEFAULT_SETTLE_MS)
+        if settle_ms:
+            browser.page().wait_for_timeout(settle_ms) # 同步 API 只在等待时分发事件，给最后的请求留出返回时间
+    except Exception:
+        writer.discard()
+        raise
+    finally:
+        context.remove_listener('response', handler)
+    ref = writer.commit()
+    ref['records'] = capture.records
+    logging.info(f"Captured responses: {capture.stats()}")
+    if not capture.records:
+        logging.warning(f"No responses captured for URL patterns: {params.get('url_patterns')}")
+    return ref
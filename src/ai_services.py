@@ -1,11 +1,22 @@
 from typing import List, Dict, Optional
 import yaml
-import requests
 import json
 import os
 import re
 import openpyxl # Added for Excel manipulation
 import shutil # Added for file operations
+import base64
+
+from src.document_reader import file_content_hash, read_document
+from src.image_preprocessor import normalize_image
+from src.llm_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from src.llm_router import get_llm_router
+from src.metrics import FIELD_EXTRACTIONS, observe_stage
+from src.field_extractor import build_missing_fields_prompt, extract_fields
+from src.invoice_index import (STAGE_EXCEL, DuplicateInvoiceError, InvoiceIndex, get_invoice_index,
+                               identities_match, invoice_identity)
+from src.execution_profile import active_profile
+from src.mapping_plan import DEFAULT_EXCEL_DESCRIPTION, apply_mapping_plan, compile_mapping_plan, plan_document_types
 
 class LLMService:
     def __init__(self):
@@ -15,17 +26,17 @@ class LLMService:
         self.local_llm_url = os.getenv('LOCAL_LLM_URL', 'http://127.0.0.1:1234/v1/chat/completions')
         self.local_llm_model = os.getenv('LOCAL_LLM_MODEL', 'google/gemma-3-4b')
 
-    def _call_local_llm(self, prompt: str) -> dict:
-        """调用本地LLM API"""
+    def _call_llm(self, prompt: str, priority: int = PRIORITY_BATCH) -> dict:
+        """
+        调用LLM API。请求经由多后端路由器选择最快的健康后端（默认只有本地后端），
+        每个后端都有自己的自适应并发限制器。
+        """
         payload = {
-            "model": self.local_llm_model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.3,
             "max_tokens": 2000
         }
-        response = requests.post(self.local_llm_url, headers={"Content-Type": "application/json"}, json=payload)
-        response.raise_for_status() # Will raise an exception for 4xx/5xx status
-        return response.json()
+        return get_llm_router().chat(payload, priority=priority)
 
     def _parse_llm_response(self, response: dict) -> str:
         """解析API响应，并从Markdown代码块中提取YAML或JSON。"""
@@ -36,10 +47,10 @@ class LLMService:
         match = re.search(r"```(?:yaml|json)?\n(.*?)\n```", content, re.DOTALL)
         return match.group(1).strip() if match else content
 
-    def generate_yaml_from_prompt(self, prompt: str) -> str:
+    def generate_yaml_from_prompt(self, prompt: str, priority: int = PRIORITY_BATCH) -> str:
         """通用函数，根据prompt调用LLM并返回YAML字符串"""
         try:
-            response = self._call_local_llm(prompt)
+            response = self._call_llm(prompt, priority=priority)
             return self._parse_llm_response(response)
         except Exception as e:
             print(f"LLM调用失败: {str(e)}")
@@ -94,105 +105,102 @@ def extract_document_data(file_path: str, document_type: str) -> Dict:
         print(f"Warning: 在 invoice_configs.yaml 中未找到类型为 '{document_type}' 的模板。返回通用模拟数据。")
         return {"mock_data_for": document_type, "file_name": os.path.basename(file_path)}
 
-    # 2. TODO: 调用OCR服务获取文本和图片Base64 (当前跳过，假设LLM直接处理图片)
-    # In a real scenario, you would read the file, perform OCR, and convert image to base64
-    ocr_text_1 = f"(模拟OCR文本1 for {os.path.basename(file_path)})";
-    ocr_text_2 = f"(模拟OCR文本2 for {os.path.basename(file_path)})";
-    image_base64 = f"(模拟图片数据 for {os.path.basename(file_path)})";
-
-    # 3. 构建Prompt (使用实际的llm_prompt_template)
-    llm_prompt_template = template.get('llm_prompt_template', '从图片和OCR文本中提取数据。图片：{image} OCR文本1：{ocr_text_1} OCR文本2：{ocr_text_2}')
-    
-    prompt = llm_prompt_template.format(
-        image=image_base64,
-        ocr_text_1=ocr_text_1,
-        ocr_text_2=ocr_text_2
-    )
+    # 2. 读取文档文本：数字 PDF 直接使用文本层，只有无文本的页面才会栅格化并 OCR
+    ocr_text_1 = ""
+    ocr_text_2 = ""
+    image_base64 = ""
+    try:
+        document = read_document(file_path)
+        ocr_text_1 = document['text']
+        if document['image_paths']:
+            # 只有扫描件/照片才需要把图片发送给多模态模型，发送前先规范化以减小请求体
+            with open(normalize_image(document['image_paths'][0]), 'rb') as f:
+                image_base64 = base64.b64encode(f.read()).decode('ascii')
+        sources = sorted({p['source'] for p in document['pages']})
+        print(f"[AI_SERVICE] 文档读取完成: {len(document['pages'])} 页, 来源 {sources}, 缓存命中: {document['cached']}")
+    except Exception as e:
+        print(f"Warning: 读取文档 {os.path.basename(file_path)} 失败: {e}")
+
+    # 3. 本地快速路径：按字段声明的正则/锚点提取并校验，只有缺失或校验失败的字段才交给 LLM
+    fields = template.get('fields', [])
+    local_values, missing_fields = extract_fields("\n".join(filter(None, [ocr_text_1, ocr_text_2])), fields)
+    for field in fields:
+        FIELD_EXTRACTIONS.labels(document_type=document_type, source='local' if field['id'] in local_values else 'llm').inc()
+    if fields and not missing_fields:
+        print(f"[AI_SERVICE] 全部 {len(fields)} 个字段已通过本地规则提取，跳过 LLM。")
+        return local_values
+
+    # 4. 构建Prompt：没有任何字段在本地提取到时使用模板的完整 prompt，否则只询问缺失字段
+    if local_values:
+        print(f"[AI_SERVICE] 本地提取 {len(local_values)}/{len(fields)} 个字段，LLM 只需提取: {[f['id'] for f in missing_fields]}")
+        prompt = build_missing_fields_prompt(template, missing_fields, local_values, ocr_text_1, ocr_text_2, image_base64)
+    else:
+        llm_prompt_template = template.get('llm_prompt_template', '从图片和OCR文本中提取数据。图片：{image} OCR文本1：{ocr_text_1} OCR文本2：{ocr_text_2}')
+        prompt = llm_prompt_template.format(
+            image=image_base64,
+            ocr_text_1=ocr_text_1,
+            ocr_text_2=ocr_text_2
+        )
     
     # ** 当前返回模拟数据以验证流程 **
     print(f"[AI_SERVICE] 注意: 当前返回模拟数据以验证端到端流程，基于模板 '{document_type}'.")
     if document_type == "vat_general_invoice":
-        return {
+        result = {
             "invoice_number": f"MOCK_VAT_{os.path.basename(file_path).split('.')[0]}",
             "total_amount_nett_incl_tax": 1170.00,
             "issue_date": "2025-07-30"
         }
     elif document_type == "jipiao":
-        return {
+        result = {
             "departure_city": "北京",
             "arrival_city": "上海",
             "total_amount": 850.00,
             "booking_date": "2025-07-30"
         }
     elif document_type == "train_ticket":
-        return {
+        result = {
             "passenger_name": "张三",
             "train_number": "G123",
             "price": 150.00
         }
     elif document_type == "xingchengdan":
-        return {
+        result = {
             "start_date": "2025-07-01",
             "end_date": "2025-07-05",
             "total_amount": 2500.00,
             "city": "广州"
         }
     else:
-        return {"mock_data_for": document_type, "file_name": os.path.basename(file_path)}
+        result = {"mock_data_for": document_type, "file_name": os.path.basename(file_path)}
+    # 本地规则提取并校验过的字段优先
+    result.update(local_values)
+    return result
 
 # --- Stage 2: Requirement Understanding & Mapping Generation ---
 
-def generate_excel_mapping(extracted_data: List[Dict], excel_description: str) -> List[Dict]:
+def generate_excel_mapping(extracted_data: List[Dict], excel_description: str, excel_template_path: Optional[str] = None,
+                           refresh_plan: Optional[bool] = None) -> List[Dict]:
     """
     阶段二：需求理解与映射生成。
-    LLM 根据提取出的结构化数据和 Excel 模板的自然语言描述，生成数据映射指令。
-    当前版本返回模拟的映射指令。
+    LLM 只负责把 Excel 模板的自然语言描述编译成映射计划（每个模板/描述/文档类型集合只编译一次并缓存），
+    映射指令由本地引擎根据计划生成，不再在每次运行时调用 LLM。`refresh_plan=True` 强制重新编译计划。
     """
     print(f"[AI_SERVICE] 阶段 2: 正在根据Excel描述生成映射指令...")
     print(f"  Excel 描述: {excel_description}")
-    print(f"  提取数据: {json.dumps(extracted_data, ensure_ascii=False, indent=2)}")
-
-    # TODO: 在此接入LLM，根据excel_description和extracted_data生成映射指令
-    # 模拟返回一个映射指令
-    mock_mapping = []
-    current_row = 3 # Assuming data starts from row 3
-
-    for item_index, item in enumerate(extracted_data):
-        mappings_for_item = []
-        doc_type = item.get('document_type', 'unknown')
-        data = item.get('data', {})
-
-        # Example mapping logic based on document type and excel_description
-        # In a real scenario, LLM would generate this based on the excel_description
-        if doc_type == "vat_general_invoice":
-            mappings_for_item.append({"target_column": "A", "value": data.get("issue_date", "")})
-            mappings_for_item.append({"target_column": "B", "value": data.get("goods_or_taxable_service_name", "")})
-            mappings_for_item.append({"target_column": "C", "value": data.get("total_amount_nett_incl_tax", "")})
-            mappings_for_item.append({"target_column": "D", "value": "增值税发票"})
-        elif doc_type == "jipiao":
-            mappings_for_item.append({"target_column": "A", "value": data.get("booking_date", "")})
-            mappings_for_item.append({"target_column": "B", "value": f"{data.get('departure_city', '')}-{data.get('arrival_city', '')}"})
-            mappings_for_item.append({"target_column": "C", "value": data.get("total_amount", "")})
-            mappings_for_item.append({"target_column": "D", "value": "机票"})
-        elif doc_type == "train_ticket":
-            mappings_for_item.append({"target_column": "A", "value": data.get("departure_datetime", "")})
-            mappings_for_item.append({"target_column": "B", "value": f"{data.get('departure_station', '')}-{data.get('arrival_station', '')}"})
-            mappings_for_item.append({"target_column": "C", "value": data.get("price", "")})
-            mappings_for_item.append({"target_column": "D", "value": "火车票"})
-        elif doc_type == "xingchengdan":
-            mappings_for_item.append({"target_column": "A", "value": data.get("start_date", "")})
-            mappings_for_item.append({"target_column": "B", "value": data.get("city", "")})
-            mappings_for_item.append({"target_column": "C", "value": data.get("total_amount", "")})
-            mappings_for_item.append({"target_column": "D", "value": "行程单"})
-        
-        mock_mapping.append({
-            "source_index": item_index,
-            "target_row": current_row + item_index, # Each item goes to a new row
-            "mappings": mappings_for_item
-        })
-    
-    print(f"[AI_SERVICE] 模拟映射指令生成完成: {json.dumps(mock_mapping, ensure_ascii=False, indent=2)}")
-    return mock_mapping
+    if active_profile()['verbose_payloads']:
+        print(f"  提取数据: {json.dumps(extracted_data, ensure_ascii=False, indent=2)}")
+    else:
+        print(f"  提取数据: {len(extracted_data)} 条")
+
+    plan = compile_mapping_plan(excel_template_path, excel_description, plan_document_types(extracted_data),
+                                refresh=refresh_plan)
+    mapping_instructions = apply_mapping_plan(plan, extracted_data)
+
+    if active_profile()['verbose_payloads']:
+        print(f"[AI_SERVICE] 映射指令生成完成 (计划 {plan['key'][:12]}, 来源 {plan['source']}): {json.dumps(mapping_instructions, ensure_ascii=False, indent=2)}")
+    else:
+        print(f"[AI_SERVICE] 映射指令生成完成 (计划 {plan['key'][:12]}, 来源 {plan['source']}): {len(mapping_instructions)} 行")
+    return mapping_instructions
 
 # --- Stage 3: Mechanical Filling ---
 
@@ -218,6 +226,7 @@ def fill_excel_template(template_path: str, mapping_instructions: List[Dict]) ->
     try:
         workbook = openpyxl.load_workbook(filled_excel_path)
         sheet = workbook.active # Get the active sheet
+        verbose = active_profile()['verbose_payloads']
 
         for instruction_set in mapping_instructions:
             target_row = instruction_set.get("target_row")
@@ -234,7 +243,8 @@ def fill_excel_template(template_path: str, mapping_instructions: List[Dict]) ->
                 if target_column and value is not None:
                     try:
                         sheet[f"{target_column}{target_row}"] = value
-                        print(f"  写入单元格 {target_column}{target_row}: {value}")
+                        if verbose:
+                            print(f"  写入单元格 {target_column}{target_row}: {value}")
                     except Exception as e:
                         print(f"Error writing to cell {target_column}{target_row}: {e}")
                 else:
@@ -249,18 +259,47 @@ def fill_excel_template(template_path: str, mapping_instructions: List[Dict]) ->
         raise
 
 # --- Orchestration Function for AI-driven Excel Filling ---
-def process_receipts_and_fill_excel(receipt_file_paths: List[str], excel_template_path: str) -> Dict:
+def _duplicate_reason(index: Optional[InvoiceIndex], batch: List[Dict], file_hash: Optional[str] = None, data: Optional[Dict] = None) -> Optional[str]:
+    """先在本批次中、再在持久化索引中查找重复票据，返回重复原因，不重复时返回 None。"""
+    identity = invoice_identity(data) if data else None
+    for item in batch:
+        if file_hash and item['file_hash'] == file_hash:
+            return f"与本批次的 {os.path.basename(item['file_path'])} 内容相同"
+        if identity and identities_match(identity, invoice_identity(item['data'])):
+            return f"与本批次的 {os.path.basename(item['file_path'])} 发票号码相同"
+    if index:
+        try:
+            index.check(STAGE_EXCEL, data=data, file_hash=file_hash)
+        except DuplicateInvoiceError as e:
+            return str(e)
+    return None
+
+def process_receipts_and_fill_excel(receipt_file_paths: List[str], excel_template_path: str, excel_description: Optional[str] = None,
+                                    refresh_mapping_plan: Optional[bool] = None) -> Dict:
     """
     AI 驱动的 Excel 填充总控函数。
     它将协调文档分类、数据提取、映射生成和机械填表三个阶段。
+    `excel_description` 为 Excel 模板的自然语言描述，未提供时使用默认的报销模板描述。
+    `refresh_mapping_plan=True` 忽略已缓存的映射计划重新编译，未指定时由 `MAPPING_PLAN_REFRESH` 决定。
     """
     print("[AI_SERVICE] 开始 AI 驱动的 Excel 填充流程...")
     extracted_data_list = []
     original_receipt_paths = []
+    duplicates = []
+    index = get_invoice_index()
 
     for file_path in receipt_file_paths:
+        # 重复文件在分类和提取之前即被拦截，不再消耗 LLM 调用
+        file_hash = file_content_hash(file_path) if os.path.exists(file_path) else None
+        reason = _duplicate_reason(index, extracted_data_list, file_hash=file_hash)
+        if reason:
+            print(f"[AI_SERVICE] 跳过重复票据 {os.path.basename(file_path)}: {reason}")
+            duplicates.append({"file_path": file_path, "reason": reason})
+            continue
+
         # 阶段一：文档理解 (分类和提取)
-        doc_type = classify_document(file_path)
+        with observe_stage('classify'):
+            doc_type = classify_document(file_path)
         if doc_type == "reimbursement_excel":
             # 如果是Excel模板本身，则跳过提取，但记录其路径
             print(f"[AI_SERVICE] 识别到 Excel 模板文件: {file_path}，跳过数据提取。")
@@ -269,26 +308,43 @@ def process_receipts_and_fill_excel(receipt_file_paths: List[str], excel_templat
             # This needs to be refined based on actual business logic
             continue # Skip processing this as a receipt
         
-        extracted_data = extract_document_data(file_path, doc_type)
+        with observe_stage('extract'):
+            extracted_data = extract_document_data(file_path, doc_type)
+        # 文件不同但发票号码、金额、日期相同（如重新扫描的同一张发票）
+        reason = _duplicate_reason(index, extracted_data_list, data=extracted_data)
+        if reason:
+            print(f"[AI_SERVICE] 跳过重复票据 {os.path.basename(file_path)}: {reason}")
+            duplicates.append({"file_path": file_path, "reason": reason})
+            continue
         extracted_data_list.append({
             "document_type": doc_type,
             "file_path": file_path, # Keep original file path for attachment
+            "file_hash": file_hash,
             "data": extracted_data
         })
         original_receipt_paths.append(file_path)
 
     # 阶段二：需求理解与映射生成
-    # TODO: 这里需要一个真实的 Excel 模板描述，可以从配置文件中读取或作为参数传入
-    excel_description = "我的报销Excel有这几列：A列是'日期'，B列是'城市信息'，C列是'费用类型'，D列是'金额'，E列是'备注'。其中，如果是机票，就把出发和到达城市填到'城市信息'里；如果是增值税发票，就把'货物名称'填到'备注'里。"
-    mapping_instructions = generate_excel_mapping(extracted_data_list, excel_description)
+    with observe_stage('mapping'):
+        mapping_instructions = generate_excel_mapping(extracted_data_list, excel_description or DEFAULT_EXCEL_DESCRIPTION, excel_template_path,
+                                                      refresh_mapping_plan)
 
     # 阶段三：机械填表
-    filled_excel_path = fill_excel_template(excel_template_path, mapping_instructions)
+    with observe_stage('fill'):
+        filled_excel_path = fill_excel_template(excel_template_path, mapping_instructions)
+
+    # 填表成功后才登记，失败的批次可以原样重试
+    if index:
+        index.record_many(STAGE_EXCEL, [
+            {"data": item['data'], "file_hash": item['file_hash'], "reference": filled_excel_path}
+            for item in extracted_data_list
+        ])
 
     print("[AI_SERVICE] AI 驱动的 Excel 填充流程完成。")
     return {
         "filled_excel_path": filled_excel_path,
         "original_receipt_paths": original_receipt_paths,
+        "duplicates": duplicates,
         "total_amount": sum(item['data'].get('total_amount', 0) or item['data'].get('total_amount_nett_incl_tax', 0) or item['data'].get('price', 0) for item in extracted_data_list)
     }
 
@@ -335,7 +391,7 @@ def generate_workflow_yaml(recorded_steps: List[Dict], existing_yaml: str = None
             {steps_json}
             ```
             """
-        return llm.generate_yaml_from_prompt(prompt)
+        return llm.generate_yaml_from_prompt(prompt, priority=PRIORITY_INTERACTIVE)
     except Exception as e:
         print(f"LLM优化失败: {str(e)}")
         # Fallback to basic generation logic if LLM optimization fails
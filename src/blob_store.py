@@ -0,0 +1,130 @@
+"""
+执行器大变量的磁盘存储。
+
+`browser_get_source` 的整页 HTML、`browser_wait_for_response` 的完整响应体等大结果如果直接放在
+`WorkflowExecutor.vars` 中，会常驻内存并被原样写入输出工作项的 `final_variables`。超过阈值
+（`VAR_SPILL_THRESHOLD` 字节，默认 64 KB）的变量会按内容哈希写入 `output/blobs/`，变量中只保留
+一个轻量引用：
+
+    {"__blob__": "<sha256>", "kind": "text"|"json", "size": 字节数, "path": 文件路径}
+
+模板 `{{ var }}` / `{{ var.a.b }}` 解析到引用时才从磁盘读取内容。相同内容只保存一份。
+`open_stream("jsonl")` 用于边产生边写入的结果（如 `browser_capture_responses` 捕获的响应），
+读取时每行解析为列表中的一个元素。
+"""
+from typing import Any, Dict
+import hashlib
+import json
+import os
+
+DEFAULT_ROOT = os.path.join(os.getcwd(), 'output', 'blobs')
+SPILL_THRESHOLD = int(os.getenv('VAR_SPILL_THRESHOLD', str(64 * 1024)))
+BLOB_KEY = '__blob__'
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, dict) and BLOB_KEY in value
+
+
+class BlobStore:
+    def __init__(self, root: str = DEFAULT_ROOT, threshold: int = SPILL_THRESHOLD):
+        self.root = root
+        self.threshold = threshold
+        self.spilled = 0
+        self.spilled_bytes = 0
+
+    def _path(self, digest: str, kind: str) -> str:
+        extension = 'txt' if kind == 'text' else kind
+        return os.path.join(self.root, digest[:2], f"{digest}.{extension}")
+
+    @staticmethod
+    def _encode(value) -> tuple:
+        if isinstance(value, str):
+            return 'text', value.encode('utf-8')
+        return 'json', json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    def put(self, value) -> Dict:
+        """把值写入存储并返回引用。值必须是字符串或可 JSON 序列化的对象。"""
+        return self._store(*self._encode(value))
+
+    def _store(self, kind: str, data: bytes) -> Dict:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, kind)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return {BLOB_KEY: digest, 'kind': kind, 'size': len(data), 'path': path}
+
+    def open_stream(self, kind: str = 'jsonl') -> 'BlobWriter':
+        """返回流式写入器，内容写完后调用 `commit()` 得到引用。"""
+        return BlobWriter(self, kind)
+
+    def get(self, ref: Dict) -> Any:
+        with open(self._path(ref[BLOB_KEY], ref['kind']), 'rb') as f:
+            data = f.read()
+        if ref['kind'] == 'jsonl':
+            return [json.loads(line) for line in data.splitlines() if line.strip()]
+        return data.decode('utf-8') if ref['kind'] == 'text' else json.loads(data)
+
+    def maybe_spill(self, value) -> Any:
+        """超过阈值的字符串、列表和字典写入磁盘并返回引用，其余值原样返回。"""
+        if not isinstance(value, (str, list, dict)) or is_blob_ref(value):
+            return value
+        if isinstance(value, str) and len(value) * 4 <= self.threshold:
+            return value # UTF-8 最多 4 字节/字符，肯定不超过阈值，省去编码
+        try:
+            kind, data = self._encode(value)
+        except (TypeError, ValueError):
+            return value # 不可序列化的对象保留在内存中
+        if len(data) <= self.threshold:
+            return value
+        ref = self._store(kind, data)
+        self.spilled += 1
+        self.spilled_bytes += ref['size']
+        return ref
+
+    def stats(self) -> Dict[str, int]:
+        return {'spilled_variables': self.spilled, 'spilled_bytes': self.spilled_bytes}
+
+
+class BlobWriter:
+    """边写入临时文件边计算哈希，`commit()` 时按内容哈希移动到最终路径，内容不会整体留在内存中。"""
+
+    def __init__(self, store: BlobStore, kind: str):
+        self.store = store
+        self.kind = kind
+        self.size = 0
+        self._hash = hashlib.sha256()
+        os.makedirs(store.root, exist_ok=True)
+        self.temp_path = os.path.join(store.root, f".stream_{os.getpid()}_{id(self)}.tmp")
+        self._file = open(self.temp_path, 'wb')
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def write_record(self, record) -> int:
+        """写入一行 JSON，返回写入的字节数。"""
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        self.write(line)
+        return len(line)
+
+    def commit(self) -> Dict:
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store._path(digest, self.kind)
+        if os.path.exists(path):
+            os.remove(self.temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp_path, path)
+        return {BLOB_KEY: digest, 'kind': self.kind, 'size': self.size, 'path': path}
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
@@ -0,0 +1,153 @@
+"""
+文档读取子系统：文本层优先，无文本的页面再栅格化并 OCR。
+
+大部分增值税电子发票是带有完整文本层的数字 PDF，直接读取文本层即可，无需任何图像处理；
+只有扫描件、照片或没有文本层的页面才会被栅格化（Poppler）并交给 Tesseract 识别。
+多页 OCR 在进程池中并行执行，每页的识别结果按文件内容哈希缓存。
+"""
+from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+
+from src.metrics import record_cache
+
+CACHE_DIR = os.path.join(os.getcwd(), 'output', 'cache', 'document_text')
+MIN_TEXT_CHARS = int(os.getenv('DOC_READER_MIN_TEXT_CHARS', '20'))
+OCR_DPI = int(os.getenv('DOC_READER_OCR_DPI', '200'))
+OCR_LANG = os.getenv('DOC_READER_OCR_LANG', 'chi_sim+eng')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+
+
+def file_content_hash(file_path: str) -> str:
+    """计算文件内容的 SHA-256，用作缓存键。"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def extract_text_layer(file_path: str) -> List[str]:
+    """读取 PDF 每一页的内嵌文本层，无法解析时返回空列表。"""
+    from pypdf import PdfReader
+    try:
+        reader = PdfReader(file_path)
+        return [(page.extract_text() or '') for page in reader.pages]
+    except Exception as e:
+        print(f"[DOC_READER] 无法读取 {os.path.basename(file_path)} 的文本层: {e}")
+        return []
+
+
+def _ocr_pdf_page(file_path: str, page_number: int, image_path: str, dpi: int, lang: str) -> str:
+    """栅格化 PDF 的单页并 OCR，在进程池中执行。page_number 从 1 开始。"""
+    from pdf2image import convert_from_path
+    import pytesseract
+    images = convert_from_path(file_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    if not images:
+        return ''
+    images[0].save(image_path, format='PNG')
+    return pytesseract.image_to_string(images[0], lang=lang)
+
+
+def _ocr_image_file(file_path: str, lang: str) -> str:
+    """对图片文件直接 OCR。"""
+    from PIL import Image
+    import pytesseract
+    with Image.open(file_path) as image:
+        return pytesseract.image_to_string(image, lang=lang)
+
+
+def _load_cache(file_hash: str) -> Optional[Dict]:
+    cache_path = os.path.join(CACHE_DIR, f"{file_hash}.json")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 缓存中的页面图片可能已被清理，此时视为未命中
+    if any(p.get('image_path') and not os.path.exists(p['image_path']) for p in cached.get('pages', [])):
+        return None
+    return cached
+
+
+def _save_cache(document: Dict):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(CACHE_DIR, f"{document['file_hash']}.json")
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False)
+
+
+def read_document(file_path: str, min_text_chars: int = MIN_TEXT_CHARS, max_workers: Optional[int] = None) -> Dict:
+    """
+    读取文档文本。返回：
+    {
+        "file_hash": 内容哈希,
+        "pages": [{"page": 页码, "text": 文本, "source": "text_layer"|"ocr", "image_path": 栅格化图片或 None}],
+        "text": 全部页面文本,
+        "image_paths": 被栅格化的页面图片（数字 PDF 为空）,
+        "cached": 是否命中缓存
+    }
+    """
+    file_hash = file_content_hash(file_path)
+    cached = _load_cache(file_hash)
+    record_cache('document_text', hit=cached is not None)
+    if cached:
+        print(f"[DOC_READER] 缓存命中: {os.path.basename(file_path)}")
+        return _build_result(cached, cached=True)
+
+    extension = os.path.splitext(file_path)[1].lower()
+    pages = []
+    if extension in IMAGE_EXTENSIONS:
+        # 图片没有文本层，直接 OCR，原图即为页面图片
+        pages.append({'page': 1, 'text': _ocr_image_file(file_path, OCR_LANG), 'source': 'ocr', 'image_path': file_path})
+    else:
+        page_texts = extract_text_layer(file_path)
+        pages_to_ocr = []
+        for index, text in enumerate(page_texts):
+            if len(text.strip()) >= min_text_chars:
+                pages.append({'page': index + 1, 'text': text, 'source': 'text_layer', 'image_path': None})
+            else:
+                pages_to_ocr.append(index + 1)
+        if not page_texts:
+            pages_to_ocr = [1] # 无法解析时至少尝试 OCR 第一页
+        if pages_to_ocr:
+            print(f"[DOC_READER] {os.path.basename(file_path)} 有 {len(pages_to_ocr)} 页没有文本层，开始 OCR...")
+            pages.extend(_ocr_pdf_pages(file_path, file_hash, pages_to_ocr, max_workers))
+        pages.sort(key=lambda p: p['page'])
+
+    document = {'file_hash': file_hash, 'pages': pages}
+    _save_cache(document)
+    return _build_result(document, cached=False)
+
+
+def _ocr_pdf_pages(file_path: str, file_hash: str, page_numbers: List[int], max_workers: Optional[int]) -> List[Dict]:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    image_paths = {n: os.path.join(CACHE_DIR, f"{file_hash}_p{n}.png") for n in page_numbers}
+    if len(page_numbers) == 1:
+        # 单页不值得启动进程池
+        n = page_numbers[0]
+        texts = {n: _ocr_pdf_page(file_path, n, image_paths[n], OCR_DPI, OCR_LANG)}
+    else:
+        workers = max_workers or min(len(page_numbers), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {n: pool.submit(_ocr_pdf_page, file_path, n, image_paths[n], OCR_DPI, OCR_LANG) for n in page_numbers}
+            texts = {n: future.result() for n, future in futures.items()}
+    return [
+        {'page': n, 'text': texts[n], 'source': 'ocr', 'image_path': image_paths[n] if os.path.exists(image_paths[n]) else None}
+        for n in page_numbers
+    ]
+
+
+def _build_result(document: Dict, cached: bool) -> Dict:
+    pages = document['pages']
+    return {
+        'file_hash': document['file_hash'],
+        'pages': pages,
+        'text': '\n'.join(p['text'].strip() for p in pages if p['text'].strip()),
+        'image_paths': [p['image_path'] for p in pages if p.get('image_path')],
+        'cached': cached,
+    }
@@ -0,0 +1,83 @@
+"""
+执行配置档（execution profile）：控制一次任务运行要付出多少诊断开销。
+
+- debug：与原有行为完全一致——浏览器模式沿用 robocorp.browser 的默认值，不放慢操作，切换 iframe 时枚举
+  所有 frame，新窗口/iframe 切换后保存页面源码，完整打印提取结果和映射指令，日志级别 INFO。
+  工作流出问题时使用，需要有界面或放慢时用 `get_profile('debug', headless=False, slowmo=250)` 覆盖。
+- production：无头浏览器，只在步骤失败时截图，不保存页面源码、不枚举 frame，日志只记录摘要。
+- benchmark：在 production 基础上关闭失败截图，日志级别 WARNING，用于测量纯执行耗时。
+
+配置档按以下优先级选择：工作项 payload 的 `execution_profile` > 工作流 YAML 的 `profile`
+> 环境变量 `EXECUTION_PROFILE` > `debug`（保持原有行为）。
+"""
+from typing import Dict, List, Optional
+import logging
+import os
+
+# 各字段含义：
+#   headless           无头浏览器，None 表示沿用 robocorp.browser 的默认值
+#   slowmo             每个浏览器操作之间的延迟（毫秒）
+#   log_level          根日志级别
+#   enumerate_frames   切换 iframe 时记录当前上下文的所有 frame
+#   save_sources       新窗口/iframe 切换后主动保存页面源码
+#   error_screenshots  步骤失败时截图
+#   verbose_payloads   完整打印提取数据和映射指令 JSON
+PROFILES: Dict[str, Dict] = {
+    'debug': {
+        'headless': None, 'slowmo': 0, 'log_level': logging.INFO,
+        'enumerate_frames': True, 'save_sources': True, 'error_screenshots': True, 'verbose_payloads': True,
+    },
+    'production': {
+        'headless': True, 'slowmo': 0, 'log_level': logging.INFO,
+        'enumerate_frames': False, 'save_sources': False, 'error_screenshots': True, 'verbose_payloads': False,
+    },
+    'benchmark': {
+        'headless': True, 'slowmo': 0, 'log_level': logging.WARNING,
+        'enumerate_frames': False, 'save_sources': False, 'error_screenshots': False, 'verbose_payloads': False,
+    },
+}
+DEFAULT_PROFILE = 'debug'
+
+_active_profile = dict(PROFILES[DEFAULT_PROFILE], name=DEFAULT_PROFILE)
+
+
+def profile_names() -> List[str]:
+    return list(PROFILES)
+
+
+def get_profile(name: Optional[str] = None, **overrides) -> Dict:
+    """
+    按名称返回配置档，name 为空时使用 `EXECUTION_PROFILE` 环境变量。
+    overrides 可覆盖单个字段，例如 `get_profile('debug', slowmo=250)`。
+    """
+    name = name or os.getenv('EXECUTION_PROFILE') or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown execution profile '{name}'. Available: {', '.join(PROFILES)}")
+    unknown = set(overrides) - set(PROFILES[name])
+    if unknown:
+        raise ValueError(f"Unknown execution profile option(s): {', '.join(sorted(unknown))}")
+    return dict(PROFILES[name], name=name, **overrides)
+
+
+def validate_profile_config(config) -> List[str]:
+    """校验工作流的 `profile` 段（配置档名称，或带 'name' 和字段覆盖的映射），返回错误信息列表。"""
+    if isinstance(config, str):
+        config = {'name': config}
+    if not isinstance(config, dict):
+        return ["'profile' must be a profile name or a mapping with 'name' and overrides."]
+    name = config.get('name', DEFAULT_PROFILE)
+    if name not in PROFILES:
+        return [f"Unknown execution profile '{name}'. Available: {', '.join(PROFILES)}"]
+    return [f"Unknown 'profile' option '{key}'." for key in config if key != 'name' and key not in PROFILES[name]]
+
+
+def activate_profile(profile: Dict) -> Dict:
+    """设为当前进程的配置档，并调整根日志级别。浏览器参数由执行器在启动浏览器前配置。"""
+    global _active_profile
+    _active_profile = profile
+    logging.getLogger().setLevel(profile['log_level'])
+    return profile
+
+
+def active_profile() -> Dict:
+    return _active_profile
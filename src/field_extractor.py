@@ -0,0 +1,124 @@
+"""
+字段的本地提取（LLM 之前的快速路径）。
+
+`invoice_configs.yaml` 中的字段可以声明提取规则，本地引擎先用这些规则从文档文本中提取并校验字段，
+只有缺失或校验失败的字段才交给 LLM：
+
+    - id: invoice_number
+      label: 发票号码
+      type: string
+      patterns:                      # 正则，取第一个分组（没有分组时取整个匹配）
+        - '发票号码[:：]?\\s*(\\d{20}|\\d{8})'
+      anchors: ['发票号码']           # 关键词锚点，取同一行锚点之后的第一个值
+      validate: '^(\\d{8}|\\d{20})$'  # 值（规范化后）必须完全匹配的正则
+    - id: issue_date
+      type: date
+      format: YYYY-MM-DD             # 日期统一输出为该格式，默认 YYYY-MM-DD
+
+`number` 类型会去掉货币符号和千分位并转为浮点数；`date` 类型识别 `2025年7月30日`、`2025/07/30`
+等写法。没有声明 `patterns`/`anchors` 的字段总是交给 LLM。
+"""
+from typing import Dict, List, Tuple
+import re
+
+NUMBER_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+DATE_PATTERN = re.compile(r"(\d{4})\s*[年/\-.]\s*(\d{1,2})\s*[月/\-.]\s*(\d{1,2})\s*日?")
+ANCHOR_SEPARATORS = " \t:："
+DATE_FORMATS = {'YYYY-MM-DD': '{y}-{m:02d}-{d:02d}', 'YYYY/MM/DD': '{y}/{m:02d}/{d:02d}', 'YYYYMMDD': '{y}{m:02d}{d:02d}'}
+
+_compiled: Dict[str, re.Pattern] = {}
+
+
+def _regex(pattern: str) -> re.Pattern:
+    if pattern not in _compiled:
+        _compiled[pattern] = re.compile(pattern, re.MULTILINE)
+    return _compiled[pattern]
+
+
+def has_local_rules(field: Dict) -> bool:
+    return bool(field.get('patterns') or field.get('anchors'))
+
+
+def normalize_value(raw: str, field: Dict):
+    """按字段类型规范化原始文本，无法识别时返回 None。"""
+    raw = raw.strip()
+    field_type = field.get('type', 'string')
+    if field_type == 'number':
+        match = NUMBER_PATTERN.search(raw.replace('¥', '').replace('￥', ''))
+        return float(match.group(0).replace(',', '')) if match else None
+    if field_type == 'date':
+        match = DATE_PATTERN.search(raw)
+        if not match:
+            return None
+        y, m, d = (int(part) for part in match.groups())
+        if not (1 <= m <= 12 and 1 <= d <= 31):
+            return None
+        return DATE_FORMATS.get(field.get('format', 'YYYY-MM-DD'), DATE_FORMATS['YYYY-MM-DD']).format(y=y, m=m, d=d)
+    return raw or None
+
+
+def _is_valid(value, field: Dict) -> bool:
+    pattern = field.get('validate')
+    return value is not None and (not pattern or _regex(pattern).fullmatch(str(value)) is not None)
+
+
+def _anchor_candidates(text: str, anchor: str, field: Dict) -> List[str]:
+    """锚点之后、同一行内的文本。字符串字段只取第一个以空白分隔的片段。"""
+    candidates = []
+    for match in re.finditer(re.escape(anchor), text):
+        rest = text[match.end():].split('\n', 1)[0].lstrip(ANCHOR_SEPARATORS)
+        if not rest:
+            continue
+        candidates.append(rest.split()[0] if field.get('type', 'string') == 'string' else rest)
+    return candidates
+
+
+def extract_field(text: str, field: Dict):
+    """按 patterns、anchors 的顺序提取字段，返回第一个通过校验的规范化值，没有则返回 None。"""
+    candidates = []
+    for pattern in field.get('patterns', []):
+        for match in _regex(pattern).finditer(text):
+            candidates.append(match.group(1) if match.groups() else match.group(0))
+    for anchor in field.get('anchors', []):
+        candidates.extend(_anchor_candidates(text, anchor, field))
+    for raw in candidates:
+        if raw is None:
+            continue
+        value = normalize_value(raw, field)
+        if _is_valid(value, field):
+            return value
+    return None
+
+
+def extract_fields(text: str, fields: List[Dict]) -> Tuple[Dict, List[Dict]]:
+    """
+    对文档文本应用所有字段的本地规则。
+    返回 (本地提取到的 {字段 id: 值}, 仍需交给 LLM 的字段列表)。
+    """
+    values = {}
+    missing = []
+    for field in fields:
+        value = extract_field(text, field) if text and has_local_rules(field) else None
+        if value is None:
+            missing.append(field)
+        else:
+            values[field['id']] = value
+    return values, missing
+
+
+def build_missing_fields_prompt(template: Dict, missing: List[Dict], known: Dict,
+                                ocr_text_1: str, ocr_text_2: str, image: str) -> str:
+    """只询问缺失字段的精简 prompt，已在本地提取的字段作为上下文提供。"""
+    field_lines = "\n".join(f'  "{field["id"]}": "{field.get("label", field["id"])}"' for field in missing)
+    parts = [
+        f"从以下{template.get('name', '文档')}的文本中提取下列字段，并以JSON格式返回，信息不存在时返回 null。请严格以OCR文本为准。",
+        "```json\n{\n" + field_lines + "\n}\n```",
+    ]
+    if known:
+        parts.append("已确认的字段（仅供参考，无需返回）：" + ", ".join(f"{k}={v}" for k, v in known.items()))
+    if image:
+        parts.append(f"图片：{image}")
+    parts.append(f"OCR文本1：{ocr_text_1}")
+    if ocr_text_2:
+        parts.append(f"OCR文本2：{ocr_text_2}")
+    return "\n\n".join(parts)
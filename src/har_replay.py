@@ -0,0 +1,176 @@
+"""
+HAR 录制/回放，让工作流可以离线、确定性地运行。
+
+- record：启动浏览器前通过 `browser.configure_context` 打开 Playwright 的 HAR 录制，
+  任务结束、浏览器上下文关闭时把本次运行的全部网络流量（含响应内容）写入 HAR 文件；
+- replay：在浏览器上下文上安装路由，按 "方法 + URL" 从 HAR 中返回录制的响应，
+  同一 URL 的多次请求按录制顺序依次返回；URL 只差查询参数（如时间戳防缓存参数）时也能匹配。
+  每条录制只会被消费一次，无论是按完整 URL 还是按去掉查询参数的路径匹配到的。
+
+回放延迟 `latency` 可选 `none`（零延迟，只测执行器本身的开销）或 `recorded`（按录制时服务器的
+等待+接收时间延迟返回）。延迟通过请求所属页面的 `wait_for_timeout` 在 Playwright 的事件循环上等待，
+等待期间其他请求的路由回调照常执行，并发请求的延迟不会累加；没有所属页面的请求（如 Service Worker）
+只能阻塞等待。
+"""
+from typing import Dict, List, Optional
+from collections import defaultdict, deque
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+HAR_MODES = ('record', 'replay')
+LATENCY_MODES = ('none', 'recorded')
+NOT_FOUND_MODES = ('abort', 'fallback')
+# 响应体已解码，这些头部不能原样返回
+_SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+def validate_har_config(config) -> List[str]:
+    """校验工作项 payload 中的 `har` 段，返回错误信息列表。"""
+    if not isinstance(config, dict):
+        return ["'har' must be a mapping with 'mode' and 'path'."]
+    errors = []
+    if config.get('mode') not in HAR_MODES:
+        errors.append(f"'har.mode' must be one of: {', '.join(HAR_MODES)}.")
+    if not config.get('path'):
+        errors.append("'har.path' is required.")
+    elif config.get('mode') == 'replay' and not os.path.exists(config['path']):
+        errors.append(f"HAR file not found: {config['path']}")
+    if config.get('latency', 'none') not in LATENCY_MODES:
+        errors.append(f"'har.latency' must be one of: {', '.join(LATENCY_MODES)}.")
+    if config.get('not_found', 'abort') not in NOT_FOUND_MODES:
+        errors.append(f"'har.not_found' must be one of: {', '.join(NOT_FOUND_MODES)}.")
+    return errors
+
+
+def recording_context_options(har_path: str) -> Dict:
+    """录制模式下传给 `browser.configure_context` 的参数。"""
+    har_dir = os.path.dirname(os.path.abspath(har_path))
+    os.makedirs(har_dir, exist_ok=True)
+    return {'record_har_path': har_path, 'record_har_content': 'embed', 'record_har_mode': 'full'}
+
+
+def _strip_query(url: str) -> str:
+    return url.split('?', 1)[0].split('#', 1)[0]
+
+
+class _Recorded:
+    """一条录制条目，同时出现在按 URL 和按路径的两个队列中，共用同一个已消费标记。"""
+    __slots__ = ('entry', 'consumed')
+
+    def __init__(self, entry: Dict):
+        self.entry = entry
+        self.consumed = False
+
+
+def _take(queue: deque) -> Dict:
+    """取队列中下一条未消费的条目并标记为已消费；最后一条留在队列中重复使用（轮询类请求）。"""
+    while len(queue) > 1 and queue[0].consumed:
+        queue.popleft()
+    recorded = queue.popleft() if len(queue) > 1 else queue[0]
+    recorded.consumed = True
+    return recorded.entry
+
+
+def _server_time(entry: Dict) -> float:
+    """录制时服务器的等待 + 接收时间（秒），缺失时退回整体耗时。"""
+    timings = entry.get('timings') or {}
+    wait = max(timings.get('wait', 0) or 0, 0) + max(timings.get('receive', 0) or 0, 0)
+    return (wait or max(entry.get('time', 0) or 0, 0)) / 1000
+
+
+class HarReplayer:
+    def __init__(self, har_path: str, latency: str = 'none', not_found: str = 'abort'):
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"Unknown HAR replay latency '{latency}'. Expected one of: {', '.join(LATENCY_MODES)}")
+        if not_found not in NOT_FOUND_MODES:
+            raise ValueError(f"Unknown HAR not_found mode '{not_found}'. Expected one of: {', '.join(NOT_FOUND_MODES)}")
+        self.har_path = har_path
+        self.latency = latency
+        self.not_found = not_found
+        self.exact = defaultdict(deque)
+        self.by_path = defaultdict(deque)
+        self.served_requests = 0
+        self.missing_requests = 0
+        self.missing_urls = []
+        self.replayed_server_seconds = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        with open(self.har_path, 'r', encoding='utf-8') as f:
+            har = json.load(f)
+        entries = sorted(har.get('log', {}).get('entries', []), key=lambda e: e.get('startedDateTime', ''))
+        for entry in entries:
+            if (entry.get('response') or {}).get('status', 0) <= 0:
+                continue # 录制时被中止或失败的请求
+            method = entry['request']['method']
+            url = entry['request']['url']
+            recorded = _Recorded(entry)
+            self.exact[(method, url)].append(recorded)
+            self.by_path[(method, _strip_query(url))].append(recorded)
+        logging.info(f"Loaded {len(entries)} HAR entries from {self.har_path}")
+
+    def match(self, method: str, url: str) -> Optional[Dict]:
+        """返回下一个匹配的录制条目；同一 URL 的最后一条会被重复使用（轮询类请求）。"""
+        with self._lock:
+            for queue in (self.exact.get((method, url)), self.by_path.get((method, _strip_query(url)))):
+                if queue:
+                    return _take(queue)
+        return None
+
+    @staticmethod
+    def _wait(route, seconds: float):
+        """在 Playwright 的事件循环上等待，期间其他路由回调可以执行。"""
+        try:
+            page = route.request.frame.page
+        except Exception: # Service Worker 发出的请求没有所属的 frame
+            page = None
+        if page is None:
+            time.sleep(seconds)
+        else:
+            page.wait_for_timeout(seconds * 1000)
+
+    def handle_route(self, route):
+        request = route.request
+        entry = self.match(request.method, request.url)
+        if entry is None:
+            with self._lock:
+                self.missing_requests += 1
+                if len(self.missing_urls) < 50:
+                    self.missing_urls.append(request.url)
+            if self.not_found == 'fallback':
+                route.fallback()
+            else:
+                route.abort()
+            return
+        response = entry['response']
+        if self.latency == 'recorded':
+            delay = _server_time(entry)
+            self._wait(route, delay)
+            with self._lock:
+                self.replayed_server_seconds += delay
+        content = response.get('content') or {}
+        body = content.get('text', '')
+        body = base64.b64decode(body) if content.get('encoding') == 'base64' else body.encode('utf-8')
+        headers = {h['name']: h['value'] for h in response.get('headers', []) if h['name'].lower() not in _SKIPPED_HEADERS}
+        with self._lock:
+            self.served_requests += 1
+        route.fulfill(status=response.get('status', 200), headers=headers, body=body)
+
+    def install(self, context):
+        """在浏览器上下文上安装回放路由，须在第一个步骤之前调用。"""
+        context.route('**/*', self.handle_route)
+        logging.info(f"Replaying network traffic from {self.har_path} (latency: {self.latency}, not found: {self.not_found})")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'served_requests': self.served_requests,
+                'missing_requests': self.missing_requests,
+                'missing_urls': list(self.missing_urls),
+                'replayed_server_seconds': round(self.replayed_server_seconds, 3),
+            }
@@ -0,0 +1,99 @@
+"""
+任务提交的幂等层。
+
+同一份票据针对同一个工作流重复提交（双击、客户端重试）时，不应再跑一遍完整流程、更不应向 OA
+重复提交报销单。幂等键为客户端提供的 `Idempotency-Key`，或 "工作流文件哈希 + 各上传文件内容哈希
++ 运行选项（执行配置档、是否采样分析）"。
+
+- 键对应的任务仍在进行中：重复提交挂到该任务上；
+- 任务已完成且仍在复用窗口内（`IDEMPOTENCY_WINDOW` 秒，默认 24 小时，从首次提交算起）：直接返回其结果；
+- 任务失败、已过窗口或已不存在：重新提交会启动新任务并接管该键。
+
+记录保存在 SQLite 中（默认 `devdata/idempotency.db`），多个 API 进程共享同一文件时，
+判断与接管在同一个 `BEGIN IMMEDIATE` 事务中完成，并发的重复提交只会启动一个任务。
+"""
+from typing import Callable, Dict, Iterable, Optional
+from contextlib import closing
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.getenv('IDEMPOTENCY_DB', os.path.join(PROJECT_ROOT, 'devdata', 'idempotency.db'))
+DEFAULT_WINDOW = float(os.getenv('IDEMPOTENCY_WINDOW', str(24 * 3600)))
+
+# 任务状态（与 /api/tasks/<task_id> 返回的状态一致）
+IN_PROGRESS_STATUSES = {'PENDING', 'RUNNING'}
+COMPLETED = 'COMPLETED'
+# 刚登记、尚未入队/启动的任务查不到状态，在这段时间内仍视为进行中
+LAUNCH_GRACE = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def submission_key(workflow_hash: str, file_hashes: Iterable[str], options: Optional[Dict] = None) -> str:
+    """
+    由工作流哈希、上传文件内容哈希（与顺序、文件名无关）和运行选项（执行配置档、是否采样分析等）
+    计算幂等键。选项不同的提交（例如用 debug 配置档重跑以排查问题）不会复用已有任务。
+    """
+    digest = hashlib.sha256(workflow_hash.encode())
+    for file_hash in sorted(file_hashes):
+        digest.update(file_hash.encode())
+    digest.update(json.dumps(options or {}, sort_keys=True).encode())
+    return f"auto:{digest.hexdigest()}"
+
+
+class IdempotencyStore:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, window: float = DEFAULT_WINDOW):
+        self.db_path = db_path
+        self.window = window
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def claim(self, key: str, task_id: str, task_status: Callable[[str], Optional[str]]) -> Dict:
+        """
+        为键登记新任务，或返回可复用的已有任务。task_status 返回已有任务的状态（不存在时返回 None）。
+        返回 {"task_id": ..., "reused": bool, "status": 已有任务的状态或 None}。
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute("SELECT task_id, created_at FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+                if row:
+                    status = task_status(row['task_id'])
+                    if status is None and now - row['created_at'] < LAUNCH_GRACE:
+                        status = 'PENDING'
+                    within_window = now - row['created_at'] <= self.window
+                    if status in IN_PROGRESS_STATUSES or (status == COMPLETED and within_window):
+                        conn.execute('COMMIT')
+                        return {'task_id': row['task_id'], 'reused': True, 'status': status}
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (key, task_id, created_at) VALUES (?, ?, ?)",
+                    (key, task_id, now))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return {'task_id': task_id, 'reused': False, 'status': None}
+
+    def release(self, key: str, task_id: str):
+        """任务未能启动时释放键，避免后续提交挂到一个不存在的任务上。"""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND task_id = ?", (key, task_id))
@@ -0,0 +1,95 @@
+"""
+多模态提示词之前的图片规范化。
+
+手机拍摄的票据照片通常是 4000×3000 的 JPEG，直接 base64 嵌入提示词会放大请求体、上传时间和
+本地模型的视觉 token 开销。本模块在图片交给 `LLMService` 之前依次执行：
+自动旋转（EXIF）→ 裁剪到票据区域 → 按最长边缩放 → 以目标质量重新编码为 JPEG，
+结果按 "原图内容哈希 + 参数" 缓存。
+"""
+from typing import Optional, Tuple
+import hashlib
+import os
+
+from src.document_reader import file_content_hash
+from src.metrics import record_cache
+
+CACHE_DIR = os.path.join(os.getcwd(), 'output', 'cache', 'normalized_images')
+MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '1600'))
+JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '80'))
+# 与背景色的灰度差超过该阈值的像素被视为票据内容
+CROP_THRESHOLD = int(os.getenv('IMAGE_CROP_THRESHOLD', '40'))
+
+
+def _background_level(gray) -> int:
+    """用图片四条边的像素中位数估计背景灰度。"""
+    width, height = gray.size
+    pixels = gray.load()
+    border = [pixels[x, 0] for x in range(width)] + [pixels[x, height - 1] for x in range(width)]
+    border += [pixels[0, y] for y in range(height)] + [pixels[width - 1, y] for y in range(height)]
+    border.sort()
+    return border[len(border) // 2]
+
+
+def find_document_box(image, threshold: int = CROP_THRESHOLD) -> Optional[Tuple[int, int, int, int]]:
+    """
+    找出与背景明显不同的区域（即票据本身）的边界框。
+    找不到、或区域几乎覆盖全图/过小时返回 None，表示不裁剪。
+    """
+    from PIL import ImageChops, ImageFilter
+    # 在缩略图上计算，避免逐像素处理大图
+    probe = image.convert('L')
+    probe.thumbnail((400, 400))
+    probe = probe.filter(ImageFilter.MedianFilter(5))
+    background = _background_level(probe)
+    mask = ImageChops.difference(probe, probe.point(lambda _: background))
+    mask = mask.point(lambda v: 255 if v > threshold else 0)
+    box = mask.getbbox()
+    if not box:
+        return None
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    probe_area = probe.size[0] * probe.size[1]
+    if box_area > 0.95 * probe_area or box_area < 0.1 * probe_area:
+        return None
+    scale_x = image.size[0] / probe.size[0]
+    scale_y = image.size[1] / probe.size[1]
+    margin = 2
+    return (
+        max(0, int((box[0] - margin) * scale_x)),
+        max(0, int((box[1] - margin) * scale_y)),
+        min(image.size[0], int((box[2] + margin) * scale_x)),
+        min(image.size[1], int((box[3] + margin) * scale_y)),
+    )
+
+
+def normalize_image(file_path: str, max_side: int = MAX_SIDE, quality: int = JPEG_QUALITY, crop: bool = True) -> str:
+    """
+    规范化图片并返回规范化后的 JPEG 路径。相同内容和参数的图片只处理一次。
+    """
+    from PIL import Image, ImageOps
+    params = f"{max_side}-{quality}-{int(crop)}-{CROP_THRESHOLD}"
+    cache_key = hashlib.sha256(f"{file_content_hash(file_path)}-{params}".encode()).hexdigest()
+    normalized_path = os.path.join(CACHE_DIR, f"{cache_key}.jpg")
+    if os.path.exists(normalized_path):
+        record_cache('normalized_image', hit=True)
+        return normalized_path
+    record_cache('normalized_image', hit=False)
+
+    with Image.open(file_path) as original:
+        image = ImageOps.exif_transpose(original)
+        original_size = image.size
+        if crop:
+            box = find_document_box(image)
+            if box:
+                image = image.crop(box)
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f"{normalized_path}.{os.getpid()}.tmp"
+        image.save(temp_path, format='JPEG', quality=quality, optimize=True)
+        os.replace(temp_path, normalized_path)
+
+    print(f"[IMAGE] 规范化 {os.path.basename(file_path)}: {original_size} -> {image.size}, "
+          f"{os.path.getsize(file_path)} -> {os.path.getsize(normalized_path)} 字节")
+    return normalized_path
@@ -0,0 +1,239 @@
+"""
+已处理票据的持久化索引，用于在 LLM 提取和浏览器提交之前拦截重复票据。
+
+同一张发票可能以不同文件名、在不同批次或不同日期再次出现。索引记录每张已处理票据的发票号码、
+规范化后的金额（两位小数）和日期（YYYY-MM-DD）以及文件内容哈希，按流程阶段分开：
+
+- `excel`：已通过 `process_receipts_and_fill_excel` 填入报销 Excel；
+- `submission`：已通过 `robots/reimbursement.py` 提交到报销系统。
+
+判定规则：同一阶段内文件内容哈希相同即为重复（在提取之前即可判断）；发票号码相同且金额、日期
+不冲突（任一方缺失视为不冲突）也为重复。号码相同但金额或日期不同的票据（如旧版 8 位发票号码
+在不同发票代码下重复）不视为重复。
+
+记录保存在 SQLite 中（默认 `devdata/invoice_index.db`，可用 `INVOICE_INDEX_DB` 指定），
+查询走 (阶段, 发票号码) 和 (阶段, 文件哈希) 索引。设置 `INVOICE_INDEX_ENABLED=false` 可关闭。
+
+多个 worker 并发提交时，`claim()` 在同一个 `BEGIN IMMEDIATE` 事务中完成判重并插入一条 `pending`
+记录，其他 worker 随后的判重会看到它；浏览器提交成功后 `complete_claim()` 将其标记为 `done`，
+失败时 `release_claim()` 删除它。进程崩溃遗留的 `pending` 记录超过 `INVOICE_CLAIM_TTL` 秒
+（默认 1 小时）后失效。
+"""
+from typing import Dict, List, Optional
+from contextlib import closing
+import logging
+import os
+import sqlite3
+import time
+
+from src.field_extractor import normalize_value
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.getenv('INVOICE_INDEX_DB', os.path.join(PROJECT_ROOT, 'devdata', 'invoice_index.db'))
+
+STAGE_EXCEL = 'excel'
+STAGE_SUBMISSION = 'submission'
+
+PENDING = 'pending'
+DONE = 'done'
+CLAIM_TTL = float(os.getenv('INVOICE_CLAIM_TTL', '3600'))
+
+# 不同票据类型中金额和日期字段的名称，按优先级排列
+AMOUNT_KEYS = ('amount', 'total_amount_nett_incl_tax', 'total_amount', 'price')
+DATE_KEYS = ('date', 'issue_date', 'booking_date', 'start_date')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage TEXT NOT NULL,
+    invoice_number TEXT,
+    amount TEXT,
+    invoice_date TEXT,
+    file_hash TEXT,
+    reference TEXT,
+    processed_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'done'
+);
+CREATE INDEX IF NOT EXISTS idx_processed_invoices_number ON processed_invoices (stage, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_processed_invoices_file ON processed_invoices (stage, file_hash);
+"""
+
+# 同一张发票（号码、金额、日期都相同）在同一阶段只能有一条记录，并发的 claim 无法同时插入
+_UNIQUE_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_processed_invoices_identity
+    ON processed_invoices (stage, invoice_number, amount, invoice_date) WHERE invoice_number IS NOT NULL
+"""
+
+
+class DuplicateInvoiceError(ValueError):
+    """票据已在该阶段处理过。`match` 为索引中的已有记录。"""
+
+    def __init__(self, message: str, match: Dict):
+        super().__init__(message)
+        self.match = match
+
+
+def _first_value(data: Dict, keys) -> Optional[str]:
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def invoice_identity(data: Dict) -> Dict[str, Optional[str]]:
+    """从提取结果或表单数据中取出发票号码并规范化金额和日期，无法识别的部分为 None。"""
+    invoice_number = str(data.get('invoice_number') or '').strip() or None
+    amount = _first_value(data, AMOUNT_KEYS)
+    if amount is not None:
+        amount = normalize_value(str(amount), {'type': 'number'})
+    date = _first_value(data, DATE_KEYS)
+    if date is not None:
+        date = normalize_value(str(date), {'type': 'date'})
+    return {
+        'invoice_number': invoice_number,
+        'amount': f"{amount:.2f}" if amount is not None else None,
+        'invoice_date': date,
+    }
+
+
+def identities_match(a: Dict, b: Dict) -> bool:
+    """两个 invoice_identity 结果是否指向同一张发票：号码相同，金额和日期不冲突。"""
+    if not a['invoice_number'] or a['invoice_number'] != b['invoice_number']:
+        return False
+    return all(a[k] is None or b[k] is None or a[k] == b[k] for k in ('amount', 'invoice_date'))
+
+
+class InvoiceIndex:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(processed_invoices)")}
+            if columns and 'status' not in columns: # 旧版本创建的数据库
+                conn.execute("ALTER TABLE processed_invoices ADD COLUMN status TEXT NOT NULL DEFAULT 'done'")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.execute(_UNIQUE_INDEX)
+            except sqlite3.IntegrityError:
+                logging.warning(f"Invoice index {db_path} already holds duplicate rows; relying on transactional claims only.")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _live(row) -> bool:
+        # 过期的 pending 记录来自崩溃的进程，不再视为重复
+        return row['status'] == DONE or time.time() - row['processed_at'] < CLAIM_TTL
+
+    def _find_file(self, conn: sqlite3.Connection, file_hash: str, stage: str) -> Optional[Dict]:
+        rows = conn.execute("SELECT * FROM processed_invoices WHERE stage = ? AND file_hash = ?",
+                            (stage, file_hash)).fetchall()
+        return next((dict(row) for row in rows if self._live(row)), None)
+
+    def _find_invoice(self, conn: sqlite3.Connection, identity: Dict, stage: str) -> Optional[Dict]:
+        if not identity['invoice_number']:
+            return None
+        rows = conn.execute("SELECT * FROM processed_invoices WHERE stage = ? AND invoice_number = ?",
+                            (stage, identity['invoice_number'])).fetchall()
+        return next((dict(row) for row in rows if self._live(row) and identities_match(identity, dict(row))), None)
+
+    def find_file(self, file_hash: str, stage: str) -> Optional[Dict]:
+        """按文件内容哈希查找，用于在提取之前拦截重复文件。"""
+        with closing(self._connect()) as conn:
+            return self._find_file(conn, file_hash, stage)
+
+    def find_invoice(self, data: Dict, stage: str) -> Optional[Dict]:
+        """按发票号码查找金额、日期不冲突的已有记录。没有发票号码时返回 None。"""
+        with closing(self._connect()) as conn:
+            return self._find_invoice(conn, invoice_identity(data), stage)
+
+    def _match(self, conn, stage: str, data: Optional[Dict], file_hash: Optional[str]) -> Optional[Dict]:
+        return ((self._find_file(conn, file_hash, stage) if file_hash else None)
+                or (self._find_invoice(conn, invoice_identity(data), stage) if data else None))
+
+    @staticmethod
+    def _duplicate(stage: str, match: Dict) -> DuplicateInvoiceError:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(match['processed_at']))
+        action = '正在处理' if match['status'] == PENDING else '处理过'
+        return DuplicateInvoiceError(
+            f"票据已于 {when} {action} (阶段 {stage}, 发票号码 {match['invoice_number']}, 参考 {match['reference']})", match)
+
+    def check(self, stage: str, data: Optional[Dict] = None, file_hash: Optional[str] = None):
+        """票据已处理过（或正被其他进程处理）时抛出 DuplicateInvoiceError。"""
+        with closing(self._connect()) as conn:
+            match = self._match(conn, stage, data, file_hash)
+        if match:
+            raise self._duplicate(stage, match)
+
+    def claim(self, stage: str, data: Optional[Dict] = None, file_hash: Optional[str] = None) -> int:
+        """
+        在一个事务中判重并登记一条 pending 记录，返回记录 ID。重复时抛出 DuplicateInvoiceError。
+        处理成功后调用 complete_claim，失败时调用 release_claim。
+        """
+        identity = invoice_identity(data or {})
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                match = self._match(conn, stage, data, file_hash)
+                if match:
+                    raise self._duplicate(stage, match)
+                # 清除同一身份下过期的 pending 记录，否则唯一索引会拒绝新的登记
+                conn.execute(
+                    "DELETE FROM processed_invoices WHERE stage = ? AND invoice_number = ? AND status = ? AND processed_at < ?",
+                    (stage, identity['invoice_number'], PENDING, now - CLAIM_TTL))
+                cursor = conn.execute(
+                    "INSERT INTO processed_invoices (stage, invoice_number, amount, invoice_date, file_hash, processed_at, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (stage, identity['invoice_number'], identity['amount'], identity['invoice_date'], file_hash, now, PENDING))
+                conn.execute('COMMIT')
+                return cursor.lastrowid
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def complete_claim(self, claim_id: int, reference: Optional[str] = None):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE processed_invoices SET status = ?, reference = ?, processed_at = ? WHERE id = ?",
+                         (DONE, reference, time.time(), claim_id))
+
+    def release_claim(self, claim_id: int):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM processed_invoices WHERE id = ? AND status = ?", (claim_id, PENDING))
+
+    def record(self, stage: str, data: Optional[Dict] = None, file_hash: Optional[str] = None,
+               reference: Optional[str] = None):
+        self.record_many(stage, [{'data': data, 'file_hash': file_hash, 'reference': reference}])
+
+    def record_many(self, stage: str, entries: List[Dict]):
+        """批量登记，entries 中每项为 {"data", "file_hash", "reference"}。"""
+        rows = []
+        now = time.time()
+        for entry in entries:
+            identity = invoice_identity(entry.get('data') or {})
+            rows.append((stage, identity['invoice_number'], identity['amount'], identity['invoice_date'],
+                         entry.get('file_hash'), entry.get('reference'), now))
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN')
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_invoices (stage, invoice_number, amount, invoice_date, file_hash, reference, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute('COMMIT')
+
+
+_index: Optional[InvoiceIndex] = None
+
+
+def get_invoice_index() -> Optional[InvoiceIndex]:
+    """进程内共享的索引；`INVOICE_INDEX_ENABLED=false` 时返回 None。"""
+    global _index
+    if os.getenv('INVOICE_INDEX_ENABLED', 'true').lower() != 'true':
+        return None
+    if _index is None:
+        _index = InvoiceIndex()
+    return _index
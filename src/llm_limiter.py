@@ -0,0 +1,159 @@
+"""
+LLM 调用的自适应并发限制器（进程内共享，每个 LLM 后端一个）。
+
+本地 LLM 服务（LM Studio 等）在请求过多时吞吐会急剧下降。限制器按 AIMD 方式调整并发上限：
+- 请求成功且延迟未超过目标时，加性增加（每轮约 +1）；
+- 出现 429/5xx、连接错误或延迟超过目标时，乘性减少（减半），同一轮内只减少一次。
+
+超出上限的请求按优先级排队（数值越小越优先），交互式的 `generate_workflow_yaml`
+排在批量票据提取之前。`stats()` 返回当前上限、在途请求数和排队深度。
+"""
+from typing import Callable, Dict, Optional
+from collections import deque
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+import requests
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# 被视为服务过载的 HTTP 状态码
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def overload_signal(error: Exception) -> Optional[bool]:
+    """异常是否说明后端过载：429/5xx、连接错误和超时为 True，其余 HTTP 错误（如 400）为 None，表示与负载无关。"""
+    if isinstance(error, requests.HTTPError):
+        if error.response is not None and error.response.status_code in OVERLOAD_STATUS_CODES:
+            return True
+        return None
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return None
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, initial_limit: float = 2, min_limit: int = 1, max_limit: int = 16,
+                 latency_target: Optional[float] = None, latency_tolerance: float = 2.5,
+                 decrease_factor: float = 0.5, window: int = 50):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # 未配置目标延迟时，以最近窗口内的最小延迟乘以容忍倍数作为目标
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.recent_latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _current_target(self) -> Optional[float]:
+        if self.latency_target is not None:
+            return self.latency_target
+        if len(self.recent_latencies) < 5:
+            return None
+        return min(self.recent_latencies) * self.latency_tolerance
+
+    def acquire(self, priority: int = PRIORITY_BATCH) -> float:
+        """阻塞直到获得一个并发名额，返回获得名额的时间（用于 release）。"""
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            while self._waiters[0] != entry or self.in_flight >= int(self.limit):
+                self._condition.wait()
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            # 队首变化后唤醒其他等待者，让下一个请求检查是否还有名额
+            self._condition.notify_all()
+            return time.monotonic()
+
+    def try_acquire(self) -> Optional[float]:
+        """有空闲名额且没有人排队时立即获得名额并返回获得时间，否则返回 None（用于对冲请求）。"""
+        with self._condition:
+            if self._waiters or self.in_flight >= int(self.limit):
+                return None
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started_at: float, overloaded: Optional[bool]):
+        """
+        归还名额，并根据本次请求的结果调整并发上限。
+        overloaded 为 None 表示结果与负载无关（如 400 错误），不调整上限。
+        """
+        latency = time.monotonic() - started_at
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded is None:
+                self._condition.notify_all()
+                return
+            target = self._current_target()
+            too_slow = target is not None and latency > target
+            if overloaded or too_slow:
+                # 在上次减少之后才开始的请求才能反映当前上限下的负载，避免一次过载被重复惩罚
+                if started_at > self._last_decrease:
+                    old_limit = self.limit
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+                    logging.warning(f"LLM limiter: {'overload' if overloaded else f'latency {latency:.1f}s > {target:.1f}s'}, "
+                                    f"limit {old_limit:.1f} -> {self.limit:.1f}")
+            else:
+                self.recent_latencies.append(latency)
+                # 只有在名额被用满时才说明上限可能偏低
+                if self.in_flight + 1 >= int(self.limit):
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def run(self, fn: Callable, priority: int = PRIORITY_BATCH):
+        """在限制器内执行 fn，根据异常类型判断是否为过载信号。"""
+        started_at = self.acquire(priority)
+        overloaded = None
+        try:
+            result = fn()
+            overloaded = False
+            return result
+        except Exception as e:
+            overloaded = overload_signal(e)
+            raise
+        finally:
+            self.release(started_at, overloaded)
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'queue_depth': len(self._waiters),
+            }
+
+
+_limiters = {}
+_limiter_lock = threading.Lock()
+
+
+def get_llm_limiter(backend: str = 'local') -> AdaptiveConcurrencyLimiter:
+    """返回指定后端在进程内共享的限制器，参数可通过环境变量配置。"""
+    with _limiter_lock:
+        if backend not in _limiters:
+            latency_target = os.getenv('LLM_LATENCY_TARGET')
+            _limiters[backend] = AdaptiveConcurrencyLimiter(
+                initial_limit=float(os.getenv('LLM_INITIAL_CONCURRENCY', '2')),
+                min_limit=int(os.getenv('LLM_MIN_CONCURRENCY', '1')),
+                max_limit=int(os.getenv('LLM_MAX_CONCURRENCY', '16')),
+                latency_target=float(latency_target) if latency_target else None,
+            )
+        return _limiters[backend]
+
+
+def all_limiter_stats() -> Dict[str, Dict]:
+    """所有后端限制器的当前状态。"""
+    with _limiter_lock:
+        limiters = dict(_limiters)
+    return {backend: limiter.stats() for backend, limiter in limiters.items()}
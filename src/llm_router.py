@@ -0,0 +1,280 @@
+"""
+多后端 LLM 路由（OpenAI 兼容接口），按延迟选择后端并支持对冲请求和故障转移。
+
+- 每个后端记录最近的延迟和成功/失败结果，按 "p50 延迟 / 权重" 选择最快的健康后端；
+- 主请求在该后端 p95 延迟内未返回时，向第二个后端发送对冲请求，先成功者胜出；
+- 请求出错时立即转移到下一个后端；连续失败或错误率过高的后端被标记为不健康，
+  冷却后通过 `GET /models` 健康检查重新探测。400 等客户端错误说明请求本身有问题，
+  不计入后端健康状况，也不转移到其他后端。
+
+调用线程先在后端的自适应限制器（`src/llm_limiter.py`）中按优先级获得名额，再把请求交给线程池，
+线程池大小为各后端并发上限之和，因此请求不会在线程池中排队，交互式请求总是排在批量请求之前。
+
+后端通过 `config/llm_backends.yaml`（或 `LLM_BACKENDS_CONFIG` 指定的文件）注册：
+
+    backends:
+      - name: local-gpu
+        url: http://127.0.0.1:1234/v1/chat/completions
+        model: google/gemma-3-4b
+        weight: 1.0
+      - name: hunyuan
+        url: https://api.hunyuan.cloud.tencent.com/v1/chat/completions
+        model: hunyuan-turbos-latest
+        api_key_env: TENCENT_CLOUD_API_KEY
+        weight: 0.5
+
+没有配置文件时，只注册 `LOCAL_LLM_URL` / `LOCAL_LLM_MODEL` 指定的本地后端。
+"""
+from typing import Dict, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import os
+import threading
+import time
+
+import requests
+import yaml
+
+from src.llm_limiter import get_llm_limiter, overload_signal, PRIORITY_BATCH, OVERLOAD_STATUS_CODES
+from src.metrics import LLM_REQUEST_DURATION, LLM_TOKENS, LLM_LIMITER_LIMIT, LLM_REQUESTS_PENDING
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_CONFIG_PATH = os.getenv('LLM_BACKENDS_CONFIG', os.path.join(PROJECT_ROOT, 'config', 'llm_backends.yaml'))
+
+
+def _is_client_error(error: Exception) -> bool:
+    return (isinstance(error, requests.HTTPError) and error.response is not None
+            and 400 <= error.response.status_code < 500 and error.response.status_code not in OVERLOAD_STATUS_CODES)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LLMBackend:
+    def __init__(self, name: str, url: str, model: str, api_key: Optional[str] = None, weight: float = 1.0,
+                 timeout: float = 120, window: int = 100):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.weight = weight
+        self.timeout = timeout
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=50)
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.unhealthy_since = None
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                self.healthy = True
+                self.unhealthy_since = None
+                return
+            self.consecutive_failures += 1
+            if self.healthy and (self.consecutive_failures >= 3 or (len(self.outcomes) >= 5 and self.error_rate() > 0.5)):
+                self.healthy = False
+                self.unhealthy_since = time.monotonic()
+                logging.warning(f"LLM backend '{self.name}' marked unhealthy (error rate {self.error_rate():.0%}).")
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            if not self.latencies:
+                return None
+            return _percentile(list(self.latencies), percentile)
+
+    def score(self) -> float:
+        """越小越好。尚无延迟数据的后端得分为 0，保证新后端会被尝试。"""
+        p50 = self.latency_percentile(50)
+        return 0.0 if p50 is None else p50 / max(self.weight, 1e-6)
+
+    def check_health(self) -> bool:
+        """通过 OpenAI 兼容的 `GET /models` 探测后端。"""
+        models_url = self.url.rsplit('/chat/completions', 1)[0] + '/models'
+        try:
+            response = requests.get(models_url, headers=self._headers(), timeout=5)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        with self._lock:
+            self.healthy = ok
+            if ok:
+                self.consecutive_failures = 0
+                self.outcomes.clear()
+                self.unhealthy_since = None
+            else:
+                self.unhealthy_since = time.monotonic()
+        return ok
+
+    def _headers(self) -> Dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def stats(self) -> Dict:
+        return {
+            'healthy': self.healthy,
+            'weight': self.weight,
+            'p50_latency': self.latency_percentile(50),
+            'p95_latency': self.latency_percentile(95),
+            'error_rate': round(self.error_rate(), 3),
+        }
+
+
+class LLMRouter:
+    def __init__(self, backends: List[LLMBackend], hedge_delay: float = 10.0, min_hedge_samples: int = 10,
+                 health_check_interval: float = 30.0):
+        if not backends:
+            raise ValueError("LLMRouter requires at least one backend.")
+        self.backends = backends
+        self.default_hedge_delay = hedge_delay
+        self.min_hedge_samples = min_hedge_samples
+        self.health_check_interval = health_check_interval
+        # 在途请求数不超过各后端限制器的上限之和，线程池按此大小创建就不会出现排队
+        pool_size = sum(get_llm_limiter(b.name).max_limit for b in backends)
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='llm-router')
+
+    def _ranked_backends(self) -> List[LLMBackend]:
+        now = time.monotonic()
+        for backend in self.backends:
+            if not backend.healthy and now - (backend.unhealthy_since or 0) > self.health_check_interval:
+                backend.check_health()
+        healthy = [b for b in self.backends if b.healthy]
+        return sorted(healthy, key=lambda b: b.score())
+
+    def _hedge_delay(self, backend: LLMBackend) -> float:
+        if len(backend.latencies) < self.min_hedge_samples:
+            return self.default_hedge_delay
+        return backend.latency_percentile(95)
+
+    def _start(self, backend: LLMBackend, payload: Dict, priority: int, blocking: bool = True):
+        """在调用线程中获得限制器名额后提交请求；非阻塞模式下没有空闲名额时返回 None。"""
+        limiter = get_llm_limiter(backend.name)
+        LLM_REQUESTS_PENDING.labels(backend=backend.name).inc()
+        slot = limiter.acquire(priority) if blocking else limiter.try_acquire()
+        if slot is None:
+            LLM_REQUESTS_PENDING.labels(backend=backend.name).dec()
+            return None
+        return self._pool.submit(self._send, backend, payload, slot)
+
+    def _send(self, backend: LLMBackend, payload: Dict, slot: float) -> Dict:
+        body = dict(payload, model=backend.model)
+        limiter = get_llm_limiter(backend.name)
+        started_at = time.monotonic() # 名额已获得，排队时间不计入后端延迟
+        overloaded = None
+        try:
+            response = requests.post(backend.url, headers=backend._headers(), json=body, timeout=backend.timeout)
+            response.raise_for_status()
+            result = response.json()
+            overloaded = False
+        except Exception as e:
+            overloaded = overload_signal(e)
+            latency = time.monotonic() - started_at
+            if _is_client_error(e):
+                LLM_REQUEST_DURATION.labels(backend=backend.name, outcome='client_error').observe(latency)
+            else:
+                backend.record(latency, ok=False)
+                LLM_REQUEST_DURATION.labels(backend=backend.name, outcome='error').observe(latency)
+            raise
+        finally:
+            limiter.release(slot, overloaded)
+            LLM_REQUESTS_PENDING.labels(backend=backend.name).dec()
+            LLM_LIMITER_LIMIT.labels(backend=backend.name).set(limiter.stats()['limit'])
+        latency = time.monotonic() - started_at
+        backend.record(latency, ok=True)
+        LLM_REQUEST_DURATION.labels(backend=backend.name, outcome='success').observe(latency)
+        usage = result.get('usage') or {}
+        LLM_TOKENS.labels(backend=backend.name, direction='in').inc(usage.get('prompt_tokens', 0))
+        LLM_TOKENS.labels(backend=backend.name, direction='out').inc(usage.get('completion_tokens', 0))
+        return result
+
+    def chat(self, payload: Dict, priority: int = PRIORITY_BATCH) -> Dict:
+        """发送 chat completions 请求，返回第一个成功的响应 JSON。"""
+        candidates = self._ranked_backends()
+        if not candidates:
+            raise requests.ConnectionError("No healthy LLM backend available.")
+        primary, pending = candidates[0], candidates[1:]
+        futures = {self._start(primary, payload, priority): primary}
+        hedge_delay = self._hedge_delay(primary)
+        hedged = False
+        last_error = None
+        while futures:
+            can_hedge = not hedged and pending
+            done, _ = wait(list(futures), timeout=hedge_delay if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                backend = pending[0]
+                # 对冲只使用空闲名额，后端已满时排队等待没有意义
+                future = self._start(backend, payload, priority, blocking=False)
+                if future is None:
+                    logging.info(f"LLM backend '{primary.name}' slower than {hedge_delay:.1f}s, but '{backend.name}' has no free slot to hedge.")
+                    continue
+                logging.info(f"LLM backend '{primary.name}' slower than {hedge_delay:.1f}s, hedging to '{backend.name}'.")
+                futures[future] = pending.pop(0)
+                continue
+            for future in done:
+                backend = futures.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                    logging.warning(f"LLM backend '{backend.name}' failed: {e}")
+                    if pending and not _is_client_error(e):
+                        # 故障转移：立即尝试下一个后端；还有请求在途时不阻塞等待名额
+                        future = self._start(pending[0], payload, priority, blocking=not futures)
+                        if future is not None:
+                            futures[future] = pending.pop(0)
+        raise last_error
+
+    def stats(self) -> Dict:
+        return {backend.name: backend.stats() for backend in self.backends}
+
+
+def load_backends(config_path: str = DEFAULT_CONFIG_PATH) -> List[LLMBackend]:
+    if not os.path.exists(config_path):
+        return [LLMBackend(
+            name='local',
+            url=os.getenv('LOCAL_LLM_URL', 'http://127.0.0.1:1234/v1/chat/completions'),
+            model=os.getenv('LOCAL_LLM_MODEL', 'google/gemma-3-4b'),
+        )]
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    backends = []
+    for entry in config.get('backends', []):
+        api_key = entry.get('api_key') or (os.getenv(entry['api_key_env']) if entry.get('api_key_env') else None)
+        backends.append(LLMBackend(
+            name=entry['name'],
+            url=entry['url'],
+            model=entry['model'],
+            api_key=api_key,
+            weight=float(entry.get('weight', 1.0)),
+            timeout=float(entry.get('timeout', 120)),
+        ))
+    return backends
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    """返回进程内共享的路由器。"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter(load_backends(), hedge_delay=float(os.getenv('LLM_HEDGE_DELAY', '10')))
+        return _router
@@ -0,0 +1,320 @@
+"""
+编译后的 Excel 映射计划。
+
+映射阶段分为两步：LLM 只在第一次遇到某个 (Excel 模板, 模板描述, 文档类型集合) 组合时，把自然语言
+描述编译成声明式的映射计划；之后每次运行都由本地引擎把计划套用到任意数量的提取结果上，不再调用 LLM。
+计划按组合的哈希保存在 `output/cache/mapping_plans/`（`MAPPING_PLAN_DIR`）：
+
+    {
+        "format_version": 1,
+        "key": "<sha256>",
+        "source": "llm" | "builtin",
+        "start_row": 3,
+        "rules": {
+            "jipiao": [
+                {"column": "A", "field": "booking_date"},
+                {"column": "B", "template": "{departure_city}-{arrival_city}"},
+                {"column": "D", "value": "机票"}
+            ]
+        }
+    }
+
+每条规则只能使用 `field`（取提取结果中的字段）、`template`（用字段拼接文本）或 `value`（固定值）之一，
+引用的字段必须是 invoice_configs.yaml 中为该文档类型配置的字段。修改计划格式时递增 `PLAN_FORMAT_VERSION`，
+旧计划会自动失效并重新编译；设置 `MAPPING_PLAN_REFRESH=true` 或步骤参数 `refresh_mapping_plan: true`
+可以强制重新编译（例如修改了 invoice_configs.yaml 中的字段）。
+"""
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+import re
+import string
+import time
+
+import yaml
+
+from src.metrics import record_cache
+
+PLAN_FORMAT_VERSION = 1
+PLAN_DIR = os.getenv('MAPPING_PLAN_DIR', os.path.join(os.getcwd(), 'output', 'cache', 'mapping_plans'))
+INVOICE_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'invoice_configs.yaml')
+DEFAULT_START_ROW = 3
+RULE_SOURCES = ('field', 'template', 'value')
+# 模板占位符 `{a.b}`、`{a[0]}` 引用的是字段 a
+PLACEHOLDER_FIELD = re.compile(r"^[^.\[]*")
+COLUMN_PATTERN = re.compile(r"^[A-Z]{1,3}$")
+
+DEFAULT_EXCEL_DESCRIPTION = "我的报销Excel有这几列：A列是'日期'，B列是'城市信息'，C列是'费用类型'，D列是'金额'，E列是'备注'。其中，如果是机票，就把出发和到达城市填到'城市信息'里；如果是增值税发票，就把'货物名称'填到'备注'里。"
+
+# LLM 不可用或返回的计划无效时使用的内置规则
+BUILTIN_RULES: Dict[str, List[Dict]] = {
+    'vat_general_invoice': [
+        {'column': 'A', 'field': 'issue_date'},
+        {'column': 'B', 'field': 'goods_or_taxable_service_name'},
+        {'column': 'C', 'field': 'total_amount_nett_incl_tax'},
+        {'column': 'D', 'value': '增值税发票'},
+    ],
+    'jipiao': [
+        {'column': 'A', 'field': 'booking_date'},
+        {'column': 'B', 'template': '{departure_city}-{arrival_city}'},
+        {'column': 'C', 'field': 'total_amount'},
+        {'column': 'D', 'value': '机票'},
+    ],
+    'train_ticket': [
+        {'column': 'A', 'field': 'departure_datetime'},
+        {'column': 'B', 'template': '{departure_station}-{arrival_station}'},
+        {'column': 'C', 'field': 'price'},
+        {'column': 'D', 'value': '火车票'},
+    ],
+    'xingchengdan': [
+        {'column': 'A', 'field': 'start_date'},
+        {'column': 'B', 'field': 'city'},
+        {'column': 'C', 'field': 'total_amount'},
+        {'column': 'D', 'value': '行程单'},
+    ],
+}
+
+PLAN_PROMPT = """你是报销 Excel 映射规划助手。请根据 Excel 模板描述，为每种文档类型生成列映射规则。
+
+Excel 模板描述：{description}
+模板前几行内容：{header_rows}
+各文档类型可用的字段（字段 id: 含义）：{document_fields}
+
+只返回一个 JSON 对象，格式如下，不要包含其他说明：
+{{"start_row": 数据起始行号, "rules": {{"文档类型": [{{"column": "A", "field": "字段 id"}}, {{"column": "B", "template": "{{字段 id}}-{{字段 id}}"}}, {{"column": "C", "value": "固定文本"}}]}}}}
+每条规则只能包含 field、template、value 中的一个；没有对应数据的列不要输出。"""
+
+# 进程内缓存，同一进程内的多次运行不必重复读盘
+_plans: Dict[str, Dict] = {}
+
+
+class _BlankMissing(dict):
+    def __missing__(self, key):
+        return ''
+
+
+def plan_key(template_hash: str, description: str, document_types: Iterable[str]) -> str:
+    """(模板内容, 描述, 文档类型集合, 计划格式版本) 的组合哈希。"""
+    material = json.dumps([PLAN_FORMAT_VERSION, template_hash, description.strip(), sorted(set(document_types))],
+                          ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def load_document_fields(config_path: str = INVOICE_CONFIG_PATH) -> Dict[str, Dict[str, str]]:
+    """从 invoice_configs.yaml 读取每种文档类型的字段 id 和标签。"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            configs = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+    return {
+        doc_type: {field['id']: field.get('label', field['id']) for field in template.get('fields', []) if 'id' in field}
+        for doc_type, template in (configs.get('invoice_types') or {}).items()
+    }
+
+
+def _rule_fields(rule: Dict) -> List[str]:
+    """规则引用的字段 id；模板无法解析时抛出 ValueError。"""
+    if 'field' in rule:
+        return [str(rule['field'])]
+    if 'template' in rule:
+        if not isinstance(rule['template'], str):
+            raise ValueError("template 必须是字符串")
+        return [PLACEHOLDER_FIELD.match(name).group(0)
+                for _, name, _, _ in string.Formatter().parse(rule['template']) if name is not None]
+    return []
+
+
+def validate_plan(plan: Dict, document_types: Iterable[str],
+                  document_fields: Optional[Dict[str, Dict[str, str]]] = None) -> List[str]:
+    """
+    检查计划结构，返回错误列表。`field` 和 `template` 占位符只能引用 document_fields（默认为
+    `load_document_fields()`）中该文档类型的字段，未配置字段的文档类型不能引用任何字段。
+    """
+    if document_fields is None:
+        document_fields = load_document_fields()
+    errors = []
+    if not isinstance(plan, dict):
+        return ["映射计划必须是 JSON 对象"]
+    start_row = plan.get('start_row', DEFAULT_START_ROW)
+    if not isinstance(start_row, int) or isinstance(start_row, bool) or start_row < 1:
+        errors.append(f"start_row 必须是正整数: {start_row!r}")
+    rules = plan.get('rules')
+    if not isinstance(rules, dict):
+        return errors + ["rules 必须是 文档类型 -> 规则列表 的映射"]
+    for doc_type in document_types:
+        if doc_type not in rules:
+            errors.append(f"缺少文档类型 '{doc_type}' 的规则")
+    for doc_type, doc_rules in rules.items():
+        if not isinstance(doc_rules, list):
+            errors.append(f"'{doc_type}' 的规则必须是列表")
+            continue
+        for rule in doc_rules:
+            if not isinstance(rule, dict) or not COLUMN_PATTERN.match(str(rule.get('column', ''))):
+                errors.append(f"'{doc_type}' 的规则缺少有效的 column: {rule!r}")
+                continue
+            if sum(source in rule for source in RULE_SOURCES) != 1:
+                errors.append(f"'{doc_type}' 的规则必须只包含 field/template/value 之一: {rule!r}")
+                continue
+            try:
+                fields = _rule_fields(rule)
+            except ValueError as e:
+                errors.append(f"'{doc_type}' 的规则模板无效: {rule!r} ({e})")
+                continue
+            known = document_fields.get(doc_type, {})
+            for field in fields:
+                if field not in known:
+                    errors.append(f"'{doc_type}' 的规则引用了未配置的字段 '{field}': {rule!r}")
+    return errors
+
+
+def builtin_plan(document_types: Iterable[str]) -> Dict:
+    return {
+        'start_row': DEFAULT_START_ROW,
+        'rules': {doc_type: BUILTIN_RULES.get(doc_type, []) for doc_type in sorted(set(document_types))},
+    }
+
+
+def plan_document_types(extracted_data: List[Dict]) -> List[str]:
+    """计划覆盖的文档类型：所有已配置的类型加上本次出现的类型，使同一模板的计划在不同批次间保持不变。"""
+    types = set(load_document_fields()) | set(BUILTIN_RULES)
+    types.update(item.get('document_type', 'unknown') for item in extracted_data)
+    types.discard('unknown')
+    return sorted(types)
+
+
+def _template_hash(template_path: Optional[str]) -> str:
+    if not template_path or not os.path.exists(template_path):
+        return ''
+    from src.document_reader import file_content_hash
+    return file_content_hash(template_path)
+
+
+def _header_rows(template_path: Optional[str], rows: int = 3) -> List[List]:
+    if not template_path or not os.path.exists(template_path):
+        return []
+    try:
+        import openpyxl
+        workbook = openpyxl.load_workbook(template_path, read_only=True, data_only=True)
+        try:
+            return [list(row) for row in workbook.active.iter_rows(max_row=rows, values_only=True)]
+        finally:
+            workbook.close()
+    except Exception as e:
+        print(f"Warning: 读取 Excel 模板表头失败: {e}")
+        return []
+
+
+def _generate_with_llm(template_path: Optional[str], description: str, document_types: List[str], llm) -> Dict:
+    fields = load_document_fields()
+    prompt = PLAN_PROMPT.format(
+        description=description,
+        header_rows=json.dumps(_header_rows(template_path), ensure_ascii=False, default=str),
+        document_fields=json.dumps({t: fields.get(t, {}) for t in document_types}, ensure_ascii=False),
+    )
+    plan = json.loads(llm.generate_yaml_from_prompt(prompt))
+    errors = validate_plan(plan, document_types, fields)
+    if errors:
+        raise ValueError("; ".join(errors))
+    return {'start_row': plan.get('start_row', DEFAULT_START_ROW),
+            'rules': {t: plan['rules'][t] for t in document_types}}
+
+
+def _plan_path(key: str, plan_dir: str) -> str:
+    return os.path.join(plan_dir, f"{key}.json")
+
+
+def _load_plan(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return plan if plan.get('format_version') == PLAN_FORMAT_VERSION else None
+
+
+def _save_plan(plan: Dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def compile_mapping_plan(template_path: Optional[str], description: str, document_types: Iterable[str],
+                         llm=None, plan_dir: str = PLAN_DIR, refresh: Optional[bool] = None) -> Dict:
+    """
+    返回 (模板, 描述, 文档类型集合) 对应的映射计划。已编译过的计划直接从缓存读取；否则调用一次 LLM
+    生成并保存。LLM 失败时退回内置规则，内置计划不落盘，下次运行会重新尝试编译。
+    `refresh=True` 忽略缓存重新编译，未指定时读取环境变量 `MAPPING_PLAN_REFRESH`。
+    """
+    if refresh is None:
+        refresh = os.getenv('MAPPING_PLAN_REFRESH', 'false').lower() == 'true'
+    document_types = sorted(set(document_types))
+    key = plan_key(_template_hash(template_path), description, document_types)
+    path = _plan_path(key, plan_dir)
+    plan = None if refresh else (_plans.get(path) or _load_plan(path))
+    record_cache('mapping_plan', hit=plan is not None)
+    if plan:
+        _plans[path] = plan
+        return plan
+
+    plan = {
+        'format_version': PLAN_FORMAT_VERSION,
+        'key': key,
+        'template_path': template_path,
+        'description': description,
+        'document_types': document_types,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        if llm is None:
+            from src.ai_services import LLMService
+            llm = LLMService()
+        plan.update(_generate_with_llm(template_path, description, document_types, llm), source='llm')
+    except Exception as e:
+        print(f"Warning: LLM 编译映射计划失败，使用内置规则: {e}")
+        plan.update(builtin_plan(document_types), source='builtin')
+        _plans[path] = plan
+        return plan
+
+    _save_plan(plan, path)
+    _plans[path] = plan
+    print(f"[MAPPING_PLAN] 已编译并缓存映射计划 {key[:12]}: {path}")
+    return plan
+
+
+def _rule_value(rule: Dict, data: Dict):
+    if 'value' in rule:
+        return rule['value']
+    if 'field' in rule:
+        return data.get(rule['field'], '')
+    try:
+        return rule['template'].format_map(_BlankMissing(data))
+    except (ValueError, IndexError, AttributeError) as e:
+        print(f"Warning: 映射模板 {rule['template']!r} 无法渲染: {e}")
+        return ''
+
+
+def apply_mapping_plan(plan: Dict, extracted_data: List[Dict]) -> List[Dict]:
+    """
+    在本地把映射计划套用到提取结果上，返回 `fill_excel_template` 使用的映射指令。
+    每条提取结果占一行，从计划的 `start_row` 开始；没有规则的文档类型输出空行。
+    """
+    start_row = plan.get('start_row', DEFAULT_START_ROW)
+    rules = plan.get('rules', {})
+    instructions = []
+    for item_index, item in enumerate(extracted_data):
+        data = item.get('data') or {}
+        instructions.append({
+            "source_index": item_index,
+            "target_row": start_row + item_index,
+            "mappings": [
+                {"target_column": rule['column'], "value": _rule_value(rule, data)}
+                for rule in rules.get(item.get('document_type', 'unknown'), [])
+            ],
+        })
+    return instructions
@@ -0,0 +1,98 @@
+"""
+运行指标（Prometheus 文本格式）。
+
+Web 服务、执行器子进程和队列 worker 都通过 prometheus_client 的多进程模式把指标写入同一个
+目录（`PROMETHEUS_MULTIPROC_DIR`，默认 `output/metrics`），`webapp/app.py` 的 `/metrics`
+在抓取时汇总所有进程的数据。目录由入口脚本通过 `src.metrics_config.configure_metrics_dir()` 配置，
+子进程继承父进程的环境变量；未配置时指标只保存在当前进程内。
+"""
+from typing import Iterable
+from contextlib import contextmanager
+import atexit
+import os
+import time
+
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY,
+                               generate_latest, multiprocess)
+
+from src.metrics_config import configure_metrics_dir
+
+# 与 prometheus_client 一样在导入时确定：之后再设置环境变量不会让本进程切换到多进程模式
+METRICS_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+_STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_LLM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+STAGE_DURATION = Histogram(
+    'llmrpa_stage_duration_seconds', 'Duration of document processing stages.',
+    ['stage'], buckets=_STAGE_BUCKETS)
+STEP_DURATION = Histogram(
+    'llmrpa_workflow_step_duration_seconds', 'Duration of workflow executor steps by action.',
+    ['action', 'status'], buckets=_STAGE_BUCKETS)
+LLM_REQUEST_DURATION = Histogram(
+    'llmrpa_llm_request_duration_seconds', 'LLM request latency by backend.',
+    ['backend', 'outcome'], buckets=_LLM_BUCKETS)
+LLM_TOKENS = Counter(
+    'llmrpa_llm_tokens_total', 'LLM tokens by backend and direction (in = prompt, out = completion).',
+    ['backend', 'direction'])
+LLM_LIMITER_LIMIT = Gauge(
+    'llmrpa_llm_limiter_limit', 'Current adaptive concurrency limit per backend and process.',
+    ['backend'], multiprocess_mode='liveall')
+LLM_REQUESTS_PENDING = Gauge(
+    'llmrpa_llm_requests_pending', 'LLM requests waiting for a concurrency slot or in flight.',
+    ['backend'], multiprocess_mode='livesum')
+ACTIVE_TASKS = Gauge(
+    'llmrpa_active_tasks', 'Robot tasks currently running.',
+    ['task'], multiprocess_mode='livesum')
+FIELD_EXTRACTIONS = Counter(
+    'llmrpa_field_extractions_total', 'Extracted document fields by source (local rules or LLM).',
+    ['document_type', 'source'])
+CACHE_REQUESTS = Counter(
+    'llmrpa_cache_requests_total', 'Cache lookups by cache and result (hit/miss).',
+    ['cache', 'result'])
+
+
+def mark_process_dead(pid: int):
+    """
+    清理已退出进程的 live* 仪表数据，避免它仍被计入在途任务和排队请求。
+    由启动执行器子进程的一方在子进程结束后调用：被终止或崩溃的子进程不会运行自己的 atexit。
+    """
+    if METRICS_DIR:
+        multiprocess.mark_process_dead(pid, METRICS_DIR)
+
+
+@atexit.register
+def _mark_this_process_dead():
+    mark_process_dead(os.getpid())
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """记录文档处理阶段（classify/extract/mapping/fill）的耗时。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def render_metrics(extra_collectors: Iterable = ()):
+    """汇总所有进程的指标，返回 (文本, Content-Type)。"""
+    registry = CollectorRegistry()
+    if METRICS_DIR:
+        multiprocess.MultiProcessCollector(registry, path=METRICS_DIR)
+    else:
+        registry.register(REGISTRY)
+    for collector in extra_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def reset_metrics_dir():
+    """服务启动时删除已退出进程残留的指标文件；未启用多进程模式时什么也不做。"""
+    if METRICS_DIR:
+        configure_metrics_dir(reset=True)
@@ -0,0 +1,38 @@
+"""
+Prometheus 多进程模式的目录配置。
+
+prometheus_client 在被导入时就决定指标值保存在进程内存中还是共享目录中，因此入口脚本（Web 服务、
+队列 worker）要在导入任何用到 `src.metrics` 的模块之前调用 `configure_metrics_dir()`。执行器子进程
+继承父进程的环境变量，无需再次配置；作为库导入或在测试中使用时不设置该变量，指标只保存在当前进程内。
+本模块不能导入 prometheus_client。
+"""
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_METRICS_DIR = os.path.join(PROJECT_ROOT, 'output', 'metrics')
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def configure_metrics_dir(reset: bool = False) -> str:
+    """
+    启用多进程模式：未设置 `PROMETHEUS_MULTIPROC_DIR` 时使用 `output/metrics`，并确保目录存在。
+    reset=True 时删除上一轮残留的、所属进程（文件名 `<类型>_<pid>.db`）已退出的指标文件；仍在运行的
+    队列 worker 和执行器还在写自己的文件，不能删除。只应由汇总指标的 Web 服务在启动时使用。
+    """
+    path = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', DEFAULT_METRICS_DIR)
+    os.makedirs(path, exist_ok=True)
+    if reset:
+        for name in os.listdir(path):
+            pid = name[:-len('.db')].rsplit('_', 1)[-1] if name.endswith('.db') else ''
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                os.remove(os.path.join(path, name))
+    return path
@@ -0,0 +1,200 @@
+"""
+工作流级别的网络请求过滤。
+
+工作流 YAML 可以声明一个 `network` 段，按资源类型和 URL glob 屏蔽自动化流程用不到的请求
+（图片、字体、统计脚本、门户小部件等），从而缩短 `networkidle` 等待时间：
+
+    network:
+      block:
+        resource_types: [image, font, media]
+        urls: ["**/analytics/**", "**/*.woff2"]
+      allow:
+        urls: ["**/seeyon/main.do*"]
+
+`allow` 规则优先于 `block` 规则。被屏蔽请求节省的字节数根据此前放行时记录的
+Content-Length 估算，并保存在 `output/network_sizes.json` 中供后续运行使用。大小按 host + 路径记录
+（忽略查询串，带时间戳或会话参数的 URL 不会不断产生新条目），最多保留 `MAX_KNOWN_SIZES` 条，
+超出时淘汰最久未更新的条目。
+设置 `dry_run: true` 时只统计、不屏蔽，可用于测量规则的实际收益并积累大小数据。
+"""
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+RESOURCE_TYPES = {
+    'document', 'stylesheet', 'image', 'media', 'font', 'script', 'texttrack',
+    'xhr', 'fetch', 'eventsource', 'websocket', 'manifest', 'other',
+}
+
+DEFAULT_SIZES_PATH = os.path.join('output', 'network_sizes.json')
+MAX_KNOWN_SIZES = 5000
+
+
+def size_key(url: str) -> str:
+    """大小缓存的键：host + 路径，不含协议和查询串。"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """将 Playwright 风格的 URL glob 转换为正则：`**` 匹配任意字符，`*` 不跨越 `/`，`?` 匹配单个字符。"""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '.'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(f'^{regex}$')
+
+
+def _resource_types(rules: Dict):
+    """`resource_types` 可以写成单个类型或类型列表。"""
+    value = rules.get('resource_types') or []
+    return [value] if isinstance(value, str) else value
+
+
+def validate_network_config(config) -> List[str]:
+    """校验 `network` 段，返回错误信息列表。"""
+    if not isinstance(config, dict):
+        return ["'network' must be a mapping with 'block' and/or 'allow' rules."]
+    errors = []
+    for section in config:
+        if section == 'dry_run':
+            continue
+        if section not in ('block', 'allow'):
+            errors.append(f"Unknown 'network' section '{section}'; expected 'block' or 'allow'.")
+            continue
+        rules = config[section] or {}
+        if not isinstance(rules, dict):
+            errors.append(f"'network.{section}' must be a mapping.")
+            continue
+        resource_types = _resource_types(rules)
+        if not isinstance(resource_types, list):
+            errors.append(f"'network.{section}.resource_types' must be a list.")
+            resource_types = []
+        for resource_type in resource_types:
+            if resource_type not in RESOURCE_TYPES:
+                errors.append(f"Unknown resource type '{resource_type}' in 'network.{section}'.")
+        urls = rules.get('urls', []) or []
+        if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+            errors.append(f"'network.{section}.urls' must be a list of URL globs.")
+    return errors
+
+
+class NetworkFilter:
+    """根据工作流中的 `network` 段屏蔽或放行请求，并统计屏蔽效果。"""
+
+    def __init__(self, config: Dict, sizes_path: Optional[str] = DEFAULT_SIZES_PATH):
+        errors = validate_network_config(config)
+        if errors:
+            raise ValueError("Invalid network configuration: " + "; ".join(errors))
+        block = config.get('block') or {}
+        allow = config.get('allow') or {}
+        self.block_types = set(_resource_types(block))
+        self.block_urls = [glob_to_regex(p) for p in block.get('urls') or []]
+        self.allow_types = set(_resource_types(allow))
+        self.allow_urls = [glob_to_regex(p) for p in allow.get('urls') or []]
+        self.dry_run = bool(config.get('dry_run', False))
+        self.sizes_path = sizes_path
+        self.known_sizes = self._load_sizes()
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.blocked_by_type = {}
+        self.estimated_bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def _load_sizes(self) -> Dict[str, int]:
+        if not self.sizes_path or not os.path.exists(self.sizes_path):
+            return {}
+        try:
+            with open(self.sizes_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load network size cache '{self.sizes_path}': {e}")
+            return {}
+        if not isinstance(saved, dict):
+            logging.warning(f"Ignoring network size cache '{self.sizes_path}': expected a JSON object.")
+            return {}
+        sizes = {}
+        for key, size in saved.items():
+            # 旧版本按完整 URL 记录，读取时换成新的键
+            self._remember_size(sizes, size_key(key) if '://' in key else key, size)
+        return sizes
+
+    @staticmethod
+    def _remember_size(sizes: Dict[str, int], key: str, size: int):
+        sizes.pop(key, None) # 重新插入到末尾，字典顺序即更新顺序
+        sizes[key] = size
+        while len(sizes) > MAX_KNOWN_SIZES:
+            del sizes[next(iter(sizes))]
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.allow_types or any(p.match(url) for p in self.allow_urls):
+            return False
+        return resource_type in self.block_types or any(p.match(url) for p in self.block_urls)
+
+    def handle_route(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            with self._lock:
+                self.blocked_requests += 1
+                self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+                self.estimated_bytes_saved += self.known_sizes.get(size_key(request.url), 0)
+            if self.dry_run:
+                route.continue_()
+            else:
+                route.abort()
+        else:
+            with self._lock:
+                self.allowed_requests += 1
+            route.continue_()
+
+    def _record_response_size(self, response):
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            with self._lock:
+                self._remember_size(self.known_sizes, size_key(response.url), int(content_length))
+
+    def install(self, context):
+        """在浏览器上下文上安装路由拦截，须在第一个步骤之前调用。"""
+        context.route('**/*', self.handle_route)
+        context.on('response', self._record_response_size)
+        logging.info(f"Installed network filter: block types={sorted(self.block_types)}, "
+                     f"block urls={len(self.block_urls)}, allow types={sorted(self.allow_types)}, allow urls={len(self.allow_urls)}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'allowed_requests': self.allowed_requests,
+                'blocked_requests': self.blocked_requests,
+                'dry_run': self.dry_run,
+                'blocked_by_type': dict(self.blocked_by_type),
+                'estimated_bytes_saved': self.estimated_bytes_saved,
+            }
+
+    def save_sizes(self):
+        if not self.sizes_path:
+            return
+        try:
+            sizes_dir = os.path.dirname(self.sizes_path)
+            if sizes_dir:
+                os.makedirs(sizes_dir, exist_ok=True)
+            with self._lock:
+                sizes = dict(self.known_sizes)
+            with open(self.sizes_path, 'w', encoding='utf-8') as f:
+                json.dump(sizes, f)
+        except OSError as e:
+            logging.warning(f"Could not save network size cache '{self.sizes_path}': {e}")
@@ -0,0 +1,168 @@
+"""
+网络响应捕获。
+
+很多 OA 列表页的数据由 XHR 接口加载，直接收集接口返回的 JSON 比用 `browser_get_source` 翻页解析 DOM
+更快也更稳定。`browser_capture_responses` 在其嵌套 `steps` 执行期间监听浏览器上下文（包括新打开的
+窗口和 iframe）的所有响应，把 URL 匹配的响应体逐条写入 JSONL 文件：
+
+    - name: 收集待审批列表
+      action: browser_capture_responses
+      params:
+        url_patterns: ["**/seeyon/rest/affair/list*"]
+        items_path: data.rows          # 可选：把响应体中的列表展开，每个元素一条记录
+        fields: [id, subject, amount]  # 可选：只保留这些字段（点号路径）
+      steps:
+        - {action: browser_click, params: {selector: "#next-page"}}
+      output_to: affairs
+
+不设 `items_path` 时每条记录为 `{"url", "status", "method", "body"}`，`fields` 作用于 body。
+超过 `max_body_bytes` 的响应体被跳过，累计写入超过 `max_total_bytes` 或响应数达到 `max_responses`
+后停止记录；跳过的数量记入统计。结果保存在 blob 存储中，`output_to` 变量只是引用，
+`{{ affairs.0.subject }}` 或 `loop` 使用时才从磁盘读取。
+"""
+from typing import Dict, List, Optional
+import json
+import logging
+
+from src.network_filter import RESOURCE_TYPES, glob_to_regex
+
+DEFAULT_RESOURCE_TYPES = ['xhr', 'fetch']
+DEFAULT_MAX_BODY_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 200 * 1024 * 1024
+DEFAULT_SETTLE_MS = 500
+
+
+def validate_capture_params(params: Dict) -> List[str]:
+    """校验 `browser_capture_responses` 的参数，返回错误信息列表。`{{ }}` 模板值在运行时才检查。"""
+    errors = []
+    patterns = params.get('url_patterns')
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if not isinstance(patterns, list) or not patterns or not all(isinstance(p, str) for p in patterns):
+        errors.append("'url_patterns' must be a URL glob or a non-empty list of URL globs.")
+    resource_types = params.get('resource_types', DEFAULT_RESOURCE_TYPES)
+    if not isinstance(resource_types, list):
+        errors.append("'resource_types' must be a list.")
+    else:
+        for resource_type in resource_types:
+            if resource_type not in RESOURCE_TYPES:
+                errors.append(f"Unknown resource type '{resource_type}'.")
+    fields = params.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        errors.append("'fields' must be a list of dotted paths.")
+    if params.get('items_path') is not None and not isinstance(params['items_path'], str):
+        errors.append("'items_path' must be a dotted path.")
+    for name in ('max_body_bytes', 'max_total_bytes', 'max_responses', 'settle_ms'):
+        value = params.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            errors.append(f"'{name}' must be a non-negative integer.")
+    return errors
+
+
+def get_path(value, path: str):
+    """按点号路径取值，数字段可以索引列表；路径不存在时返回 None。"""
+    for key in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+def project(value, fields: Optional[List[str]]):
+    if not fields or not isinstance(value, (dict, list)):
+        return value
+    return {field: get_path(value, field) for field in fields}
+
+
+class ResponseCapture:
+    """把匹配的响应写入 `BlobWriter`，由 Playwright 的 `response` 事件驱动。"""
+
+    def __init__(self, writer, url_patterns, resource_types: Optional[List[str]] = None,
+                 items_path: Optional[str] = None, fields: Optional[List[str]] = None,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES,
+                 max_responses: Optional[int] = None):
+        if isinstance(url_patterns, str):
+            url_patterns = [url_patterns]
+        self.writer = writer
+        self.patterns = [glob_to_regex(p) for p in url_patterns]
+        self.resource_types = set(resource_types if resource_types is not None else DEFAULT_RESOURCE_TYPES)
+        self.items_path = items_path
+        self.fields = fields
+        self.max_body_bytes = max_body_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_responses = max_responses
+        self.responses = 0
+        self.records = 0
+        self.oversized = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @classmethod
+    def from_params(cls, writer, params: Dict) -> 'ResponseCapture':
+        errors = validate_capture_params(params)
+        if errors:
+            raise ValueError("Invalid browser_capture_responses parameters: " + "; ".join(errors))
+        options = {k: params[k] for k in ('resource_types', 'items_path', 'fields', 'max_body_bytes',
+                                          'max_total_bytes', 'max_responses') if params.get(k) is not None}
+        return cls(writer, params['url_patterns'], **options)
+
+    def matches(self, url: str, resource_type: str) -> bool:
+        if self.resource_types and resource_type not in self.resource_types:
+            return False
+        return any(p.match(url) for p in self.patterns)
+
+    def _full(self) -> bool:
+        return ((self.max_responses is not None and self.responses >= self.max_responses)
+                or self.writer.size >= self.max_total_bytes)
+
+    def handle(self, response):
+        """`response` 事件处理函数：只在匹配时读取响应体，读取失败不影响工作流。"""
+        request = response.request
+        if not self.matches(response.url, request.resource_type):
+            return
+        if self._full():
+            self.dropped += 1
+            return
+        try:
+            length = response.headers.get('content-length')
+            if length is not None and length.isdigit() and int(length) > self.max_body_bytes:
+                self.oversized += 1 # 按响应头判断，不必拉取响应体
+                return
+            body = response.body()
+        except Exception as e: # 重定向、页面已关闭等情况下没有响应体
+            self.errors += 1
+            logging.debug(f"Could not read response body of {response.url}: {e}")
+            return
+        self.record(response.url, response.status, request.method, body)
+
+    def record(self, url: str, status: int, method: str, body: bytes):
+        if len(body) > self.max_body_bytes:
+            self.oversized += 1
+            return
+        self.responses += 1
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = body.decode('utf-8', errors='replace')
+
+        if self.items_path:
+            items = get_path(data, self.items_path)
+            if not isinstance(items, list):
+                logging.warning(f"Captured response from {url} has no list at '{self.items_path}'.")
+                return
+            records = [project(item, self.fields) for item in items]
+        else:
+            records = [{'url': url, 'status': status, 'method': method, 'body': project(data, self.fields)}]
+        for record in records:
+            if self.writer.size >= self.max_total_bytes:
+                self.dropped += 1
+                continue
+            self.writer.write_record(record)
+            self.records += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {'responses': self.responses, 'records': self.records, 'bytes': self.writer.size,
+                'oversized': self.oversized, 'dropped': self.dropped, 'errors': self.errors}
@@ -0,0 +1,211 @@
+"""
+学习型选择器/iframe 解析缓存。
+
+工作流中的选择器（如 `div[title="导入数据"]`、`iframe[id^="layui-layer-iframe"]`）每次运行都要从头解析，
+界面稍有变化就要等满 30 秒超时才失败。执行器成功解析一个选择器后，本模块按 "主机 + 页面路径"
+记录它解析到的元素的一组备选选择器（id、name/title 等属性、短文本、结构路径）和元素指纹
+（标签名 + 规范化后的文本），iframe 还会记录解析到的 frame URL。之后的运行先用短超时尝试原选择器，
+再检查各备选：备选必须在页面上恰好匹配一个元素，且该元素的指纹与记录一致，才会被采用，
+否则宁可回退到原来的完整等待，也不操作一个可能不同的元素。按 frame URL 查找 iframe 时同样要求
+当前上下文中恰好有一个子 frame 的 URL 匹配，且其 iframe 元素的指纹一致（Layui 弹层的多个 iframe
+经常加载同一个 URL）。缓存保存在 `output/cache/selector_cache.json`。
+"""
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import json
+import logging
+import os
+import threading
+import time
+
+from src.metrics import record_cache
+
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), 'output', 'cache', 'selector_cache.json')
+FAST_TIMEOUT = int(os.getenv('SELECTOR_CACHE_FAST_TIMEOUT', '2000'))  # 毫秒
+MAX_CANDIDATES = 6
+
+# 在页面中为元素生成备选选择器，越靠前越稳定
+CANDIDATES_SCRIPT = """
+(el) => {
+    const candidates = [];
+    const quote = (v) => '"' + v.replace(/\\\\/g, '\\\\\\\\').replace(/"/g, '\\\\"') + '"';
+    const tag = el.tagName.toLowerCase();
+    if (el.id && !/\\d{3,}/.test(el.id)) candidates.push('#' + CSS.escape(el.id));
+    for (const attr of ['data-testid', 'name', 'title', 'aria-label', 'placeholder', 'src']) {
+        const value = el.getAttribute(attr);
+        if (value && value.length <= 120) candidates.push(`${tag}[${attr}=${quote(value)}]`);
+    }
+    const text = (el.innerText || '').trim();
+    if (text && text.length <= 40 && !text.includes('\\n')) candidates.push(`${tag}:has-text(${quote(text)})`);
+    const parts = [];
+    for (let node = el; node && node.nodeType === 1 && parts.length < 6; node = node.parentElement) {
+        let part = node.tagName.toLowerCase();
+        if (node.id && !/\\d{3,}/.test(node.id)) { parts.unshift('#' + CSS.escape(node.id)); break; }
+        const parent = node.parentElement;
+        if (parent) {
+            const siblings = Array.from(parent.children).filter(n => n.tagName === node.tagName);
+            if (siblings.length > 1) part += `:nth-of-type(${siblings.indexOf(node) + 1})`;
+        }
+        parts.unshift(part);
+    }
+    candidates.push(parts.join(' > '));
+    return candidates;
+}
+"""
+
+# 元素指纹：界面改版后备选选择器可能匹配到别的元素，用标签和文本确认仍是同一个元素
+FINGERPRINT_SCRIPT = """
+(el) => ({tag: el.tagName.toLowerCase(), text: (el.innerText || '').trim().replace(/\\s+/g, ' ').slice(0, 80)})
+"""
+
+
+def page_key(context) -> str:
+    """缓存键：当前页面/iframe 的主机 + 路径（忽略查询参数，避免会话 ID 等打散缓存）。"""
+    url = urlsplit(context.url or '')
+    return f"{url.netloc}{url.path}"
+
+
+def _strip_query(url: str) -> str:
+    return (url or '').split('?', 1)[0].split('#', 1)[0]
+
+
+class SelectorCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, fast_timeout: int = FAST_TIMEOUT):
+        self.path = path
+        self.fast_timeout = fast_timeout
+        self.entries = self._load()
+        self.counts = {'hits': 0, 'healed': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable selector cache {self.path}: {e}")
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def lookup(self, context, selector: str) -> Optional[Dict]:
+        return self.entries.get(page_key(context), {}).get(selector)
+
+    def _remember(self, context, selector: str, element, frame_url: Optional[str] = None):
+        try:
+            candidates = [c for c in element.evaluate(CANDIDATES_SCRIPT) if c != selector][:MAX_CANDIDATES]
+            fingerprint = element.evaluate(FINGERPRINT_SCRIPT)
+        except Exception as e:
+            logging.debug(f"Could not compute fallback candidates for '{selector}': {e}")
+            candidates, fingerprint = [], None
+        with self._lock:
+            entry = self.entries.setdefault(page_key(context), {}).setdefault(selector, {})
+            entry['candidates'] = candidates
+            entry['fingerprint'] = fingerprint
+            if frame_url:
+                entry['frame_url'] = _strip_query(frame_url)
+            entry['updated_at'] = int(time.time())
+
+    def _try_cached(self, context, selector: str, entry: Dict, state: str):
+        """先用短超时尝试原选择器，再立即检查各备选。返回 (元素, 命中的选择器)。"""
+        try:
+            return context.wait_for_selector(selector, timeout=self.fast_timeout, state=state), selector
+        except Exception:
+            pass
+        fingerprint = entry.get('fingerprint')
+        if not fingerprint:
+            return None, None # 旧格式的缓存条目无法确认身份，不使用备选
+        for candidate in entry.get('candidates', []):
+            element = self._unique_match(context, candidate, fingerprint, state)
+            if element:
+                return element, candidate
+        return None, None
+
+    def _unique_match(self, context, candidate: str, fingerprint: Dict, state: str):
+        """备选恰好匹配一个元素、满足等待状态且指纹一致时返回该元素，否则返回 None。"""
+        try:
+            elements = context.query_selector_all(candidate)
+            if len(elements) != 1:
+                return None
+            element = elements[0]
+            if state == 'visible' and not element.is_visible():
+                return None
+            if element.evaluate(FINGERPRINT_SCRIPT) != fingerprint:
+                logging.info(f"Cached fallback '{candidate}' matches a different element; ignoring it.")
+                return None
+            return element
+        except Exception:
+            return None
+
+    def locate(self, context, selector: str, state: str = 'visible', timeout: int = 30000):
+        """解析选择器并返回元素句柄；未命中缓存时与 `wait_for_selector` 行为一致。"""
+        if state in ('hidden', 'detached'):
+            # 等待元素消失时没有可缓存的解析结果
+            return context.wait_for_selector(selector, timeout=timeout, state=state)
+        entry = self.lookup(context, selector)
+        if entry:
+            element, matched = self._try_cached(context, selector, entry, state)
+            if element:
+                self._count_hit(selector, matched)
+                return element
+        self._count_miss()
+        element = context.wait_for_selector(selector, timeout=timeout, state=state)
+        if element:
+            self._remember(context, selector, element)
+        return element
+
+    def locate_frame(self, context, selector: str, timeout: int = 30000):
+        """解析 iframe 选择器并返回其 content frame；元素找不到时按记录的 frame URL 查找。"""
+        entry = self.lookup(context, selector)
+        if entry:
+            element, matched = self._try_cached(context, selector, entry, 'attached')
+            frame = element.content_frame() if element else self._find_frame_by_url(context, entry)
+            if frame:
+                self._count_hit(selector, matched or f"frame url {entry.get('frame_url')}")
+                return frame
+        self._count_miss()
+        element = context.wait_for_selector(selector, timeout=timeout, state='attached')
+        frame = element.content_frame()
+        self._remember(context, selector, element, frame_url=frame.url if frame else None)
+        return frame
+
+    def _find_frame_by_url(self, context, entry: Dict):
+        """context 中恰好一个子 frame 的 URL 与记录一致、且其 iframe 元素指纹一致时返回该 frame。"""
+        frame_url, fingerprint = entry.get('frame_url'), entry.get('fingerprint')
+        if not frame_url or not fingerprint:
+            return None
+        try:
+            children = context.main_frame.child_frames if hasattr(context, 'main_frame') else context.child_frames
+            matches = [f for f in children if _strip_query(f.url) == frame_url and not f.is_detached()]
+            if len(matches) != 1:
+                return None
+            if matches[0].frame_element().evaluate(FINGERPRINT_SCRIPT) != fingerprint:
+                logging.info(f"Cached frame URL {frame_url} belongs to a different iframe; ignoring it.")
+                return None
+            return matches[0]
+        except Exception:
+            return None
+
+    def _count_hit(self, selector: str, matched: str):
+        record_cache('selector', hit=True)
+        with self._lock:
+            self.counts['hits'] += 1
+            if matched != selector:
+                self.counts['healed'] += 1
+        if matched != selector:
+            logging.warning(f"Selector '{selector}' no longer matches; resolved via cached fallback '{matched}'.")
+
+    def _count_miss(self):
+        record_cache('selector', hit=False)
+        with self._lock:
+            self.counts['misses'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts)
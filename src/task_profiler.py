@@ -0,0 +1,207 @@
+"""
+按任务开启的采样分析器。
+
+在工作项 payload 中设置 `"profiling": true`（或 `{"interval_ms": 5, "memory": "tracemalloc"}`），或设置环境变量
+`TASK_PROFILING=true`，`run_workflow` / `run_reimbursement_process` 会在运行期间：
+
+- 由后台线程每隔 `interval_ms`（默认 10 毫秒）采样一次任务线程的 Python 调用栈（等待浏览器时的栈也会
+  被记录），写出 `cpu.folded`；
+- 记录内存增长：默认 `memory: "rss"` 在每次采样时读取进程的峰值常驻内存，把增长量记到当时的调用栈上，
+  几乎没有额外开销（仅 Unix）；`memory: "tracemalloc"` 精确记录每个分配位置并额外写出 `memory_top.txt`，
+  但分配密集的代码会慢数倍，只适合定位内存问题；`memory: false` 关闭。结果写入 `memory.folded`（权重为 KB）；
+- 写出 `summary.json`：采样数、耗时、自身耗时最多的函数和内存峰值。
+
+`.folded` 为 "栈;帧 计数" 格式，可以直接导入 speedscope 或交给 flamegraph.pl / inferno 生成火焰图。
+结果保存在工作项目录（`RC_WORKITEM_INPUT_PATH` 所在目录）的 `profile/<运行名>/` 下，没有工作项目录时
+保存在 `output/profiles/` 下；`GET /api/tasks/<task_id>` 会列出这些文件。
+"""
+from typing import Dict, List, Optional
+from collections import Counter
+from contextlib import contextmanager
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+DEFAULT_OPTIONS = {'interval_ms': 10, 'memory': 'rss', 'memory_frames': 25}
+MEMORY_MODES = ('rss', 'tracemalloc', False)
+PROFILE_DIR_NAME = 'profile'
+
+
+def profiling_options(payload_value=None) -> Optional[Dict]:
+    """合并 payload 的 `profiling` 字段和 `TASK_PROFILING` 环境变量，未开启时返回 None。payload 优先。"""
+    value = payload_value if payload_value is not None else os.getenv('TASK_PROFILING')
+    if value in (None, False, '') or str(value).lower() in ('false', '0', 'no'):
+        return None
+    options = dict(DEFAULT_OPTIONS)
+    if os.getenv('TASK_PROFILING_INTERVAL_MS'):
+        options['interval_ms'] = float(os.environ['TASK_PROFILING_INTERVAL_MS'])
+    if isinstance(value, dict):
+        unknown = set(value) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown profiling options: {sorted(unknown)}")
+        options.update(value)
+    if options['memory'] is True:
+        options['memory'] = DEFAULT_OPTIONS['memory']
+    if options['memory'] not in MEMORY_MODES:
+        raise ValueError(f"profiling.memory must be one of {MEMORY_MODES}")
+    if options['interval_ms'] <= 0:
+        raise ValueError("profiling.interval_ms must be positive")
+    return options
+
+
+def default_output_dir(run_name: str) -> str:
+    input_path = os.getenv('RC_WORKITEM_INPUT_PATH')
+    if input_path:
+        return os.path.join(os.path.dirname(os.path.abspath(input_path)), PROFILE_DIR_NAME, run_name)
+    return os.path.join(os.getcwd(), 'output', 'profiles', f"{run_name}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+
+_labels: Dict = {}
+
+
+def _frame_label(code) -> str:
+    # 用函数定义行而不是当前行，同一函数的样本在火焰图中合并；按代码对象缓存，减少采样时的分配
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _stack_of(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak # macOS 以字节为单位，Linux 以 KB 为单位
+
+
+class TaskProfiler:
+    def __init__(self, output_dir: str, interval_ms: float = 10, memory='rss', memory_frames: int = 25,
+                 thread_id: Optional[int] = None):
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self.memory = memory
+        self.memory_frames = memory_frames
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = Counter()
+        self.memory_growth = Counter() # 栈 -> 该栈运行期间峰值 RSS 的增长 (KB)
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._owns_tracemalloc = False
+
+    def _sample_loop(self):
+        last_peak = _peak_rss_kb() if self.memory == 'rss' else None
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = ';'.join(_stack_of(frame))
+            self.samples[stack] += 1
+            if last_peak is not None:
+                peak = _peak_rss_kb()
+                if peak > last_peak:
+                    self.memory_growth[stack] += peak - last_peak
+                    last_peak = peak
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start(self.memory_frames)
+            self._owns_tracemalloc = True
+        self._thread = threading.Thread(target=self._sample_loop, name='task-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict:
+        """停止采样并写出结果文件，返回 summary。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        duration = time.perf_counter() - self._started
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = {'cpu': self._write_folded('cpu.folded', self.samples)}
+
+        summary = {
+            'duration_seconds': round(duration, 3),
+            'interval_ms': self.interval * 1000,
+            'samples': sum(self.samples.values()),
+            'top_self': self._top_self(),
+        }
+        if self._owns_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            files.update(self._write_memory(snapshot))
+            summary['memory_peak_mb'] = round(peak / (1024 * 1024), 2)
+            summary['memory_current_mb'] = round(current / (1024 * 1024), 2)
+        elif self.memory == 'rss' and _peak_rss_kb() is not None:
+            files['memory'] = self._write_folded('memory.folded', self.memory_growth)
+            summary['memory_peak_mb'] = round(_peak_rss_kb() / 1024, 2)
+        summary['files'] = files
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+    def _top_self(self, limit: int = 20) -> List[Dict]:
+        total = sum(self.samples.values()) or 1
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'function': name, 'samples': count, 'percent': round(100 * count / total, 1)}
+                for name, count in leaves.most_common(limit)]
+
+    def _write_folded(self, name: str, stacks: Counter) -> str:
+        path = os.path.join(self.output_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, weight in stacks.most_common():
+                f.write(f"{stack} {weight}\n")
+        return path
+
+    def _write_memory(self, snapshot) -> Dict[str, str]:
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                           tracemalloc.Filter(False, __file__)])
+        stats = snapshot.statistics('traceback')
+        stacks = Counter()
+        for stat in stats:
+            # traceback 的帧按最近调用在前排列，火焰图需要从根开始；权重为仍未释放的 KB 数
+            frames = [f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in reversed(stat.traceback)]
+            stacks[';'.join(frames)] += max(1, stat.size // 1024)
+        top_path = os.path.join(self.output_dir, 'memory_top.txt')
+        with open(top_path, 'w', encoding='utf-8') as f:
+            for stat in stats[:30]:
+                f.write(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                f.write("\n".join(f"    {line}" for line in stat.traceback.format()) + "\n\n")
+        return {'memory': self._write_folded('memory.folded', stacks), 'memory_top': top_path}
+
+
+@contextmanager
+def profile_task(options: Optional[Dict], run_name: str, output_dir: Optional[str] = None):
+    """options 为 None 时不做任何事；否则在 with 块期间分析当前线程并在结束时写出结果。"""
+    if not options:
+        yield None
+        return
+    profiler = TaskProfiler(output_dir or default_output_dir(run_name), **options).start()
+    logging.info(f"Profiling '{run_name}' every {options['interval_ms']} ms (memory: {options['memory']})")
+    try:
+        yield profiler
+    finally:
+        summary = profiler.stop()
+        logging.info(f"Profile of '{run_name}' saved to {profiler.output_dir} ({summary['samples']} samples)")
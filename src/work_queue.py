@@ -0,0 +1,212 @@
+"""
+持久化的本地工作队列（SQLite，无需外部消息中间件）。
+
+- 租约 (lease)：worker 领取任务后在可见性超时内独占该任务，可通过 `extend_lease` 续约；
+  worker 崩溃后租约过期，任务会被其他 worker 重新领取。
+- 重试：失败的任务按指数退避（带抖动）重新入队，超过 `max_attempts` 后进入死信。
+- 死信：进入死信的任务以与 `save_for_review` 相同的格式写入 `review_queue/`，供人工复核。
+
+所有状态变更都在 `BEGIN IMMEDIATE` 事务中完成，同一台机器或共享文件系统上的多个进程可以
+安全地并发领取任务。数据库使用默认的回滚日志模式（而非 WAL），以便放在网络文件系统上。
+"""
+from typing import Dict, Optional
+from contextlib import closing
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_DB_PATH = os.getenv('WORK_QUEUE_DB', os.path.join(PROJECT_ROOT, 'devdata', 'work_queue.db'))
+DEFAULT_REVIEW_QUEUE_DIR = os.path.join(PROJECT_ROOT, 'review_queue')
+
+PENDING = 'PENDING'
+LEASED = 'LEASED'
+DONE = 'DONE'
+DEAD = 'DEAD'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_ready ON work_items (status, available_at);
+"""
+
+
+class LeaseLostError(RuntimeError):
+    """The worker no longer holds the lease on the item (it expired and was taken over)."""
+
+
+class WorkQueue:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, review_queue_dir: str = DEFAULT_REVIEW_QUEUE_DIR,
+                 max_attempts: int = 3, backoff_base: float = 30.0, backoff_max: float = 900.0):
+        self.db_path = db_path
+        self.review_queue_dir = review_queue_dir
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute('BEGIN IMMEDIATE')
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        item = dict(row)
+        item['payload'] = json.loads(item['payload'])
+        item['result'] = json.loads(item['result']) if item['result'] else None
+        return item
+
+    def enqueue(self, payload: Dict, item_id: Optional[str] = None, max_attempts: Optional[int] = None, delay: float = 0) -> str:
+        """将任务加入队列，返回任务 ID。"""
+        item_id = item_id or f"task_{uuid.uuid4().hex[:16]}"
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO work_items (id, payload, status, attempts, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?, ?)",
+                (item_id, json.dumps(payload, ensure_ascii=False), PENDING, max_attempts or self.max_attempts, now + delay, now, now),
+            )
+        return item_id
+
+    def lease(self, worker_id: str, visibility_timeout: float = 600) -> Optional[Dict]:
+        """
+        领取一个可执行的任务：待处理且已到可执行时间的任务，或租约已过期的任务。
+        没有可领取的任务时返回 None。
+        """
+        conn = self._connect()
+        try:
+            while True:
+                now = time.time()
+                self._transaction(conn)
+                row = conn.execute(
+                    "SELECT * FROM work_items WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at <= ?) "
+                    "ORDER BY available_at LIMIT 1",
+                    (PENDING, now, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                if row['status'] == LEASED and row['attempts'] >= row['max_attempts']:
+                    # 最后一次尝试的 worker 崩溃了，不再重试
+                    self._mark_dead(conn, row, f"Lease expired on final attempt (worker {row['lease_owner']}).")
+                    conn.execute('COMMIT')
+                    continue
+                conn.execute(
+                    "UPDATE work_items SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (LEASED, worker_id, now + visibility_timeout, now, row['id']),
+                )
+                leased = conn.execute("SELECT * FROM work_items WHERE id = ?", (row['id'],)).fetchone()
+                conn.execute('COMMIT')
+                return self._to_dict(leased)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _update_leased(self, item_id: str, worker_id: str, sql: str, args: tuple, dead_on=None):
+        conn = self._connect()
+        try:
+            self._transaction(conn)
+            row = conn.execute("SELECT * FROM work_items WHERE id = ?", (item_id,)).fetchone()
+            if row is None or row['status'] != LEASED or row['lease_owner'] != worker_id:
+                conn.execute('ROLLBACK')
+                raise LeaseLostError(f"Worker {worker_id} does not hold the lease on {item_id}.")
+            if dead_on is not None:
+                self._mark_dead(conn, row, dead_on)
+            else:
+                conn.execute(sql, args)
+            conn.execute('COMMIT')
+        except LeaseLostError:
+            raise
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def extend_lease(self, item_id: str, worker_id: str, visibility_timeout: float = 600):
+        """续约，长时间运行的任务应定期调用。"""
+        now = time.time()
+        self._update_leased(item_id, worker_id,
+                            "UPDATE work_items SET lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                            (now + visibility_timeout, now, item_id))
+
+    def complete(self, item_id: str, worker_id: str, result: Optional[Dict] = None):
+        now = time.time()
+        self._update_leased(item_id, worker_id,
+                            "UPDATE work_items SET status = ?, lease_owner = NULL, lease_expires_at = NULL, result = ?, updated_at = ? WHERE id = ?",
+                            (DONE, json.dumps(result, ensure_ascii=False) if result is not None else None, now, item_id))
+
+    def fail(self, item_id: str, worker_id: str, error: str, retryable: bool = True):
+        """任务失败：可重试且未超过最大次数时按退避时间重新入队，否则进入死信。"""
+        item = self.get(item_id)
+        if item is None:
+            raise LeaseLostError(f"Unknown work item {item_id}.")
+        if retryable and item['attempts'] < item['max_attempts']:
+            now = time.time()
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (item['attempts'] - 1)))
+            delay *= random.uniform(0.8, 1.2)
+            self._update_leased(item_id, worker_id,
+                                "UPDATE work_items SET status = ?, lease_owner = NULL, lease_expires_at = NULL, available_at = ?, "
+                                "last_error = ?, updated_at = ? WHERE id = ?",
+                                (PENDING, now + delay, error, now, item_id))
+        else:
+            self._update_leased(item_id, worker_id, None, None, dead_on=error)
+
+    def _mark_dead(self, conn: sqlite3.Connection, row: sqlite3.Row, error: str):
+        conn.execute(
+            "UPDATE work_items SET status = ?, lease_owner = NULL, lease_expires_at = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+            (DEAD, error, time.time(), row['id']),
+        )
+        self._dead_letter(row['id'], json.loads(row['payload']), error)
+
+    def _dead_letter(self, item_id: str, payload: Dict, error: str):
+        """以与 save_for_review 相同的格式写入复核队列。"""
+        os.makedirs(self.review_queue_dir, exist_ok=True)
+        review_file_path = os.path.join(self.review_queue_dir, f"{item_id}.json")
+        with open(review_file_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "id": item_id,
+                "payload": payload,
+                "exception": {"type": "APPLICATION", "code": "MAX_ATTEMPTS_EXCEEDED", "message": error}
+            }, f, ensure_ascii=False, indent=4)
+
+    def get(self, item_id: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM work_items WHERE id = ?", (item_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数量，LEASED 中包含租约已过期、等待重新领取的任务。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS count FROM work_items GROUP BY status").fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
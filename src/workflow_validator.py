@@ -0,0 +1,234 @@
+"""
+工作流预检校验器。
+
+在启动浏览器之前，对工作流 YAML 做纯静态检查：
+- 每个步骤的 action 是否为执行器支持的动作，参数是否满足该动作的 schema；
+- `{{ }}` 变量引用是否指向 `input` 或之前步骤的 `output_to`（循环体内还包括循环变量）；
+- 是否存在永远不会被执行的步骤。
+
+用法：
+    python -m src.workflow_validator workflows/new-oa.yaml [更多文件...]
+"""
+from typing import List, Dict, Optional, Set
+import os
+import re
+import sys
+import yaml
+
+from src.network_filter import validate_network_config
+from src.execution_profile import validate_profile_config
+from src.response_capture import validate_capture_params
+
+# 每个动作的参数 schema：required 为必填参数，optional 为可选参数。
+ACTION_SCHEMAS = {
+    'loop': {'required': ['source_list', 'loop_variable'], 'optional': []},
+    'ai_fill_reimbursement_excel': {'required': ['receipt_files', 'excel_template_path'], 'optional': ['excel_description', 'refresh_mapping_plan']},
+    'browser_goto': {'required': ['url'], 'optional': []},
+    'browser_login_human_like': {
+        'required': ['url', 'username', 'password', 'username_selector', 'password_selector', 'submit_selector'],
+        'optional': [],
+    },
+    'browser_fill': {'required': ['selector', 'value'], 'optional': []},
+    'browser_click': {'required': ['selector'], 'optional': ['opens_new_window']},
+    'browser_press': {'required': ['selector', 'key'], 'optional': []},
+    'browser_select_option': {'required': ['selector', 'value'], 'optional': []},
+    'browser_switch_to_frame': {'required': ['selector'], 'optional': []},
+    'browser_wait_for_selector': {'required': ['selector'], 'optional': ['timeout', 'state']},
+    'browser_mouse_move': {'required': ['x', 'y'], 'optional': []},
+    'browser_get_source': {'required': ['output_file'], 'optional': []},
+    'browser_screenshot': {'required': ['output_file'], 'optional': []},
+    'browser_wait_for_url': {'required': ['url_pattern'], 'optional': ['timeout']},
+    'browser_wait_for_load_state': {'required': [], 'optional': ['state', 'timeout']},
+    'browser_evaluate': {'required': ['expression'], 'optional': []},
+    'browser_js_click': {'required': ['selector'], 'optional': []},
+    'browser_wait_for_response': {'required': ['url_pattern', 'output_file'], 'optional': ['timeout']},
+    'browser_upload_file': {'required': ['file_path', 'selector'], 'optional': []},
+    'browser_capture_responses': {
+        'required': ['url_patterns'],
+        'optional': ['resource_types', 'items_path', 'fields', 'max_body_bytes', 'max_total_bytes',
+                     'max_responses', 'settle_ms'],
+    },
+}
+
+# 除 loop 外执行嵌套 'steps' 的动作。
+BLOCK_ACTIONS = {'browser_capture_responses'}
+
+# 已废弃且执行时必然失败的动作，其后的步骤不可达。
+DEPRECATED_ACTIONS = {
+    'extract_data': "'extract_data' is deprecated. Use 'ai_fill_reimbursement_excel' instead.",
+}
+
+STEP_KEYS = {'name', 'action', 'type', 'params', 'output_to', 'steps', 'on_error', 'opens_new_window'}
+
+TEMPLATE_PATTERN = re.compile(r"\{\{\s*(.*?)\s*\}\}")
+
+
+def format_issue(issue: Dict) -> str:
+    return f"[{issue['level']}] {issue['step']}: {issue['message']}"
+
+
+def _issue(issues: List[Dict], level: str, step: str, message: str):
+    issues.append({'level': level, 'step': step, 'message': message})
+
+
+def _check_references(value, defined: Set[str], step_label: str, param_name: str, issues: List[Dict]):
+    if not isinstance(value, str):
+        return
+    matches = list(TEMPLATE_PATTERN.finditer(value))
+    if not matches:
+        return
+    if len(matches) > 1 or matches[0].group(0) != value.strip():
+        _issue(issues, 'warning', step_label,
+               f"Parameter '{param_name}' embeds a template inside a larger string; only whole-value '{{{{ var }}}}' templates are resolved.")
+    for match in matches:
+        root = match.group(1).split('.')[0].strip()
+        if root not in defined:
+            _issue(issues, 'error', step_label,
+                   f"Parameter '{param_name}' references '{{{{ {match.group(1)} }}}}', but '{root}' is not 'input' or the output_to of a previous step.")
+
+
+def _validate_steps(steps, defined: Set[str], path: str, issues: List[Dict]):
+    if not isinstance(steps, list):
+        _issue(issues, 'error', path, "'steps' must be a list.")
+        return
+    unreachable_after = None
+    for index, step in enumerate(steps):
+        step_label = f"{path}[{index}]"
+        if not isinstance(step, dict):
+            _issue(issues, 'error', step_label, "Step must be a mapping.")
+            continue
+        action = step.get('action') or step.get('type')
+        step_label = f"{step_label} '{step.get('name', action)}'"
+
+        if unreachable_after:
+            _issue(issues, 'error', step_label, f"Step is unreachable: the preceding step {unreachable_after} always fails.")
+
+        for key in step:
+            if key not in STEP_KEYS:
+                _issue(issues, 'warning', step_label, f"Unknown step key '{key}' is ignored by the executor.")
+
+        params = step.get('params', {})
+        if params is None:
+            params = {}
+        if not isinstance(params, dict):
+            _issue(issues, 'error', step_label, "'params' must be a mapping.")
+            params = {}
+
+        if not action:
+            _issue(issues, 'error', step_label, "Step has no 'action'.")
+        elif action in DEPRECATED_ACTIONS:
+            _issue(issues, 'error', step_label, DEPRECATED_ACTIONS[action])
+            unreachable_after = step_label
+        elif action not in ACTION_SCHEMAS:
+            _issue(issues, 'error', step_label, f"Unknown action '{action}'.")
+        else:
+            schema = ACTION_SCHEMAS[action]
+            for name in schema['required']:
+                if params.get(name) is None or params.get(name) == '':
+                    _issue(issues, 'error', step_label, f"Missing required parameter '{name}' for action '{action}'.")
+            for name in params:
+                if name not in schema['required'] and name not in schema['optional']:
+                    _issue(issues, 'warning', step_label, f"Parameter '{name}' is not used by action '{action}'.")
+
+        for name, value in params.items():
+            _check_references(value, defined, step_label, name, issues)
+
+        if action == 'loop':
+            source_list = params.get('source_list')
+            loop_variable = params.get('loop_variable')
+            if isinstance(source_list, str) and not TEMPLATE_PATTERN.search(source_list) and source_list.split('.')[0] not in defined:
+                _issue(issues, 'error', step_label,
+                       f"Loop source_list '{source_list}' is not 'input' or the output_to of a previous step.")
+            if not step.get('steps'):
+                _issue(issues, 'error', step_label, "Loop action requires nested 'steps'.")
+            else:
+                body_defined = set(defined)
+                if loop_variable:
+                    body_defined.add(loop_variable)
+                _validate_steps(step['steps'], body_defined, f"{step_label}.steps", issues)
+                # Variables written inside the loop body stay available afterwards.
+                defined |= body_defined - {loop_variable}
+        elif action in BLOCK_ACTIONS:
+            static_params = {k: v for k, v in params.items() if not (isinstance(v, str) and TEMPLATE_PATTERN.search(v))}
+            if 'url_patterns' in static_params:
+                for message in validate_capture_params(static_params):
+                    _issue(issues, 'error', step_label, message)
+            if not step.get('steps'):
+                _issue(issues, 'error', step_label, f"Action '{action}' requires nested 'steps'.")
+            else:
+                # 嵌套步骤写入的变量在块结束后仍然可用；块自身的 output_to 只在块结束后定义
+                _validate_steps(step['steps'], defined, f"{step_label}.steps", issues)
+        elif 'steps' in step:
+            _issue(issues, 'error', step_label,
+                   f"Nested 'steps' under action '{action}' are unreachable; only 'loop' and {sorted(BLOCK_ACTIONS)} execute nested steps.")
+
+        output_to = step.get('output_to')
+        if output_to is not None:
+            if not isinstance(output_to, str) or not output_to.strip():
+                _issue(issues, 'error', step_label, "'output_to' must be a non-empty string.")
+            else:
+                defined.add(output_to)
+
+
+def validate_workflow(workflow) -> List[Dict]:
+    """
+    校验已解析的工作流对象，返回问题列表。
+    每个问题为 {"level": "error"|"warning", "step": 步骤位置, "message": 描述}。
+    """
+    issues = []
+    if not isinstance(workflow, dict):
+        _issue(issues, 'error', 'workflow', "Workflow must be a mapping with a 'steps' list.")
+        return issues
+    if 'steps' not in workflow:
+        _issue(issues, 'error', 'workflow', "Workflow has no 'steps'.")
+        return issues
+    if 'network' in workflow:
+        for message in validate_network_config(workflow['network']):
+            _issue(issues, 'error', 'network', message)
+    if 'profile' in workflow:
+        for message in validate_profile_config(workflow['profile']):
+            _issue(issues, 'error', 'profile', message)
+    _validate_steps(workflow['steps'], {'input'}, 'steps', issues)
+    return issues
+
+
+def validate_workflow_text(yaml_text: str) -> List[Dict]:
+    """校验 YAML 文本形式的工作流（如前端编辑器保存的内容）。"""
+    try:
+        workflow = yaml.safe_load(yaml_text)
+    except yaml.YAMLError as e:
+        return [{'level': 'error', 'step': 'workflow', 'message': f"Invalid YAML: {e}"}]
+    return validate_workflow(workflow)
+
+
+def validate_workflow_file(workflow_path: str) -> List[Dict]:
+    """校验工作流文件。"""
+    if not os.path.isfile(workflow_path):
+        return [{'level': 'error', 'step': 'workflow', 'message': f"Workflow file not found: {workflow_path}"}]
+    with open(workflow_path, 'r', encoding='utf-8') as f:
+        return validate_workflow_text(f.read())
+
+
+def has_errors(issues: List[Dict]) -> bool:
+    return any(i['level'] == 'error' for i in issues)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python -m src.workflow_validator <workflow.yaml> [...]")
+        return 2
+    exit_code = 0
+    for workflow_path in argv:
+        issues = validate_workflow_file(workflow_path)
+        status = "FAILED" if has_errors(issues) else "OK"
+        print(f"{workflow_path}: {status}")
+        for issue in issues:
+            print(f"  {format_issue(issue)}")
+        if has_errors(issues):
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import unittest
+import os
+import subprocess
+
+# Add the project root to the path to import the registry
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.action_registry import ACTION_MODULES, get_action_handler
+from src.workflow_validator import ACTION_SCHEMAS, DEPRECATED_ACTIONS
+
+class ActionRegistryTestCase(unittest.TestCase):
+
+    def test_every_validated_action_has_a_handler(self):
+        self.assertEqual(set(ACTION_MODULES), (set(ACTION_SCHEMAS) | set(DEPRECATED_ACTIONS)) - {'loop'})
+        for action in ACTION_MODULES:
+            self.assertTrue(callable(get_action_handler(action)), action)
+        self.assertIsNone(get_action_handler('browser_teleport'))
+
+    def test_executor_import_does_not_load_ai_stack(self):
+        code = ("import sys, robots.workflow_executor; "
+                "print(sorted(m for m in ('src.ai_services', 'openpyxl', 'src.actions.browser') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=project_root, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], '[]')
+
+if __name__ == '__main__':
+    unittest.main()
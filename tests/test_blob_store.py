@@ -0,0 +1,53 @@
+import unittest
+import json
+import os
+import tempfile
+
+# Add the project root to the path to import the blob store and the executor
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.blob_store import BlobStore, is_blob_ref
+from robots.workflow_executor import WorkflowExecutor
+
+class BlobStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BlobStore(root=os.path.join(self.tmp.name, 'blobs'), threshold=1024)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_small_values_stay_in_memory(self):
+        for value in ('短文本', {'a': 1}, [1, 2], 42, None):
+            self.assertEqual(self.store.maybe_spill(value), value)
+        self.assertEqual(self.store.stats()['spilled_variables'], 0)
+
+    def test_large_values_are_spilled_once_per_content(self):
+        html = '<html>' + '报销' * 1000 + '</html>'
+        ref = self.store.maybe_spill(html)
+        self.assertTrue(is_blob_ref(ref))
+        self.assertEqual(ref['size'], len(html.encode('utf-8')))
+        self.assertEqual(self.store.get(ref), html)
+        self.assertEqual(self.store.maybe_spill(html)['path'], ref['path'])
+        self.assertEqual(len(os.listdir(os.path.dirname(ref['path']))), 1)
+        # A reference is small enough to be written into the output work item
+        self.assertLess(len(json.dumps(ref)), 300)
+
+    def test_templates_resolve_spilled_variables_lazily(self):
+        workflow_path = os.path.join(self.tmp.name, 'workflow.yaml')
+        with open(workflow_path, 'w') as f:
+            f.write('name: W\nsteps: []\n')
+        executor = WorkflowExecutor(workflow_path)
+        executor.blob_store = self.store
+        response = {'rows': [{'id': i, 'title': f'发票 {i}'} for i in range(200)]}
+        executor.vars['response'] = self.store.maybe_spill(response)
+        self.assertTrue(is_blob_ref(executor.vars['response']))
+        self.assertEqual(executor._resolve_variable('{{ response.rows.3.title }}'), '发票 3')
+        self.assertEqual(executor._resolve_variable('{{ response }}'), response)
+        self.assertEqual(executor._resolve_variable('{{ response.missing }}'), '{{ response.missing }}')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import tempfile
+
+# Add the project root to the path to import the document reader
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src import document_reader
+
+def make_pdf(page_texts):
+    """Builds a minimal PDF whose pages carry the given text layer (empty string = no text)."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{3 + 2 * i} 0 R' for i in range(len(page_texts)))
+    objects.append(f'<< /Type /Pages /Kids [{kids}] /Count {len(page_texts)} >>'.encode())
+    font_id = 3 + 2 * len(page_texts)
+    for i, text in enumerate(page_texts):
+        content = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode() if text else b''
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % (i + 1) + obj + b'\nendobj\n'
+    xref_offset = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    return pdf
+
+class DocumentReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_patch = patch.object(document_reader, 'CACHE_DIR', os.path.join(self.temp_dir, 'cache'))
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def write_pdf(self, name, page_texts):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(make_pdf(page_texts))
+        return path
+
+    @patch('src.document_reader._ocr_pdf_page')
+    def test_digital_pdf_skips_ocr(self, mock_ocr):
+        path = self.write_pdf('vat_invoice.pdf', ['Invoice No 25942000000022966733 Total 1156.00'])
+        document = document_reader.read_document(path)
+        mock_ocr.assert_not_called()
+        self.assertIn('25942000000022966733', document['text'])
+        self.assertEqual(document['image_paths'], [])
+        self.assertEqual(document['pages'][0]['source'], 'text_layer')
+
+    @patch('src.document_reader._ocr_pdf_page', return_value='scanned page text')
+    def test_only_pages_without_text_are_ocred_and_results_are_cached(self, mock_ocr):
+        path = self.write_pdf('mixed.pdf', ['Invoice No 25942000000022966733 Total 1156.00', ''])
+        document = document_reader.read_document(path)
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertEqual(mock_ocr.call_args[0][1], 2)
+        self.assertEqual([p['source'] for p in document['pages']], ['text_layer', 'ocr'])
+        self.assertFalse(document['cached'])
+
+        again = document_reader.read_document(path)
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertTrue(again['cached'])
+        self.assertEqual(again['text'], document['text'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import logging
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add the project root to the path to import the profiles and the executor
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.execution_profile import get_profile, validate_profile_config, activate_profile, active_profile, DEFAULT_PROFILE
+from src.workflow_validator import validate_workflow
+from robots.workflow_executor import WorkflowExecutor
+
+class ExecutionProfileTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        activate_profile(get_profile(DEFAULT_PROFILE))
+        logging.getLogger().setLevel(logging.INFO)
+
+    def executor_for(self, workflow_yaml, profile_name=None):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8') as f:
+            f.write(workflow_yaml)
+        self.addCleanup(os.remove, f.name)
+        return WorkflowExecutor(f.name, profile_name=profile_name)
+
+    def test_production_disables_diagnostics(self):
+        profile = get_profile('production')
+        self.assertTrue(profile['headless'])
+        self.assertFalse(profile['save_sources'])
+        self.assertFalse(profile['enumerate_frames'])
+        self.assertFalse(profile['verbose_payloads'])
+        self.assertTrue(profile['error_screenshots'])
+
+    def test_debug_matches_original_behavior(self):
+        profile = get_profile('debug')
+        self.assertEqual((profile['headless'], profile['slowmo'], profile['log_level']), (None, 0, logging.INFO))
+
+    def test_environment_default_and_overrides(self):
+        with patch.dict(os.environ, {'EXECUTION_PROFILE': 'benchmark'}):
+            self.assertEqual(get_profile()['name'], 'benchmark')
+        self.assertEqual(get_profile('debug', slowmo=250)['slowmo'], 250)
+        with self.assertRaises(ValueError):
+            get_profile('verbose')
+        with self.assertRaises(ValueError):
+            get_profile('debug', screenshots=False)
+
+    def test_payload_profile_takes_precedence_over_workflow(self):
+        workflow = "name: W\nprofile:\n  name: debug\n  slowmo: 100\nsteps: []\n"
+        executor = self.executor_for(workflow)
+        self.assertEqual((executor.profile['name'], executor.profile['slowmo']), ('debug', 100))
+        executor = self.executor_for(workflow, profile_name='production')
+        self.assertEqual((executor.profile['name'], executor.profile['slowmo']), ('production', 0))
+        self.assertIs(active_profile(), executor.profile)
+        self.assertEqual(logging.getLogger().level, logging.INFO)
+
+    def test_disabled_artifacts_skip_page_access(self):
+        executor = self.executor_for("name: W\nprofile: benchmark\nsteps: []\n")
+        executor.current_context = object() # Any page access would raise AttributeError
+        with patch('robots.workflow_executor.open') as mock_open:
+            executor._proactively_save_source('iframe_switch')
+            executor._take_error_screenshot('step')
+        mock_open.assert_not_called()
+
+    def test_validator_reports_unknown_profile(self):
+        self.assertEqual(validate_profile_config('production'), [])
+        self.assertEqual(len(validate_profile_config({'name': 'debug', 'slowmo': 50, 'colour': 'red'})), 1)
+        issues = validate_workflow({'profile': 'fast', 'steps': []})
+        self.assertEqual([i['step'] for i in issues], ['profile'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import yaml
+
+# Add the project root to the path to import the field extractor
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.field_extractor import build_missing_fields_prompt, extract_field, extract_fields
+
+VAT_TEXT = """电子发票（普通发票）
+发票号码：25442000000123456789
+开票日期：2025年07月30日
+购 买 方 信 息 名称：深圳某某科技有限公司 统一社会信用代码/纳税人识别号：91440300MA5XXXXXX
+销 售 方 信 息 名称：广州某某餐饮管理有限公司 统一社会信用代码/纳税人识别号：91440101MA9XXXXXX
+项目名称 规格型号 单位 数量 单价 金额 税率/征收率 税额
+*餐饮服务*餐费 1 1103.77 1103.77 6% 66.23
+价税合计（大写） 壹仟壹佰柒拾圆整 （小写）¥1,170.00
+"""
+
+class FieldExtractorTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(project_root, 'config', 'invoice_configs.yaml'), 'r', encoding='utf-8') as f:
+            cls.configs = yaml.safe_load(f)['invoice_types']
+
+    def test_vat_invoice_is_fully_extracted_locally(self):
+        values, missing = extract_fields(VAT_TEXT, self.configs['vat_general_invoice']['fields'])
+        self.assertEqual(missing, [])
+        self.assertEqual(values, {
+            'invoice_number': '25442000000123456789',
+            'issue_date': '2025-07-30',
+            'goods_or_taxable_service_name': '*餐饮服务*餐费',
+            'seller_name': '广州某某餐饮管理有限公司',
+            'buyer_name': '深圳某某科技有限公司',
+            'total_amount_nett_incl_tax': 1170.0,
+        })
+
+    def test_invalid_or_missing_fields_go_to_llm(self):
+        text = "发票号码：12345\n开票日期：2025/7/3\n"
+        values, missing = extract_fields(text, self.configs['vat_general_invoice']['fields'])
+        self.assertEqual(values, {'issue_date': '2025-07-03'})
+        self.assertIn('invoice_number', [f['id'] for f in missing])
+
+        prompt = build_missing_fields_prompt(self.configs['vat_general_invoice'], missing, values, text, '', '')
+        self.assertIn('"invoice_number": "发票号码"', prompt)
+        self.assertNotIn('"issue_date"', prompt)
+        self.assertLess(len(prompt), len(self.configs['vat_general_invoice']['llm_prompt_template']) + len(text))
+
+    def test_anchors_and_formats(self):
+        field = {'id': 'total', 'type': 'number', 'anchors': ['合计']}
+        self.assertEqual(extract_field("票价合计： ￥ 850.00 元", field), 850.0)
+        field = {'id': 'date', 'type': 'date', 'format': 'YYYYMMDD', 'anchors': ['日期']}
+        self.assertEqual(extract_field("日期 2025-13-01\n日期 2025.7.1", field), '20250701')
+        self.assertIsNone(extract_field("没有锚点", field))
+
+if __name__ == '__main__':
+    unittest.main()
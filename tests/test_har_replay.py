@@ -0,0 +1,120 @@
+import unittest
+import base64
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock, PropertyMock, patch
+
+# Add the project root to the path to import the replayer
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.har_replay import HarReplayer, validate_har_config
+
+def har_entry(url, text, started, method='GET', status=200, encoding=None, wait=120):
+    content = {'text': text, 'mimeType': 'text/html'}
+    if encoding:
+        content['encoding'] = encoding
+    return {
+        'startedDateTime': started,
+        'time': wait + 5,
+        'timings': {'send': 1, 'wait': wait, 'receive': 4},
+        'request': {'method': method, 'url': url},
+        'response': {'status': status, 'headers': [{'name': 'Content-Type', 'value': 'text/html'},
+                                                   {'name': 'Content-Encoding', 'value': 'gzip'}], 'content': content},
+    }
+
+def make_route(url, method='GET'):
+    route = MagicMock()
+    route.request.url = url
+    route.request.method = method
+    return route
+
+class HarReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.har_path = os.path.join(self.tmp.name, 'oa.har')
+        entries = [
+            har_entry('http://oa.example.com/seeyon/main.do', '<html>v1</html>', '2025-08-01T10:00:00.000Z'),
+            har_entry('http://oa.example.com/seeyon/main.do', '<html>v2</html>', '2025-08-01T10:00:01.000Z'),
+            har_entry('http://oa.example.com/logo.png', base64.b64encode(b'\x89PNG').decode(), '2025-08-01T10:00:02.000Z', encoding='base64'),
+            har_entry('http://oa.example.com/api/poll?_=1', '{}', '2025-08-01T10:00:03.000Z'),
+            har_entry('http://oa.example.com/blocked.js', '', '2025-08-01T10:00:04.000Z', status=-1),
+        ]
+        with open(self.har_path, 'w', encoding='utf-8') as f:
+            json.dump({'log': {'entries': entries}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_serves_entries_in_recorded_order(self):
+        replayer = HarReplayer(self.har_path)
+        bodies = []
+        for _ in range(3):
+            route = make_route('http://oa.example.com/seeyon/main.do')
+            replayer.handle_route(route)
+            bodies.append(route.fulfill.call_args.kwargs['body'])
+        # The last recorded response is reused once earlier ones are consumed
+        self.assertEqual(bodies, [b'<html>v1</html>', b'<html>v2</html>', b'<html>v2</html>'])
+        self.assertNotIn('Content-Encoding', route.fulfill.call_args.kwargs['headers'])
+
+    def test_decodes_binary_bodies_and_ignores_cache_busters(self):
+        replayer = HarReplayer(self.har_path)
+        route = make_route('http://oa.example.com/logo.png')
+        replayer.handle_route(route)
+        self.assertEqual(route.fulfill.call_args.kwargs['body'], b'\x89PNG')
+        route = make_route('http://oa.example.com/api/poll?_=99')
+        replayer.handle_route(route)
+        self.assertEqual(route.fulfill.call_args.kwargs['status'], 200)
+
+    def test_unrecorded_requests_are_aborted_or_passed_on(self):
+        route = make_route('http://oa.example.com/blocked.js')
+        replayer = HarReplayer(self.har_path)
+        replayer.handle_route(route)
+        route.abort.assert_called_once()
+        self.assertEqual(replayer.stats()['missing_urls'], ['http://oa.example.com/blocked.js'])
+        route = make_route('http://cdn.example.com/new.js')
+        HarReplayer(self.har_path, not_found='fallback').handle_route(route)
+        route.fallback.assert_called_once()
+
+    def test_entry_matched_by_path_is_not_served_again_by_url(self):
+        with open(self.har_path, 'w', encoding='utf-8') as f:
+            json.dump({'log': {'entries': [
+                har_entry('http://oa.example.com/api/list?page=1', 'p1', '2025-08-01T10:00:00.000Z'),
+                har_entry('http://oa.example.com/api/list?page=1', 'p1-again', '2025-08-01T10:00:01.000Z'),
+                har_entry('http://oa.example.com/api/list?page=2', 'p2', '2025-08-01T10:00:02.000Z'),
+            ]}}, f)
+        replayer = HarReplayer(self.har_path)
+        self.assertEqual(replayer.match('GET', 'http://oa.example.com/api/list?page=9')['response']['content']['text'], 'p1')
+        # p1 was consumed through the path queue, so the exact-URL queue moves on to the next recording
+        self.assertEqual(replayer.match('GET', 'http://oa.example.com/api/list?page=1')['response']['content']['text'], 'p1-again')
+        self.assertEqual(replayer.match('GET', 'http://oa.example.com/api/list?page=9')['response']['content']['text'], 'p2')
+
+    @patch('src.har_replay.time.sleep')
+    def test_recorded_latency_waits_on_the_page_without_blocking(self, mock_sleep):
+        replayer = HarReplayer(self.har_path, latency='recorded')
+        route = make_route('http://oa.example.com/seeyon/main.do')
+        replayer.handle_route(route)
+        route.request.frame.page.wait_for_timeout.assert_called_once_with(124.0)
+        mock_sleep.assert_not_called()
+
+        # Requests without a frame (service workers) fall back to sleeping
+        route = make_route('http://oa.example.com/seeyon/main.do')
+        type(route.request).frame = PropertyMock(side_effect=Exception('service worker'))
+        replayer.handle_route(route)
+        mock_sleep.assert_called_once_with(0.124)
+        self.assertEqual(replayer.stats()['replayed_server_seconds'], 0.248)
+
+        route = make_route('http://oa.example.com/seeyon/main.do')
+        HarReplayer(self.har_path).handle_route(route)
+        route.request.frame.page.wait_for_timeout.assert_not_called()
+
+    def test_validate_har_config(self):
+        self.assertEqual(validate_har_config({'mode': 'replay', 'path': self.har_path, 'latency': 'recorded'}), [])
+        self.assertEqual(validate_har_config({'mode': 'record', 'path': os.path.join(self.tmp.name, 'new.har')}), [])
+        self.assertEqual(len(validate_har_config({'mode': 'replay', 'path': 'missing.har', 'latency': 'slow'})), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import os
+import tempfile
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+# Add the project root to the path to import the idempotency store and the webapp
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.idempotency import IdempotencyStore, submission_key
+from src.work_queue import WorkQueue
+from webapp.app import app
+
+class IdempotencyStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = IdempotencyStore(db_path=os.path.join(self.tmp.name, 'idempotency.db'), window=60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_ignores_file_order(self):
+        self.assertEqual(submission_key('wf', ['a', 'b']), submission_key('wf', ['b', 'a']))
+        self.assertNotEqual(submission_key('wf', ['a']), submission_key('other', ['a']))
+        self.assertNotEqual(submission_key('wf', ['a'], {'execution_profile': 'debug', 'profiling': False}),
+                            submission_key('wf', ['a'], {'execution_profile': 'production', 'profiling': False}))
+        self.assertNotEqual(submission_key('wf', ['a'], {'execution_profile': None, 'profiling': True}),
+                            submission_key('wf', ['a'], {'execution_profile': None, 'profiling': False}))
+
+    def test_reuses_running_and_recently_completed_tasks(self):
+        statuses = {'task_1': 'RUNNING'}
+        self.assertFalse(self.store.claim('k', 'task_1', statuses.get)['reused'])
+        claim = self.store.claim('k', 'task_2', statuses.get)
+        self.assertEqual((claim['task_id'], claim['reused']), ('task_1', True))
+        statuses['task_1'] = 'COMPLETED'
+        self.assertEqual(self.store.claim('k', 'task_3', statuses.get)['task_id'], 'task_1')
+
+    def test_failed_or_expired_tasks_are_replaced(self):
+        statuses = {'task_1': 'FAILED'}
+        self.store.claim('k', 'task_1', statuses.get)
+        self.assertEqual(self.store.claim('k', 'task_2', statuses.get)['task_id'], 'task_2')
+        statuses['task_2'] = 'COMPLETED'
+        with patch('src.idempotency.time.time', return_value=time.time() + 120):
+            self.assertEqual(self.store.claim('k', 'task_3', statuses.get)['task_id'], 'task_3')
+
+    def test_released_key_can_be_claimed_again(self):
+        self.store.claim('k', 'task_1', lambda task_id: None)
+        # A task that is registered but not launched yet still counts as in progress
+        self.assertTrue(self.store.claim('k', 'task_2', lambda task_id: None)['reused'])
+        self.store.release('k', 'task_1')
+        self.assertFalse(self.store.claim('k', 'task_2', lambda task_id: None)['reused'])
+
+class IdempotentSubmissionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(db_path=os.path.join(self.tmp.name, 'queue.db'), review_queue_dir=os.path.join(self.tmp.name, 'review'))
+        self.store = IdempotencyStore(db_path=os.path.join(self.tmp.name, 'idempotency.db'))
+        self.workflow_id = f'test_idempotency_{os.getpid()}.yaml'
+        self.workflow_path = os.path.join(project_root, 'workflows', self.workflow_id)
+        with open(self.workflow_path, 'w') as f:
+            f.write('name: Test Workflow\nsteps:\n  - name: Step 1\n    action: browser_goto\n    params:\n      url: https://www.google.com\n')
+        self.patches = [patch('webapp.app._work_queue', self.queue), patch('webapp.app._idempotency', self.store)]
+        for p in self.patches:
+            p.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        os.remove(self.workflow_path)
+        self.tmp.cleanup()
+
+    def submit(self, content=b'receipt', headers=None, **form):
+        data = dict(form, workflow_id=self.workflow_id, files=(BytesIO(content), 'receipt.pdf'))
+        response = self.client.post('/api/tasks', content_type='multipart/form-data', data=data, headers=headers or {})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_duplicate_submission_attaches_to_existing_task(self):
+        first = self.submit()
+        second = self.submit()
+        self.assertEqual(second['task_id'], first['task_id'])
+        self.assertTrue(second['duplicate'])
+        self.assertEqual(self.queue.stats()['PENDING'], 1)
+        self.assertNotEqual(self.submit(content=b'another receipt')['task_id'], first['task_id'])
+
+    def test_resubmission_with_other_run_options_starts_a_new_task(self):
+        first = self.submit()
+        debug = self.submit(execution_profile='debug')
+        profiled = self.submit(profiling='true')
+        self.assertEqual(len({first['task_id'], debug['task_id'], profiled['task_id']}), 3)
+        self.assertFalse(debug.get('duplicate'))
+        self.assertEqual(self.submit(profiling='true')['task_id'], profiled['task_id'])
+
+    def test_completed_result_is_returned(self):
+        first = self.submit(headers={'Idempotency-Key': 'claim-42'})
+        item = self.queue.lease('worker-1', visibility_timeout=60)
+        self.queue.complete(item['id'], 'worker-1', result={'claim_number': 'BX-001'})
+        again = self.submit(content=b'different bytes, same client key', headers={'Idempotency-Key': 'claim-42'})
+        self.assertEqual((again['task_id'], again['status']), (first['task_id'], 'COMPLETED'))
+        self.assertEqual(again['result'], {'claim_number': 'BX-001'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import tempfile
+
+# Add the project root to the path to import the image preprocessor
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from PIL import Image, ImageDraw
+from src import image_preprocessor
+
+class ImagePreprocessorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_patch = patch.object(image_preprocessor, 'CACHE_DIR', os.path.join(self.temp_dir, 'cache'))
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def make_receipt_photo(self, exif_orientation=None):
+        """A 4000x3000 photo of a white receipt lying on a dark desk."""
+        photo = Image.new('RGB', (4000, 3000), (60, 60, 60))
+        draw = ImageDraw.Draw(photo)
+        draw.rectangle((1000, 500, 2999, 2499), fill=(250, 250, 250))
+        draw.rectangle((1200, 700, 2800, 800), fill=(0, 0, 0))
+        path = os.path.join(self.temp_dir, 'receipt.jpg')
+        if exif_orientation:
+            exif = Image.Exif()
+            exif[0x0112] = exif_orientation
+            photo.save(path, quality=95, exif=exif)
+        else:
+            photo.save(path, quality=95)
+        return path
+
+    def test_crops_to_document_and_downscales(self):
+        path = self.make_receipt_photo()
+        normalized_path = image_preprocessor.normalize_image(path, max_side=800)
+        with Image.open(normalized_path) as normalized:
+            self.assertLessEqual(max(normalized.size), 800)
+            # The receipt is square, the photo is 4:3, so a square result means it was cropped
+            self.assertAlmostEqual(normalized.size[0] / normalized.size[1], 1.0, delta=0.05)
+        self.assertLess(os.path.getsize(normalized_path), os.path.getsize(path))
+
+    def test_auto_orients_and_reuses_cache(self):
+        path = self.make_receipt_photo(exif_orientation=6)
+        normalized_path = image_preprocessor.normalize_image(path, max_side=1000, crop=False)
+        with Image.open(normalized_path) as normalized:
+            self.assertEqual(normalized.size, (750, 1000))
+
+        with patch('PIL.Image.open') as mock_open:
+            self.assertEqual(image_preprocessor.normalize_image(path, max_side=1000, crop=False), normalized_path)
+            mock_open.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
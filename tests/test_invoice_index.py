@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+import threading
+import time
+
+# Add the project root to the path to import the invoice index
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.invoice_index import STAGE_EXCEL, STAGE_SUBMISSION, DuplicateInvoiceError, InvoiceIndex, invoice_identity
+from src import invoice_index
+from src import ai_services
+from robots import reimbursement
+
+class InvoiceIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = InvoiceIndex(db_path=os.path.join(self.tmp.name, 'invoice_index.db'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_identity_normalizes_amount_and_date(self):
+        self.assertEqual(invoice_identity({'invoice_number': ' 0123 ', 'total_amount_nett_incl_tax': '¥1,170.0', 'issue_date': '2025年7月30日'}),
+                         {'invoice_number': '0123', 'amount': '1170.00', 'invoice_date': '2025-07-30'})
+        self.assertEqual(invoice_identity({'amount': 'n/a'}), {'invoice_number': None, 'amount': None, 'invoice_date': None})
+
+    def test_duplicates_by_file_hash_or_invoice_number_per_stage(self):
+        self.index.record(STAGE_SUBMISSION, data={'invoice_number': 'A001', 'amount': '100', 'date': '2025-07-01'},
+                          file_hash='h1', reference='A001')
+        with self.assertRaises(DuplicateInvoiceError) as ctx:
+            self.index.check(STAGE_SUBMISSION, file_hash='h1')
+        self.assertEqual(ctx.exception.match['reference'], 'A001')
+        with self.assertRaises(DuplicateInvoiceError):
+            self.index.check(STAGE_SUBMISSION, data={'invoice_number': 'A001', 'amount': 100.0})
+        # Same number with a different amount is a different invoice; other stages are independent
+        self.index.check(STAGE_SUBMISSION, data={'invoice_number': 'A001', 'amount': '200', 'date': '2025-07-01'})
+        self.index.check(STAGE_EXCEL, data={'invoice_number': 'A001'}, file_hash='h1')
+
+    def test_concurrent_claims_admit_one_submission(self):
+        data = {'invoice_number': 'A001', 'amount': '100', 'date': '2025-07-01'}
+        outcomes = []
+        def worker():
+            index = InvoiceIndex(db_path=self.index.db_path) # each worker has its own connection, as separate processes would
+            try:
+                outcomes.append(index.claim(STAGE_SUBMISSION, data=dict(data)))
+            except DuplicateInvoiceError as e:
+                outcomes.append(e)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        claims = [o for o in outcomes if isinstance(o, int)]
+        self.assertEqual(len(claims), 1)
+        self.assertIn('正在处理', str([o for o in outcomes if not isinstance(o, int)][0]))
+
+        # A failed submission releases the claim; a successful one makes it permanent
+        self.index.release_claim(claims[0])
+        claim_id = self.index.claim(STAGE_SUBMISSION, data=data)
+        self.index.complete_claim(claim_id, reference='A001')
+        with self.assertRaises(DuplicateInvoiceError) as ctx:
+            self.index.claim(STAGE_SUBMISSION, data=data)
+        self.assertEqual(ctx.exception.match['reference'], 'A001')
+
+    def test_stale_claims_from_crashed_workers_expire(self):
+        data = {'invoice_number': 'B002', 'amount': '50'}
+        self.index.claim(STAGE_SUBMISSION, data=data)
+        with patch.object(invoice_index, 'CLAIM_TTL', 0.01):
+            time.sleep(0.02)
+            self.index.check(STAGE_SUBMISSION, data=data)
+            self.assertIsInstance(self.index.claim(STAGE_SUBMISSION, data=data), int)
+
+    def test_excel_pipeline_skips_duplicates_before_extraction(self):
+        first = self._write('invoice_a.pdf', 'invoice A')
+        copy = self._write('invoice_a_copy.pdf', 'invoice A')
+        rescan = self._write('invoice_a_rescan.pdf', 'invoice A, scanned again')
+        extracted = {'invoice_number': '25442000000123456789', 'total_amount_nett_incl_tax': 1170.0, 'issue_date': '2025-07-30'}
+        with patch.object(ai_services, 'get_invoice_index', return_value=self.index), \
+                patch.object(ai_services, 'extract_document_data', return_value=extracted) as mock_extract, \
+                patch.object(ai_services, 'generate_excel_mapping', return_value=[]), \
+                patch.object(ai_services, 'fill_excel_template', return_value='filled.xlsx'):
+            result = ai_services.process_receipts_and_fill_excel([first, copy, rescan], 'template.xlsx')
+            self.assertEqual(result['original_receipt_paths'], [first])
+            self.assertEqual([d['file_path'] for d in result['duplicates']], [copy, rescan])
+            self.assertEqual(mock_extract.call_count, 2) # the identical copy never reaches extraction
+
+            result = ai_services.process_receipts_and_fill_excel([copy], 'template.xlsx')
+            self.assertEqual(result['original_receipt_paths'], [])
+            self.assertEqual(mock_extract.call_count, 2)
+
+    @patch('robots.reimbursement.page')
+    @patch('robots.reimbursement.open_business_system')
+    def test_submission_is_short_circuited_before_browser_work(self, mock_open, mock_page):
+        data = {'invoice_number': 'A001', 'amount': '100.00', 'date': '2025-07-01'}
+        with patch.object(reimbursement, 'get_invoice_index', return_value=self.index), \
+                patch.object(reimbursement, 'verify_submission'), patch.object(reimbursement, 'fill_reimbursement_form'):
+            self.assertEqual(reimbursement.interact_with_business_system(data, file_hash='h1'), 'A001')
+            with self.assertRaises(DuplicateInvoiceError):
+                reimbursement.interact_with_business_system(dict(data, amount='100'))
+        self.assertEqual(mock_open.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import threading
+import time
+
+# Add the project root to the path to import the limiter
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import requests
+from src.llm_limiter import AdaptiveConcurrencyLimiter, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+def http_error(status_code):
+    response = MagicMock()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+class AdaptiveConcurrencyLimiterTestCase(unittest.TestCase):
+
+    def test_additive_increase_and_multiplicative_decrease(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=4, latency_target=10)
+        for _ in range(10):
+            limiter.run(lambda: 'ok')
+        # Sequential calls saturate a limit of 1 but never use a limit of 2, so growth stops there
+        self.assertEqual(limiter.stats()['limit'], 2)
+
+        def overloaded():
+            raise http_error(429)
+        with self.assertRaises(requests.HTTPError):
+            limiter.run(overloaded)
+        self.assertEqual(limiter.stats()['limit'], 1)
+
+        # A 4xx that is not an overload signal does not shrink the limit
+        def bad_request():
+            raise http_error(400)
+        before = limiter.stats()['limit']
+        with self.assertRaises(requests.HTTPError):
+            limiter.run(bad_request)
+        self.assertEqual(limiter.stats()['limit'], before)
+
+    def test_slow_responses_reduce_the_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, latency_target=0.01)
+        limiter.run(lambda: time.sleep(0.05))
+        self.assertEqual(limiter.stats()['limit'], 2)
+
+    def test_interactive_requests_jump_the_queue(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+        order = []
+        release_first = threading.Event()
+
+        def hold():
+            release_first.wait(5)
+
+        holder = threading.Thread(target=limiter.run, args=(hold,))
+        holder.start()
+        while limiter.stats()['in_flight'] == 0:
+            time.sleep(0.01)
+
+        threads = [
+            threading.Thread(target=limiter.run, args=(lambda: order.append('batch'), PRIORITY_BATCH)),
+            threading.Thread(target=limiter.run, args=(lambda: order.append('interactive'), PRIORITY_INTERACTIVE)),
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        self.assertEqual(limiter.stats()['queue_depth'], 2)
+
+        release_first.set()
+        for thread in [holder] + threads:
+            thread.join(5)
+        self.assertEqual(order, ['interactive', 'batch'])
+
+if __name__ == '__main__':
+    unittest.main()
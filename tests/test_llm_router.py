@@ -0,0 +1,156 @@
+import unittest
+import os
+import json
+import threading
+import time
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to the path to import the router
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.llm_router import LLMBackend, LLMRouter
+from src.llm_limiter import get_llm_limiter
+
+class StubLLMServer:
+    """A local OpenAI-compatible stub whose latency and status code can be changed per test."""
+
+    def __init__(self, name, delay=0.0, status=200):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.in_flight -= 1
+                self._reply(stub.status, {'choices': [{'message': {'content': stub.name}}]})
+
+            def do_GET(self):
+                self._reply(stub.status, {'data': []})
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions'
+
+    def backend(self, **kwargs):
+        return LLMBackend(name=self.name, url=self.url, model=f'{self.name}-model', **kwargs)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def answer(response):
+    return response['choices'][0]['message']['content']
+
+class LLMRouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def stub(self, name, **kwargs):
+        server = StubLLMServer(name, **kwargs)
+        self.servers.append(server)
+        return server
+
+    def test_prefers_fastest_backend(self):
+        slow, fast = self.stub('slow', delay=0.2), self.stub('fast')
+        router = LLMRouter([slow.backend(), fast.backend()], hedge_delay=5)
+        for _ in range(3):
+            router.chat({'messages': []})
+        self.assertEqual(answer(router.chat({'messages': []})), 'fast')
+        self.assertLess(router.stats()['fast']['p50_latency'], router.stats()['slow']['p50_latency'])
+
+    def test_hedges_to_second_backend_when_primary_is_slow(self):
+        stalled, fast = self.stub('stalled', delay=1.0), self.stub('fast')
+        stalled_backend, fast_backend = stalled.backend(), fast.backend()
+        # Make the stalled backend look fastest so it is chosen as primary
+        fast_backend.latencies.append(0.5)
+        router = LLMRouter([stalled_backend, fast_backend], hedge_delay=0.1)
+        started = time.monotonic()
+        self.assertEqual(answer(router.chat({'messages': []})), 'fast')
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_fails_over_and_marks_backend_unhealthy(self):
+        broken, healthy = self.stub('broken', status=503), self.stub('healthy')
+        broken_backend, healthy_backend = broken.backend(), healthy.backend()
+        healthy_backend.latencies.append(0.5)
+        router = LLMRouter([broken_backend, healthy_backend], hedge_delay=5, health_check_interval=60)
+        for _ in range(3):
+            self.assertEqual(answer(router.chat({'messages': []})), 'healthy')
+        self.assertFalse(broken_backend.healthy)
+        requests_before = broken.requests
+        router.chat({'messages': []})
+        self.assertEqual(broken.requests, requests_before)
+
+    def test_concurrency_follows_the_limiter_not_the_pool(self):
+        busy = self.stub('router-busy', delay=0.3)
+        limiter = get_llm_limiter('router-busy')
+        limiter.limit = 8.0
+        router = LLMRouter([busy.backend()], hedge_delay=5)
+        threads = [threading.Thread(target=router.chat, args=({'messages': []},)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(busy.max_in_flight, 8)
+
+        # With a single slot the second call waits in the limiter; that wait is not backend latency
+        limiter.limit = 1.0
+        limiter.max_limit = 1
+        busy.delay = 0.2
+        backend = busy.backend()
+        router = LLMRouter([backend], hedge_delay=5)
+        threads = [threading.Thread(target=router.chat, args=({'messages': []},)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(max(backend.latencies), 0.35)
+
+    def test_client_errors_neither_fail_over_nor_mark_backend_unhealthy(self):
+        rejecting, other = self.stub('router-rejecting', status=400), self.stub('router-other')
+        rejecting_backend, other_backend = rejecting.backend(), other.backend()
+        other_backend.latencies.append(0.5)
+        router = LLMRouter([rejecting_backend, other_backend], hedge_delay=5)
+        for _ in range(4):
+            with self.assertRaises(requests.HTTPError):
+                router.chat({'messages': []})
+        self.assertTrue(rejecting_backend.healthy)
+        self.assertEqual(rejecting_backend.error_rate(), 0.0)
+        self.assertEqual(other.requests, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import random
+import tempfile
+
+# Add the project root to the path to import the load test harness
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from benchmarks import fake_executor, load_test
+
+class LoadTestHarnessTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(load_test.percentile(values, 50), 50.0)
+        self.assertEqual(load_test.percentile(values, 99), 99.0)
+        self.assertEqual(load_test.percentile([3.0], 90), 3.0)
+        self.assertIsNone(load_test.percentile([], 50))
+
+    def test_scenarios_generate_varied_unique_uploads(self):
+        scenarios = load_test.load_scenarios()
+        for name, scenario in scenarios.items():
+            self.assertTrue(scenario['stages'], name)
+            self.assertTrue(os.path.exists(os.path.join(project_root, 'workflows', scenario['workflow_id'])), name)
+        rng = random.Random(1)
+        uploads = [load_test.pick_files(scenarios['smoke'], rng) for _ in range(5)]
+        self.assertTrue(all(1 <= len(files) <= 2 for files in uploads))
+        contents = [f[1][1] for files in uploads for f in files]
+        self.assertTrue(all(len(c) == 100 * 1024 and c.startswith(b'%PDF') for c in contents))
+        self.assertEqual(len(set(contents)), len(contents))
+
+    def test_fake_executor_writes_launch_marker(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, 'work-items.json')
+            with open(input_path, 'w') as f:
+                json.dump([{'payload': {'file_paths': ['a.pdf', 'b.pdf']}, 'files': {}}], f)
+            with patch.dict(os.environ, {'RC_WORKITEM_INPUT_PATH': input_path}):
+                self.assertEqual(fake_executor.main(['--duration', '0']), 0)
+                self.assertEqual(fake_executor.main(['--duration', '0', '--fail-rate', '1']), 1)
+            with open(os.path.join(tmp, 'fake_executor.json')) as f:
+                self.assertEqual(json.load(f)['files'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+# Add the project root to the path to import the mapping plan module
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src import mapping_plan
+from src.mapping_plan import apply_mapping_plan, builtin_plan, compile_mapping_plan, validate_plan
+
+class FakeLLM:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    def generate_yaml_from_prompt(self, prompt):
+        self.prompts.append(prompt)
+        return self.response
+
+class MappingPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.plan_dir = os.path.join(self.tmp.name, 'plans')
+        self.template_path = os.path.join(self.tmp.name, 'template.xlsx')
+        with open(self.template_path, 'wb') as f:
+            f.write(b'template-v1')
+        mapping_plan._plans.clear()
+
+    def tearDown(self):
+        mapping_plan._plans.clear()
+        self.tmp.cleanup()
+
+    def _compile(self, llm, document_types=('jipiao',), description='A列日期，B列城市'):
+        return compile_mapping_plan(self.template_path, description, document_types, llm=llm, plan_dir=self.plan_dir)
+
+    def test_plan_is_compiled_once_and_reused(self):
+        llm = FakeLLM(json.dumps({'start_row': 2, 'rules': {'jipiao': [
+            {'column': 'A', 'field': 'booking_date'},
+            {'column': 'B', 'template': '{departure_city}-{arrival_city}'},
+            {'column': 'E', 'value': '机票'},
+        ]}}))
+        plan = self._compile(llm)
+        self.assertEqual(plan['source'], 'llm')
+        mapping_plan._plans.clear() # 模拟新进程，只能从磁盘读取
+        for _ in range(5):
+            self.assertEqual(self._compile(llm)['key'], plan['key'])
+        self.assertEqual(len(llm.prompts), 1)
+
+        records = [{'document_type': 'jipiao', 'data': {'booking_date': '2025-07-30', 'departure_city': '北京', 'arrival_city': '上海'}},
+                   {'document_type': 'unknown', 'data': {}}]
+        self.assertEqual(apply_mapping_plan(plan, records), [
+            {'source_index': 0, 'target_row': 2, 'mappings': [
+                {'target_column': 'A', 'value': '2025-07-30'},
+                {'target_column': 'B', 'value': '北京-上海'},
+                {'target_column': 'E', 'value': '机票'},
+            ]},
+            {'source_index': 1, 'target_row': 3, 'mappings': []},
+        ])
+
+    def test_template_description_or_types_change_the_plan(self):
+        llm = FakeLLM(json.dumps({'rules': {'jipiao': [], 'train_ticket': []}}))
+        key = self._compile(llm)['key']
+        self.assertNotEqual(self._compile(llm, description='A列金额')['key'], key)
+        self.assertNotEqual(self._compile(llm, document_types=('jipiao', 'train_ticket'))['key'], key)
+        with open(self.template_path, 'wb') as f:
+            f.write(b'template-v2')
+        self.assertNotEqual(self._compile(llm)['key'], key)
+        self.assertEqual(len(llm.prompts), 4)
+
+    def test_invalid_llm_plan_falls_back_to_builtin_rules_without_caching(self):
+        llm = FakeLLM(json.dumps({'rules': {'jipiao': [{'column': 'B', 'field': 'city', 'value': 'x'}]}}))
+        plan = self._compile(llm)
+        self.assertEqual(plan['source'], 'builtin')
+        self.assertEqual(plan['rules'], builtin_plan(['jipiao'])['rules'])
+        self.assertFalse(os.path.exists(self.plan_dir))
+
+    def test_validate_plan(self):
+        self.assertEqual(validate_plan(builtin_plan(['jipiao', 'xingchengdan']), ['jipiao', 'xingchengdan']), [])
+        errors = validate_plan({'start_row': 0, 'rules': {'jipiao': [{'column': 'a1', 'field': 'x'}]}}, ['jipiao', 'train_ticket'])
+        self.assertEqual(len(errors), 3)
+
+    def test_plan_with_unknown_fields_is_rejected_before_caching(self):
+        for rule in ({'column': 'A', 'field': 'flight_no'}, {'column': 'B', 'template': '{departure_city}-{gate}'},
+                     {'column': 'C', 'template': '{departure_city'}):
+            llm = FakeLLM(json.dumps({'rules': {'jipiao': [rule]}}))
+            mapping_plan._plans.clear()
+            self.assertEqual(self._compile(llm)['source'], 'builtin')
+            self.assertFalse(os.path.exists(self.plan_dir))
+        fields = {'jipiao': {'departure_city': '出发城市'}}
+        plan = {'rules': {'jipiao': [{'column': 'B', 'template': '{departure_city}-{gate}'}]}}
+        self.assertEqual(len(validate_plan(plan, ['jipiao'], fields)), 1)
+        self.assertEqual(len(validate_plan(plan, ['jipiao'], {})), 2)
+
+    def test_refresh_recompiles_cached_plan(self):
+        llm = FakeLLM(json.dumps({'rules': {'jipiao': [{'column': 'A', 'field': 'booking_date'}]}}))
+        self._compile(llm)
+        self._compile(llm)
+        self.assertEqual(len(llm.prompts), 1)
+        compile_mapping_plan(self.template_path, 'A列日期，B列城市', ('jipiao',), llm=llm, plan_dir=self.plan_dir, refresh=True)
+        with patch.dict(os.environ, {'MAPPING_PLAN_REFRESH': 'true'}):
+            self._compile(llm)
+        self.assertEqual(len(llm.prompts), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import subprocess
+import tempfile
+from unittest.mock import patch
+
+# Add the project root to the path to import the metrics module
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.metrics import observe_stage, record_cache, render_metrics
+from src.metrics_config import configure_metrics_dir
+from src.work_queue import WorkQueue
+from webapp.app import app
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_stage_and_cache_metrics_are_rendered(self):
+        with observe_stage('classify'):
+            pass
+        record_cache('document_text', hit=True)
+        body, content_type = render_metrics()
+        text = body.decode()
+        self.assertIn('text/plain', content_type)
+        self.assertIn('llmrpa_stage_duration_seconds_count{stage="classify"}', text)
+        self.assertIn('llmrpa_cache_requests_total{cache="document_text",result="hit"}', text)
+
+    def test_stage_is_recorded_when_it_fails(self):
+        with self.assertRaises(ValueError):
+            with observe_stage('fill'):
+                raise ValueError('boom')
+        self.assertIn('llmrpa_stage_duration_seconds_count{stage="fill"}', render_metrics()[0].decode())
+
+    def test_killed_executor_is_dropped_from_live_gauges(self):
+        # 多进程模式只能在导入 prometheus_client 之前启用，因此在子进程中验证
+        script = (
+            "import os, subprocess, sys\n"
+            "from src.metrics import ACTIVE_TASKS, mark_process_dead, render_metrics\n"
+            "child = subprocess.run([sys.executable, '-c', 'import os; from src.metrics import ACTIVE_TASKS; "
+            "ACTIVE_TASKS.labels(task=\"run_workflow\").inc(); print(os.getpid()); os._exit(1)'], "
+            "capture_output=True, text=True, check=False)\n"
+            "before = render_metrics()[0].decode()\n"
+            "mark_process_dead(int(child.stdout))\n"
+            "after = render_metrics()[0].decode()\n"
+            "print('run_workflow' in before, 'run_workflow' in after)\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=tmp, PYTHONPATH=project_root)
+            result = subprocess.run([sys.executable, '-c', script], env=env, cwd=project_root,
+                                    capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), ['True', 'False'])
+
+    def test_reset_keeps_files_of_running_processes(self):
+        dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        names = [f'counter_{os.getpid()}.db', f'gauge_livesum_{os.getpid()}.db',
+                 f'counter_{dead.stdout.strip()}.db', f'histogram_{dead.stdout.strip()}.db', 'notes.txt']
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in names:
+                open(os.path.join(tmp, name), 'w').close()
+            with patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': tmp}):
+                configure_metrics_dir(reset=True)
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(names[:2] + ['notes.txt']))
+
+    def test_metrics_endpoint_includes_work_queue_depth(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = WorkQueue(db_path=os.path.join(tmp, 'queue.db'), review_queue_dir=os.path.join(tmp, 'review'))
+            queue.enqueue({'workflow_file': 'workflows/a.yaml'})
+            with patch('webapp.app._work_queue', queue):
+                response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('llmrpa_work_queue_items{status="PENDING"} 1.0', response.get_data(as_text=True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import json
+import shutil
+import tempfile
+
+# Add the project root to the path to import the network filter
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.network_filter import NetworkFilter, glob_to_regex, validate_network_config
+
+def make_route(url, resource_type):
+    route = MagicMock()
+    route.request.url = url
+    route.request.resource_type = resource_type
+    return route
+
+class NetworkFilterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.sizes_path = os.path.join(self.temp_dir, 'sizes.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_glob_semantics(self):
+        self.assertTrue(glob_to_regex('**/analytics/**').match('https://oa.example.com/analytics/track.js'))
+        self.assertTrue(glob_to_regex('https://oa.example.com/*.png').match('https://oa.example.com/logo.png'))
+        self.assertFalse(glob_to_regex('https://oa.example.com/*.png').match('https://oa.example.com/img/logo.png'))
+
+    def test_allow_rules_take_precedence_and_stats_are_reported(self):
+        with open(self.sizes_path, 'w') as f:
+            json.dump({'https://oa.example.com/banner.jpg': 2048}, f)
+        network_filter = NetworkFilter({
+            'block': {'resource_types': ['image', 'font'], 'urls': ['**/analytics/**']},
+            'allow': {'urls': ['**/captcha/**']},
+        }, sizes_path=self.sizes_path)
+
+        routes = [
+            make_route('https://oa.example.com/banner.jpg', 'image'),
+            make_route('https://oa.example.com/captcha/code.png', 'image'),
+            make_route('https://stats.example.com/analytics/hit', 'xhr'),
+            make_route('https://oa.example.com/main.do', 'document'),
+        ]
+        for route in routes:
+            network_filter.handle_route(route)
+
+        routes[0].abort.assert_called_once()
+        routes[1].continue_.assert_called_once()
+        routes[2].abort.assert_called_once()
+        routes[3].continue_.assert_called_once()
+        stats = network_filter.stats()
+        self.assertEqual(stats['blocked_requests'], 2)
+        self.assertEqual(stats['allowed_requests'], 2)
+        self.assertEqual(stats['blocked_by_type'], {'image': 1, 'xhr': 1})
+        self.assertEqual(stats['estimated_bytes_saved'], 2048)
+
+    def test_sizes_ignore_query_strings_and_are_capped(self):
+        network_filter = NetworkFilter({'block': {'resource_types': ['image']}}, sizes_path=self.sizes_path)
+        response = MagicMock()
+        with patch('src.network_filter.MAX_KNOWN_SIZES', 3):
+            for i in range(5):
+                response.url = f'https://oa.example.com/img/{i}.png?t={i}'
+                response.headers = {'content-length': str(100 + i)}
+                network_filter._record_response_size(response)
+            response.url = 'https://oa.example.com/img/4.png?t=99'
+            network_filter._record_response_size(response)
+        self.assertEqual(list(network_filter.known_sizes),
+                         ['oa.example.com/img/2.png', 'oa.example.com/img/3.png', 'oa.example.com/img/4.png'])
+
+        network_filter.handle_route(make_route('https://oa.example.com/img/3.png?t=1000', 'image'))
+        self.assertEqual(network_filter.stats()['estimated_bytes_saved'], 103)
+        network_filter.save_sizes()
+        with open(self.sizes_path) as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_dry_run_counts_without_blocking(self):
+        network_filter = NetworkFilter({'dry_run': True, 'block': {'resource_types': ['image']}}, sizes_path=None)
+        route = make_route('https://oa.example.com/banner.jpg', 'image')
+        network_filter.handle_route(route)
+        route.continue_.assert_called_once()
+        route.abort.assert_not_called()
+        self.assertEqual(network_filter.stats()['blocked_requests'], 1)
+
+    def test_invalid_config_is_rejected(self):
+        self.assertTrue(validate_network_config({'block': {'resource_types': ['pictures']}}))
+        self.assertTrue(validate_network_config({'deny': {}}))
+        self.assertEqual(validate_network_config({'block': {'resource_types': 5}}),
+                         ["'network.block.resource_types' must be a list."])
+        with self.assertRaises(ValueError):
+            NetworkFilter({'block': {'urls': 'not-a-list'}}, sizes_path=None)
+
+    def test_single_resource_type_and_corrupt_size_cache(self):
+        self.assertEqual(validate_network_config({'block': {'resource_types': 'image'}}), [])
+        with open(self.sizes_path, 'w') as f:
+            json.dump([1, 2, 3], f)
+        with self.assertLogs(level='WARNING'):
+            network_filter = NetworkFilter({'block': {'resource_types': 'image'}}, sizes_path=self.sizes_path)
+        self.assertEqual(network_filter.known_sizes, {})
+        self.assertTrue(network_filter.should_block('https://oa.example.com/a.png', 'image'))
+        self.assertFalse(network_filter.should_block('https://oa.example.com/a.js', 'script'))
+
+if __name__ == '__main__':
+    unittest.main()
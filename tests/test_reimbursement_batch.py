@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import json
+import shutil
+import tempfile
+
+# Add the project root to the path to import the robots
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from robots import reimbursement
+
+class ReimbursementBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_records_from_csv_and_review_queue(self):
+        """Records can come from a CSV file or from review queue IDs."""
+        csv_path = os.path.join(self.temp_dir, 'records.csv')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('invoice_number,amount,date\nA001,100.00,2025-07-01\nA002,200.00,2025-07-02\n')
+        records = reimbursement.load_reviewed_records(csv_path)
+        self.assertEqual([r['data']['invoice_number'] for r in records], ['A001', 'A002'])
+
+        queue_dir = os.path.join(self.temp_dir, 'review_queue')
+        os.makedirs(queue_dir)
+        with open(os.path.join(queue_dir, '7.json'), 'w') as f:
+            json.dump({'id': '7', 'corrected_data': {'invoice_number': 'B007'}}, f)
+        with patch.object(reimbursement, 'REVIEW_QUEUE_DIR', queue_dir):
+            records = reimbursement.load_reviewed_records('7')
+        self.assertEqual(records[0]['data']['invoice_number'], 'B007')
+        self.assertTrue(records[0]['review_file'].endswith('7.json'))
+
+    @patch('robots.reimbursement.page')
+    @patch('robots.reimbursement.submit_claim', return_value='B007')
+    @patch('robots.reimbursement.open_business_system')
+    def test_unusable_review_items_fail_without_aborting_the_batch(self, mock_open, mock_submit, mock_page):
+        """A missing review ID or an item without reviewed data is FAILED; the other records are still submitted."""
+        queue_dir = os.path.join(self.temp_dir, 'review_queue')
+        os.makedirs(queue_dir)
+        with open(os.path.join(queue_dir, '7.json'), 'w') as f:
+            json.dump({'id': '7', 'corrected_data': {'invoice_number': 'B007'}}, f)
+        with open(os.path.join(queue_dir, '8.json'), 'w') as f:
+            json.dump({'id': '8', 'payload': {'file_paths': ['a.pdf']}}, f)
+        with patch.object(reimbursement, 'REVIEW_QUEUE_DIR', queue_dir):
+            records = reimbursement.load_reviewed_records('404, 7, 8')
+        results = reimbursement.submit_claims_in_session(records)
+
+        self.assertEqual([r['status'] for r in results], ['FAILED', 'SUCCESS', 'FAILED'])
+        self.assertIn('not found', results[0]['error'])
+        self.assertIn('no corrected or extracted data', results[2]['error'])
+        mock_submit.assert_called_once_with({'invoice_number': 'B007'})
+
+    @patch('robots.reimbursement.page')
+    @patch('robots.reimbursement.submit_claim')
+    @patch('robots.reimbursement.open_business_system')
+    def test_batch_logs_in_once_and_continues_past_failures(self, mock_open, mock_submit, mock_page):
+        """A failed record is reported, and only the following record triggers a new login."""
+        mock_submit.side_effect = ['A001', Exception('form error'), 'A003']
+        records = [
+            {'record_id': str(i), 'data': {'invoice_number': f'A00{i}'}, 'review_file': None}
+            for i in (1, 2, 3)
+        ]
+        with patch('robots.reimbursement.os.makedirs'):
+            results = reimbursement.submit_claims_in_session(records)
+
+        self.assertEqual([r['status'] for r in results], ['SUCCESS', 'FAILED', 'SUCCESS'])
+        self.assertEqual(results[1]['error'], 'form error')
+        self.assertEqual(mock_submit.call_count, 3)
+        self.assertEqual(mock_open.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
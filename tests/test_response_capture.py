@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import os
+import tempfile
+
+# Add the project root to the path to import the capture subsystem and the executor
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.blob_store import BlobStore, is_blob_ref
+from src.response_capture import ResponseCapture
+from src.workflow_validator import validate_workflow_text, has_errors
+from src.actions.capture import browser_capture_responses
+from robots.workflow_executor import WorkflowExecutor
+
+def make_response(url, body, resource_type='xhr', status=200, headers=None):
+    response = MagicMock()
+    response.url = url
+    response.status = status
+    response.headers = headers or {}
+    response.request.method = 'GET'
+    response.request.resource_type = resource_type
+    response.body.return_value = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+    return response
+
+def affair_page(start):
+    return {'data': {'rows': [{'id': i, 'subject': f'报销单 {i}', 'html': '<td>...</td>'} for i in range(start, start + 3)]}}
+
+class ResponseCaptureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BlobStore(root=os.path.join(self.tmp.name, 'blobs'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_streams_matching_responses_with_projection_and_caps(self):
+        writer = self.store.open_stream('jsonl')
+        capture = ResponseCapture(writer, ['**/rest/affair/list*'], items_path='data.rows', fields=['id', 'subject'],
+                                  max_body_bytes=4096)
+        capture.handle(make_response('http://oa.example.com/rest/affair/list?page=1', affair_page(0)))
+        capture.handle(make_response('http://oa.example.com/rest/affair/list?page=2', affair_page(3)))
+        capture.handle(make_response('http://oa.example.com/rest/affair/list?page=3', affair_page(6), resource_type='image'))
+        capture.handle(make_response('http://oa.example.com/rest/user', {'name': 'x'}))
+        huge = make_response('http://oa.example.com/rest/affair/list?page=9', b'', headers={'content-length': '99999'})
+        capture.handle(huge)
+        huge.body.assert_not_called()
+        self.assertEqual(capture.stats()['oversized'], 1)
+        self.assertEqual(capture.records, 6)
+
+        rows = self.store.get(writer.commit())
+        self.assertEqual(rows[4], {'id': 4, 'subject': '报销单 4'})
+        self.assertEqual(len(rows), 6)
+
+        writer = self.store.open_stream('jsonl')
+        capture = ResponseCapture(writer, '**/api/**', max_responses=1)
+        capture.handle(make_response('http://oa.example.com/api/a', b'plain text', resource_type='fetch'))
+        capture.handle(make_response('http://oa.example.com/api/b', {'b': 1}, resource_type='fetch'))
+        self.assertEqual(capture.stats()['dropped'], 1)
+        self.assertEqual(self.store.get(writer.commit())[0]['body'], 'plain text')
+
+    def test_action_exposes_captured_rows_as_lazy_variable(self):
+        workflow_path = os.path.join(self.tmp.name, 'workflow.yaml')
+        with open(workflow_path, 'w') as f:
+            f.write('name: W\nsteps: []\n')
+        executor = WorkflowExecutor(workflow_path)
+        executor.blob_store = self.store
+        step = {'action': 'browser_capture_responses', 'steps': [{'action': 'browser_click', 'params': {'selector': '#next'}}]}
+        params = {'url_patterns': ['**/affair/list*'], 'items_path': 'data.rows', 'fields': ['subject'], 'settle_ms': 0}
+
+        with patch('src.actions.capture.browser') as fake_browser:
+            context = fake_browser.context.return_value
+            def run_nested_steps(steps):
+                handler = context.on.call_args.args[1]
+                handler(make_response('http://oa.example.com/affair/list?page=1', affair_page(0)))
+                handler(make_response('http://oa.example.com/affair/list?page=2', affair_page(3)))
+            with patch.object(executor, '_execute_steps', side_effect=run_nested_steps) as execute_steps:
+                ref = browser_capture_responses(executor, step, params)
+            execute_steps.assert_called_once_with(step['steps'])
+            context.remove_listener.assert_called_once_with('response', context.on.call_args.args[1])
+
+        self.assertTrue(is_blob_ref(ref))
+        self.assertEqual(ref['records'], 6)
+        executor.vars['affairs'] = executor.blob_store.maybe_spill(ref)
+        self.assertEqual(executor._resolve_variable('{{ affairs.5.subject }}'), '报销单 5')
+        self.assertEqual(len(executor._resolve_variable('{{ affairs }}')), 6)
+
+    def test_validator_checks_capture_blocks(self):
+        workflow = (
+            "steps:\n"
+            "  - action: browser_capture_responses\n"
+            "    params: {url_patterns: ['**/affair/list*'], resource_types: [xhr]}\n"
+            "    output_to: affairs\n"
+            "    steps:\n"
+            "      - {action: browser_click, params: {selector: '#next'}, output_to: clicked}\n"
+            "  - {action: browser_fill, params: {selector: '#a', value: '{{ affairs.0.subject }}'}}\n"
+            "  - {action: browser_fill, params: {selector: '#b', value: '{{ clicked }}'}}\n"
+        )
+        self.assertEqual(validate_workflow_text(workflow), [])
+        invalid = workflow.replace("[xhr]", "[pixel]").replace("    steps:\n      - {action: browser_click, params: {selector: '#next'}, output_to: clicked}\n", "")
+        messages = [i['message'] for i in validate_workflow_text(invalid)]
+        self.assertTrue(has_errors(validate_workflow_text(invalid)))
+        self.assertTrue(any("Unknown resource type 'pixel'" in m for m in messages))
+        self.assertTrue(any("requires nested 'steps'" in m for m in messages))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import os
+import tempfile
+
+# Add the project root to the path to import the selector cache
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.selector_cache import SelectorCache, CANDIDATES_SCRIPT
+
+class FakeFrame:
+    def __init__(self, url, element=None, child_frames=()):
+        self.url = url
+        self.element = element
+        self.child_frames = list(child_frames)
+
+    def is_detached(self):
+        return False
+
+    def frame_element(self):
+        return self.element
+
+class FakeElement:
+    def __init__(self, candidates, frame=None, tag='div', text=''):
+        self.candidates = candidates
+        self.frame = frame
+        self.fingerprint = {'tag': tag, 'text': text}
+
+    def evaluate(self, script):
+        return self.candidates if script == CANDIDATES_SCRIPT else self.fingerprint
+
+    def is_visible(self):
+        return True
+
+    def content_frame(self):
+        return self.frame
+
+class FakePage:
+    """Mimics the parts of a Playwright page used by the cache; records every wait timeout."""
+
+    def __init__(self, url, elements, frames=()):
+        self.url = url
+        self.elements = elements
+        self.main_frame = FakeFrame(url, child_frames=frames)
+        self.timeouts = []
+
+    def wait_for_selector(self, selector, timeout=30000, state='visible'):
+        self.timeouts.append(timeout)
+        if selector not in self.elements:
+            raise TimeoutError(f"Timeout {timeout}ms waiting for {selector}")
+        return self.elements[selector]
+
+    def query_selector_all(self, selector):
+        matched = self.elements.get(selector, [])
+        return matched if isinstance(matched, list) else [matched]
+
+class SelectorCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, 'selector_cache.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_learns_fallbacks_and_heals_changed_selector(self):
+        button = FakeElement(['#import-btn', 'div:has-text("导入数据")'], text='导入数据')
+        first_run = FakePage('http://oa.example.com/seeyon/main.do?sid=1', {'div[title="导入数据"]': button})
+        cache = SelectorCache(self.cache_path)
+        self.assertIs(cache.locate(first_run, 'div[title="导入数据"]'), button)
+        cache.save()
+
+        # The title attribute was removed in a UI update, but the id still matches
+        second_run = FakePage('http://oa.example.com/seeyon/main.do?sid=2', {'#import-btn': button})
+        cache = SelectorCache(self.cache_path, fast_timeout=500)
+        self.assertIs(cache.locate(second_run, 'div[title="导入数据"]'), button)
+        self.assertNotIn(30000, second_run.timeouts)
+        self.assertEqual(cache.stats(), {'hits': 1, 'healed': 1, 'misses': 0})
+
+    def test_ambiguous_or_different_fallbacks_are_rejected(self):
+        button = FakeElement(['#import-btn', 'div:has-text("导入数据")', 'form > div:nth-of-type(2)'], text='导入数据')
+        cache = SelectorCache(self.cache_path)
+        cache.locate(FakePage('http://oa.example.com/main.do', {'div[title="导入数据"]': button}), 'div[title="导入数据"]')
+
+        # After a redesign the id sits on another button, the text matches twice and the path points elsewhere
+        export = FakeElement([], text='导出数据')
+        page = FakePage('http://oa.example.com/main.do', {
+            '#import-btn': export,
+            'div:has-text("导入数据")': [FakeElement([], text='导入数据'), FakeElement([], text='导入数据')],
+            'form > div:nth-of-type(2)': FakeElement([], tag='span', text='导入数据'),
+        })
+        with self.assertRaises(TimeoutError):
+            cache.locate(page, 'div[title="导入数据"]', timeout=30000)
+        self.assertEqual(page.timeouts[-1], 30000)
+        self.assertEqual(cache.stats()['healed'], 0)
+
+    def test_unknown_selector_uses_full_timeout(self):
+        page = FakePage('http://oa.example.com/', {})
+        cache = SelectorCache(self.cache_path)
+        with self.assertRaises(TimeoutError):
+            cache.locate(page, '#missing', timeout=30000)
+        self.assertEqual(page.timeouts, [30000])
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_frame_resolved_by_recorded_url(self):
+        frame = FakeFrame('http://oa.example.com/seeyon/import.do?layer=3')
+        iframe = FakeElement(['iframe[name="layui-layer-iframe3"]'], frame=frame, tag='iframe')
+        page = FakePage('http://oa.example.com/seeyon/main.do', {'iframe[id^="layui-layer-iframe"]': iframe})
+        cache = SelectorCache(self.cache_path)
+        self.assertIs(cache.locate_frame(page, 'iframe[id^="layui-layer-iframe"]'), frame)
+
+        # Neither the selector nor its candidates match any more, but the frame is still loaded
+        reopened = FakeFrame('http://oa.example.com/seeyon/import.do?layer=5', element=FakeElement([], tag='iframe'))
+        page = FakePage('http://oa.example.com/seeyon/main.do', {}, frames=[reopened])
+        self.assertIs(cache.locate_frame(page, 'iframe[id^="layui-layer-iframe"]'), reopened)
+        self.assertEqual(cache.stats()['healed'], 1)
+
+    def test_ambiguous_or_different_frame_url_is_not_used(self):
+        frame = FakeFrame('http://oa.example.com/seeyon/import.do')
+        iframe = FakeElement([], frame=frame, tag='iframe')
+        page = FakePage('http://oa.example.com/seeyon/main.do', {'iframe.layer': iframe})
+        cache = SelectorCache(self.cache_path)
+        cache.locate_frame(page, 'iframe.layer')
+
+        # Two open layers load the same URL: the new layer is not attached yet, so wait for the selector
+        layers = [FakeFrame('http://oa.example.com/seeyon/import.do?layer=%d' % i, element=FakeElement([], tag='iframe'))
+                  for i in (1, 2)]
+        page = FakePage('http://oa.example.com/seeyon/main.do', {}, frames=layers)
+        with self.assertRaises(TimeoutError):
+            cache.locate_frame(page, 'iframe.layer', timeout=30000)
+        self.assertEqual(page.timeouts, [cache.fast_timeout, 30000])
+
+        # A single frame with that URL whose iframe element differs is not accepted either
+        other = FakeFrame('http://oa.example.com/seeyon/import.do', element=FakeElement([], tag='frame'))
+        page = FakePage('http://oa.example.com/seeyon/main.do', {}, frames=[other])
+        with self.assertRaises(TimeoutError):
+            cache.locate_frame(page, 'iframe.layer')
+        self.assertEqual(cache.stats()['hits'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
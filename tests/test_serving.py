@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import patch
+import os
+import json
+import signal
+import subprocess
+import tempfile
+import time
+from io import BytesIO
+
+# Add the project root to the path to import the webapp
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from webapp import app as app_module
+
+class ServingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module._shutting_down.clear()
+
+    def test_oversized_upload_is_rejected_with_413(self):
+        with patch.dict(app_module.app.config, {'MAX_CONTENT_LENGTH': 1024}):
+            response = self.client.post('/api/tasks', content_type='multipart/form-data', data={
+                'workflow_id': 'final.yaml', 'files': (BytesIO(b'x' * 4096), 'big.pdf')})
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(response.get_json()['success'])
+
+    def test_drain_waits_for_tasks_then_terminates_stragglers(self):
+        quick = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(0.2)'])
+        slow = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        processes = {'task_quick': quick, 'task_slow': slow}
+        tasks = {'task_quick': {'status': 'RUNNING'}, 'task_slow': {'status': 'RUNNING'}}
+        with patch.object(app_module, '_work_queue', None), \
+                patch.dict(app_module._processes, processes, clear=True), \
+                patch.dict(app_module._tasks_db, tasks, clear=True):
+            summary = app_module.drain_tasks(timeout=2)
+            self.assertEqual(summary, {'finished': 1, 'terminated': 1})
+            self.assertEqual(app_module._tasks_db['task_quick']['status'], 'COMPLETED')
+            self.assertEqual(app_module._tasks_db['task_slow']['status'], 'FAILED')
+        self.assertIsNotNone(slow.poll())
+
+        # New tasks are refused while the server drains
+        response = self.client.post('/api/tasks', content_type='multipart/form-data', data={
+            'workflow_id': 'final.yaml', 'files': (BytesIO(b'pdf'), 'a.pdf')})
+        self.assertEqual(response.status_code, 503)
+
+    def test_signal_refuses_new_tasks_and_drain_picks_up_late_tasks(self):
+        with patch.dict(os.environ): # serve 会为多进程指标设置环境变量，不能泄漏给其他测试
+            from webapp import serve
+        serve._stop_on_signal(signal.SIGTERM, None)
+        self.addCleanup(serve._stop.clear)
+        self.assertTrue(serve._stop.is_set())
+        response = self.client.post('/api/tasks', content_type='multipart/form-data', data={
+            'workflow_id': 'final.yaml', 'files': (BytesIO(b'pdf'), 'a.pdf')})
+        self.assertEqual(response.status_code, 503)
+
+        # A request that was already past the 503 check launches its task while the first one is drained
+        first = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(1)'])
+        late = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(1.5)'])
+        wait = first.wait
+        def wait_and_launch_late_task(timeout=None):
+            app_module._tasks_db['task_late'] = {'status': 'RUNNING'}
+            app_module._processes['task_late'] = late
+            return wait(timeout=timeout)
+        first.wait = wait_and_launch_late_task
+        with patch.object(app_module, '_work_queue', None), \
+                patch.dict(app_module._processes, {'task_first': first}, clear=True), \
+                patch.dict(app_module._tasks_db, {'task_first': {'status': 'RUNNING'}}, clear=True):
+            summary = app_module.drain_tasks(timeout=5)
+            self.assertEqual(summary, {'finished': 2, 'terminated': 0})
+            self.assertEqual(app_module._tasks_db['task_late']['status'], 'COMPLETED')
+
+    def test_finished_tasks_report_results_and_are_pruned(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'task_ok'))
+            with open(os.path.join(tmp, 'task_ok', 'work-items-out.json'), 'w') as f:
+                json.dump([{'payload': {'final_variables': {'claim': 'BX-1'}}}], f)
+            ok = subprocess.Popen([sys.executable, '-c', 'pass'])
+            failed = subprocess.Popen([sys.executable, '-c', 'raise SystemExit(1)'])
+            ok.wait(), failed.wait()
+            processes = {'task_ok': ok, 'task_failed': failed}
+            tasks = {'task_ok': {'status': 'RUNNING'}, 'task_failed': {'status': 'RUNNING'},
+                     'task_old': {'status': 'COMPLETED', 'finished_at': time.time() - 10 * 24 * 3600}}
+            with patch.object(app_module, '_work_queue', None), \
+                    patch.object(app_module, '_task_dir', lambda task_id: os.path.join(tmp, task_id)), \
+                    patch.dict(app_module._processes, processes, clear=True), \
+                    patch.dict(app_module._tasks_db, tasks, clear=True):
+                body = self.client.get('/api/tasks/task_ok').get_json()
+                self.assertEqual(body['status'], 'COMPLETED')
+                self.assertEqual(body['result']['outputs'][0]['payload']['final_variables'], {'claim': 'BX-1'})
+                self.assertEqual(self.client.get('/api/tasks/task_failed').get_json()['status'], 'FAILED')
+                self.assertEqual(app_module._processes, {})
+                app_module._prune_tasks()
+                self.assertEqual(sorted(app_module._tasks_db), ['task_failed', 'task_ok'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import tempfile
+
+# Add the project root to the path to import the profiler and the webapp
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.task_profiler import profile_task, profiling_options
+from webapp import app as app_module
+
+def busy_invoice_loop(n):
+    rows = []
+    for i in range(n):
+        rows.append({'invoice_number': str(i), 'amount': i * 1.5})
+    return sum(len(json.dumps(r)) for r in rows)
+
+class TaskProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_options_from_payload_and_env(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(profiling_options(None))
+            self.assertEqual(profiling_options(True)['interval_ms'], 10)
+            self.assertFalse(profiling_options({'memory': False})['memory'])
+            self.assertEqual(profiling_options({'memory': True})['memory'], 'rss')
+            with self.assertRaises(ValueError):
+                profiling_options({'memory': 'heap'})
+            with self.assertRaises(ValueError):
+                profiling_options({'sample_rate': 5})
+        with patch.dict(os.environ, {'TASK_PROFILING': 'true', 'TASK_PROFILING_INTERVAL_MS': '2'}):
+            self.assertEqual(profiling_options(None)['interval_ms'], 2)
+            self.assertIsNone(profiling_options(False)) # payload wins over the environment
+
+    def _profile(self, memory, n):
+        output_dir = os.path.join(self.tmp.name, 'profile', str(memory))
+        with profile_task({'interval_ms': 1, 'memory': memory, 'memory_frames': 10}, 'run_workflow', output_dir):
+            busy_invoice_loop(n)
+        with open(os.path.join(output_dir, 'summary.json')) as f:
+            return json.load(f)
+
+    def test_profile_writes_flamegraph_ready_output(self):
+        summary = self._profile('rss', 100000)
+        self.assertGreater(summary['samples'], 0)
+        self.assertGreater(summary['memory_peak_mb'], 0)
+        with open(summary['files']['cpu']) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any('busy_invoice_loop (test_task_profiler.py' in line for line in lines))
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(int(count) > 0 and ';' in stack)
+        self.assertTrue(os.path.exists(summary['files']['memory']))
+
+    def test_tracemalloc_mode_records_allocation_sites(self):
+        summary = self._profile('tracemalloc', 5000)
+        self.assertIn('memory_top', summary['files'])
+        self.assertTrue(os.path.getsize(summary['files']['memory']) > 0)
+
+    def test_task_status_links_profile_files(self):
+        profile_dir = os.path.join(self.tmp.name, 'task_1', 'profile', 'run_workflow')
+        os.makedirs(profile_dir)
+        with open(os.path.join(profile_dir, 'cpu.folded'), 'w') as f:
+            f.write('main;run 3\n')
+        with open(os.path.join(self.tmp.name, 'task_1', 'receipt.pdf'), 'w') as f:
+            f.write('private')
+        attempt_dir = os.path.join(self.tmp.name, 'task_1', 'attempt_2', 'profile', 'run_workflow')
+        os.makedirs(attempt_dir)
+        with open(os.path.join(attempt_dir, 'summary.json'), 'w') as f:
+            f.write('{}')
+        client = app_module.app.test_client()
+        with patch.object(app_module, '_work_queue', None), \
+                patch.object(app_module, '_task_dir', lambda task_id: os.path.join(self.tmp.name, task_id)), \
+                patch.dict(app_module._tasks_db, {'task_1': {'status': 'COMPLETED'}}):
+            body = client.get('/api/tasks/task_1').get_json()
+            self.assertEqual(sorted(f['name'] for f in body['profile_files']),
+                             ['attempt_2/profile/run_workflow/summary.json', 'profile/run_workflow/cpu.folded'])
+            for profile_file in body['profile_files']:
+                response = client.get(profile_file['url'])
+                self.assertIn(response.data, (b'main;run 3\n', b'{}'))
+                response.close()
+            self.assertEqual(client.get('/api/tasks/task_1/files/receipt.pdf').status_code, 404)
+            for escape in ('profile/../receipt.pdf', 'profile/%2e%2e/receipt.pdf', 'profile/run_workflow/../../receipt.pdf',
+                           'attempt_1/profile/../../receipt.pdf'):
+                response = client.get(f'/api/tasks/task_1/files/{escape}')
+                self.assertEqual(response.status_code, 404, escape)
+                self.assertNotIn(b'private', response.data)
+                response.close()
+
+if __name__ == '__main__':
+    unittest.main()
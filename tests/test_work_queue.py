@@ -0,0 +1,85 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the path to import the work queue
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.work_queue import WorkQueue, LeaseLostError, PENDING, LEASED, DONE, DEAD
+
+def drain_queue(db_path, worker_id):
+    """Leases and completes items until the queue is empty; used from several processes."""
+    queue = WorkQueue(db_path=db_path)
+    leased = []
+    while True:
+        item = queue.lease(worker_id)
+        if item is None:
+            return leased
+        leased.append(item['id'])
+        queue.complete(item['id'], worker_id)
+
+class WorkQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'queue.db')
+        self.review_dir = os.path.join(self.temp_dir, 'review_queue')
+        self.queue = WorkQueue(db_path=self.db_path, review_queue_dir=self.review_dir, max_attempts=2, backoff_base=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_lease_is_exclusive_until_completed(self):
+        item_id = self.queue.enqueue({'workflow_file': 'a.yaml'})
+        item = self.queue.lease('w1')
+        self.assertEqual(item['id'], item_id)
+        self.assertEqual(item['attempts'], 1)
+        self.assertIsNone(self.queue.lease('w2'))
+        with self.assertRaises(LeaseLostError):
+            self.queue.complete(item_id, 'w2')
+        self.queue.complete(item_id, 'w1', {'ok': True})
+        self.assertEqual(self.queue.get(item_id)['status'], DONE)
+        self.assertEqual(self.queue.get(item_id)['result'], {'ok': True})
+
+    def test_expired_lease_is_taken_over(self):
+        item_id = self.queue.enqueue({})
+        self.queue.lease('w1', visibility_timeout=0.01)
+        time.sleep(0.05)
+        item = self.queue.lease('w2')
+        self.assertEqual(item['id'], item_id)
+        self.assertEqual(item['lease_owner'], 'w2')
+        with self.assertRaises(LeaseLostError):
+            self.queue.extend_lease(item_id, 'w1')
+
+    def test_retries_then_dead_letters_into_review_queue(self):
+        item_id = self.queue.enqueue({'file_paths': ['x.pdf']})
+        self.queue.lease('w1')
+        self.queue.fail(item_id, 'w1', 'browser crashed')
+        self.assertEqual(self.queue.get(item_id)['status'], PENDING)
+
+        self.queue.lease('w1')
+        self.queue.fail(item_id, 'w1', 'browser crashed again')
+        self.assertEqual(self.queue.get(item_id)['status'], DEAD)
+        with open(os.path.join(self.review_dir, f'{item_id}.json')) as f:
+            review_item = json.load(f)
+        self.assertEqual(review_item['payload'], {'file_paths': ['x.pdf']})
+        self.assertEqual(review_item['exception']['message'], 'browser crashed again')
+        self.assertEqual(self.queue.stats(), {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 1})
+
+    def test_concurrent_workers_never_share_an_item(self):
+        for i in range(40):
+            self.queue.enqueue({'n': i})
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(drain_queue, [self.db_path] * 4, [f'w{i}' for i in range(4)]))
+        leased = [item_id for worker_items in results for item_id in worker_items]
+        self.assertEqual(len(leased), 40)
+        self.assertEqual(len(set(leased)), 40)
+
+if __name__ == '__main__':
+    unittest.main()
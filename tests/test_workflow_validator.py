@@ -0,0 +1,64 @@
+import unittest
+import os
+
+# Add the project root to the path to import the validator
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from src.workflow_validator import validate_workflow, validate_workflow_text, has_errors
+
+class WorkflowValidatorTestCase(unittest.TestCase):
+
+    def test_valid_workflow_with_loop_and_references(self):
+        workflow = {
+            'name': 'Valid',
+            'steps': [
+                {'action': 'ai_fill_reimbursement_excel', 'output_to': 'package',
+                 'params': {'receipt_files': '{{ input.file_paths }}', 'excel_template_path': 'a.xlsx'}},
+                {'action': 'loop', 'params': {'source_list': 'input.file_paths', 'loop_variable': 'receipt'},
+                 'steps': [
+                     {'action': 'browser_upload_file', 'params': {'file_path': '{{ receipt }}', 'selector': '#f'}},
+                 ]},
+                {'action': 'browser_upload_file',
+                 'params': {'file_path': '{{ package.filled_excel_path }}', 'selector': '#f'}},
+            ]
+        }
+        self.assertEqual(validate_workflow(workflow), [])
+
+    def test_reports_schema_reference_and_reachability_errors(self):
+        workflow = {
+            'steps': [
+                {'name': 'no value', 'action': 'browser_fill', 'params': {'selector': '#a'}},
+                {'name': 'unknown', 'action': 'browser_teleport'},
+                {'name': 'bad ref', 'action': 'browser_goto', 'params': {'url': '{{ later.url }}'}},
+                {'name': 'later', 'action': 'browser_evaluate', 'params': {'expression': '1'}, 'output_to': 'later'},
+                {'name': 'dead', 'action': 'extract_data'},
+                {'name': 'after dead', 'action': 'browser_goto', 'params': {'url': 'https://example.com'}},
+            ]
+        }
+        messages = [i['message'] for i in validate_workflow(workflow) if i['level'] == 'error']
+        self.assertTrue(any("Missing required parameter 'value'" in m for m in messages))
+        self.assertTrue(any("Unknown action 'browser_teleport'" in m for m in messages))
+        self.assertTrue(any("'later' is not 'input'" in m for m in messages))
+        self.assertTrue(any("unreachable" in m for m in messages))
+
+    def test_loop_steps_nested_under_params_are_rejected(self):
+        yaml_text = (
+            "steps:\n"
+            "  - action: loop\n"
+            "    params:\n"
+            "      source_list: input.file_paths\n"
+            "      loop_variable: item\n"
+            "      steps:\n"
+            "        - action: browser_click\n"
+            "          params: {selector: '#a'}\n"
+        )
+        self.assertTrue(has_errors(validate_workflow_text(yaml_text)))
+
+    def test_list_workflow_and_invalid_yaml(self):
+        self.assertTrue(has_errors(validate_workflow([{'action': 'browser_goto'}])))
+        self.assertTrue(has_errors(validate_workflow_text("steps: [")))
+
+if __name__ == '__main__':
+    unittest.main()
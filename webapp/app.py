@@ -4,79 +4,354 @@ import os
 # 将项目根目录添加到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, request, jsonify
+if __name__ == '__main__':
+    # 直接运行开发服务器时启用多进程指标，必须在导入 prometheus_client 之前
+    from src.metrics_config import configure_metrics_dir
+    configure_metrics_dir()
+
+from flask import Flask, Response, request, jsonify, send_from_directory
 import yaml
 import json
+import re
+import shlex
 import subprocess
+import threading
+import time
 from flask_cors import CORS
 from src.ai_services import generate_workflow_yaml
 from src.uivision_converter import convert_uivision_to_yaml
+from src.workflow_validator import validate_workflow_file, validate_workflow_text, has_errors, format_issue
+from src.work_queue import WorkQueue, PENDING, LEASED, DONE, DEAD
+from src.metrics import mark_process_dead, render_metrics, reset_metrics_dir
+from src.execution_profile import profile_names
+from src.idempotency import IdempotencyStore, submission_key, COMPLETED
+from src.document_reader import file_content_hash
+from src.task_profiler import PROFILE_DIR_NAME
+import hashlib
+from prometheus_client.core import GaugeMetricFamily
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
 CORS(app)
+# 超过上限的请求体直接返回 413，不会被完整读入
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', str(200 * 1024 * 1024)))
 
 _tasks_db = {}
 
+# 启用后任务写入持久化工作队列，由 robots/queue_worker.py 启动的 worker 执行，而不是每个请求一个子进程
+_work_queue = WorkQueue() if os.getenv('WORK_QUEUE_ENABLED', 'false').lower() == 'true' else None
+_QUEUE_STATUS = {PENDING: 'PENDING', LEASED: 'RUNNING', DONE: 'COMPLETED', DEAD: 'FAILED'}
+# 重复提交同一批票据时复用已有任务，而不是再启动一次浏览器流程
+_idempotency = IdempotencyStore() if os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() == 'true' else None
+_processes = {} # task_id -> 非队列模式下仍在运行的执行器子进程，结束后移除
+# 非队列模式下已结束的任务在内存中保留的秒数，之后从 _tasks_db 中清除
+TASK_RETENTION_SECONDS = float(os.getenv('TASK_RETENTION_SECONDS', str(24 * 3600)))
+_shutting_down = threading.Event() # 停机排空期间拒绝新任务
+
+def _task_status(task_id):
+    """返回任务状态（PENDING/RUNNING/COMPLETED/FAILED），任务不存在时返回 None。"""
+    if _work_queue is not None:
+        item = _work_queue.get(task_id)
+        return _QUEUE_STATUS[item['status']] if item else None
+    task = _tasks_db.get(task_id)
+    if task is None:
+        return None
+    process = _processes.get(task_id)
+    if process is not None and task['status'] == 'RUNNING':
+        returncode = process.poll()
+        if returncode is not None:
+            _finish_task(task_id, 'COMPLETED' if returncode == 0 else 'FAILED')
+    return task['status']
+
+def _finish_task(task_id, status):
+    """记录非队列任务的最终状态；成功的任务附带执行器写出的输出工作项，与队列模式的 result 一致。"""
+    task = _tasks_db[task_id]
+    task['status'] = status
+    task['finished_at'] = time.time()
+    process = _processes.pop(task_id, None)
+    if process is not None:
+        mark_process_dead(process.pid)
+    output_path = os.path.join(_task_dir(task_id), 'work-items-out.json')
+    if status == 'COMPLETED' and os.path.exists(output_path):
+        with open(output_path, 'r', encoding='utf-8') as f:
+            task['result'] = {'outputs': json.load(f)}
+
+def _prune_tasks():
+    """清除超过保留时间的已结束任务，避免长期运行的 API 进程内存不断增长。"""
+    cutoff = time.time() - TASK_RETENTION_SECONDS
+    for task_id, task in list(_tasks_db.items()):
+        if task.get('finished_at') is not None and task['finished_at'] < cutoff:
+            del _tasks_db[task_id]
+
+def _upload_hash(uploaded_file):
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: uploaded_file.stream.read(1024 * 1024), b''):
+        sha256.update(chunk)
+    uploaded_file.stream.seek(0)
+    return sha256.hexdigest()
+
 @app.route('/api/tasks', methods=['POST'])
 def start_task():
     try:
         workflow_id = request.form.get('workflow_id')
         uploaded_files = request.files.getlist('files') # 接收文件列表
+        execution_profile = request.form.get('execution_profile') # 可选：debug / production / benchmark
+        profiling = request.form.get('profiling', 'false').lower() == 'true' # 可选：对本次运行做采样分析
 
+        if _shutting_down.is_set():
+            return jsonify({'success': False, 'error': '服务正在停机，请稍后重试'}), 503
+        _prune_tasks()
         if not workflow_id or not uploaded_files:
             return jsonify({'success': False, 'error': '缺少 workflow_id 或上传的文件'}), 400
+        if execution_profile and execution_profile not in profile_names():
+            return jsonify({'success': False, 'error': f"未知的执行配置档 '{execution_profile}'，可选: {', '.join(profile_names())}"}), 400
 
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         workflow_path = os.path.join(project_root, 'workflows', workflow_id)
-        
+
+        # 预检工作流，错误的工作流不占用执行器和浏览器
+        issues = validate_workflow_file(workflow_path)
+        if has_errors(issues):
+            return jsonify({
+                'success': False,
+                'error': '工作流校验失败: ' + '; '.join(format_issue(i) for i in issues if i['level'] == 'error'),
+                'issues': issues
+            }), 400
+
         task_id = f"task_{os.urandom(8).hex()}"
-        work_item_dir = os.path.join(project_root, 'devdata', 'running_work_items', task_id)
-        os.makedirs(work_item_dir, exist_ok=True)
-
-        saved_file_paths = []
-        work_item_files = {}
-        for f in uploaded_files:
-            # 保存文件到工作项目录
-            saved_path = os.path.join(work_item_dir, f.filename)
-            f.save(saved_path)
-            saved_file_paths.append(saved_path) # 使用绝对路径
-            work_item_files[f.filename] = f.filename
-
-        # 创建工作项 payload
-        work_item = {
-            "payload": {
-                'workflow_file': workflow_path,
-                'file_paths': saved_file_paths # 传递文件路径列表
-            },
-            "files": work_item_files
-        }
-        with open(os.path.join(work_item_dir, 'work-items.json'), 'w') as f:
-            json.dump([work_item], f)
-
-        # 设置并执行 Robocorp 任务
-        task_env = os.environ.copy()
-        task_env['RC_WORKITEM_INPUT_PATH'] = os.path.join(work_item_dir, 'work-items.json')
-        
-        command = [
-            sys.executable, '-m', 'robocorp.tasks',
-            'run', os.path.join(project_root, 'robots', 'workflow_executor.py'),
-            '--task', 'run_workflow'
-        ]
-        
-        subprocess.Popen(command, cwd=project_root, env=task_env)
-
-        _tasks_db[task_id] = {'status': 'RUNNING'}
-
-        return jsonify({
-            'success': True, 
-            'message': f'任务 {task_id} 已成功启动，包含 {len(saved_file_paths)} 个文件', 
+        idempotency_key = None
+        if _idempotency is not None:
+            client_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+            if client_key:
+                idempotency_key = f"client:{client_key}"
+            else:
+                idempotency_key = submission_key(file_content_hash(workflow_path), [_upload_hash(f) for f in uploaded_files],
+                                                 {'execution_profile': execution_profile, 'profiling': profiling})
+            claim = _idempotency.claim(idempotency_key, task_id, _task_status)
+            if claim['reused']:
+                existing_id = claim['task_id']
+                response = {
+                    'success': True,
+                    'message': f'重复提交，已关联到任务 {existing_id}',
+                    'task_id': existing_id,
+                    'duplicate': True,
+                    'status': claim['status']
+                }
+                if claim['status'] == COMPLETED:
+                    response['result'] = (_work_queue.get(existing_id)['result'] if _work_queue is not None
+                                          else _tasks_db[existing_id].get('result'))
+                return jsonify(response)
+
+        try:
+            return jsonify(_launch_task(task_id, project_root, workflow_path, uploaded_files, execution_profile, profiling))
+        except Exception:
+            if idempotency_key:
+                _idempotency.release(idempotency_key, task_id)
+            raise
+
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    return jsonify({'success': False, 'error': f'上传内容超过上限 {limit_mb:.0f} MB (MAX_UPLOAD_BYTES)'}), 413
+
+def begin_shutdown():
+    """开始停机：之后提交的任务返回 503，进行中的请求和任务不受影响。"""
+    _shutting_down.set()
+
+def drain_tasks(timeout: float) -> dict:
+    """
+    停机时调用：不再接受新任务，等待本进程启动的执行器子进程结束。
+    超过 timeout 秒仍未结束的子进程会被终止并标记为 FAILED。队列模式下任务由 worker 负责，无需等待。
+    """
+    begin_shutdown()
+    deadline = time.monotonic() + timeout
+    finished, terminated = 0, 0
+    handled = set()
+    while True:
+        # 每轮重新取快照：停机前最后几个请求可能刚刚启动了子进程
+        running = [(task_id, process) for task_id, process in list(_processes.items())
+                   if task_id not in handled and _task_status(task_id) == 'RUNNING']
+        if not running:
+            break
+        task_id, process = running[0]
+        handled.add(task_id)
+        try:
+            process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            _task_status(task_id)
+            finished += 1
+        except subprocess.TimeoutExpired:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            _finish_task(task_id, 'FAILED')
+            terminated += 1
+    return {'finished': finished, 'terminated': terminated}
+
+def _launch_task(task_id, project_root, workflow_path, uploaded_files, execution_profile, profiling=False):
+    """保存上传文件并把任务加入队列或启动执行器子进程，返回响应内容。"""
+    work_item_dir = os.path.join(project_root, 'devdata', 'running_work_items', task_id)
+    os.makedirs(work_item_dir, exist_ok=True)
+
+    saved_file_paths = []
+    work_item_files = {}
+    for f in uploaded_files:
+        # 保存文件到工作项目录
+        saved_path = os.path.join(work_item_dir, f.filename)
+        f.save(saved_path)
+        saved_file_paths.append(saved_path) # 使用绝对路径
+        work_item_files[f.filename] = f.filename
+
+    payload = {
+        'workflow_file': workflow_path,
+        'file_paths': saved_file_paths # 传递文件路径列表
+    }
+    if execution_profile:
+        payload['execution_profile'] = execution_profile
+    if profiling:
+        payload['profiling'] = True
+
+    if _work_queue is not None:
+        _work_queue.enqueue(payload, item_id=task_id)
+        return {
+            'success': True,
+            'message': f'任务 {task_id} 已加入队列，包含 {len(saved_file_paths)} 个文件',
             'task_id': task_id
-        })
+        }
+
+    # 创建工作项 payload
+    work_item = {
+        "payload": payload,
+        "files": work_item_files
+    }
+    with open(os.path.join(work_item_dir, 'work-items.json'), 'w') as f:
+        json.dump([work_item], f)
+
+    # 设置并执行 Robocorp 任务
+    task_env = os.environ.copy()
+    task_env['RC_WORKITEM_INPUT_PATH'] = os.path.join(work_item_dir, 'work-items.json')
+    task_env['RC_WORKITEM_OUTPUT_PATH'] = os.path.join(work_item_dir, 'work-items-out.json')
+    
+    command = [
+        sys.executable, '-m', 'robocorp.tasks',
+        'run', os.path.join(project_root, 'robots', 'workflow_executor.py'),
+        '--task', 'run_workflow'
+    ]
+    if os.getenv('EXECUTOR_COMMAND'):
+        # 负载测试等场景下用替身执行器代替真实的浏览器流程（见 benchmarks/load_test.py）
+        command = shlex.split(os.environ['EXECUTOR_COMMAND'])
+    
+    _processes[task_id] = subprocess.Popen(command, cwd=project_root, env=task_env)
+
+    _tasks_db[task_id] = {'status': 'RUNNING'}
+
+    return {
+        'success': True, 
+        'message': f'任务 {task_id} 已成功启动，包含 {len(saved_file_paths)} 个文件', 
+        'task_id': task_id
+    }
+
+@app.route('/api/workflows/<workflow_id>', methods=['PUT'])
+def save_workflow(workflow_id):
+    try:
+        project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        workflows_dir = os.path.join(project_root, 'workflows')
+        workflow_path = os.path.join(workflows_dir, os.path.basename(workflow_id))
+        yaml_content = request.get_data(as_text=True)
+
+        # 保存前校验，避免把无法执行的工作流写入磁盘
+        issues = validate_workflow_text(yaml_content)
+        if has_errors(issues):
+            return jsonify({
+                'success': False,
+                'error': '工作流校验失败: ' + '; '.join(format_issue(i) for i in issues if i['level'] == 'error'),
+                'issues': issues
+            }), 400
+
+        with open(workflow_path, 'w', encoding='utf-8') as f:
+            f.write(yaml_content)
+        return jsonify({'success': True, 'message': f'工作流 {workflow_id} 已保存', 'issues': issues})
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _task_dir(task_id):
+    return os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+                        'devdata', 'running_work_items', os.path.basename(task_id))
+
+def _profile_files(task_id):
+    """任务目录中由 src/task_profiler.py 写出的分析结果（队列模式下每次尝试各有一份）。"""
+    task_dir = _task_dir(task_id)
+    files = []
+    for root, _, names in os.walk(task_dir):
+        if PROFILE_DIR_NAME not in os.path.relpath(root, task_dir).split(os.sep):
+            continue
+        for name in sorted(names):
+            rel_path = os.path.relpath(os.path.join(root, name), task_dir).replace(os.sep, '/')
+            files.append({'name': rel_path, 'url': f'/api/tasks/{task_id}/files/{rel_path}'})
+    return files
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+def get_task_status(task_id):
+    if _work_queue is not None:
+        item = _work_queue.get(task_id)
+        if item is None:
+            return jsonify({'success': False, 'error': f'任务 {task_id} 不存在'}), 404
+        response = {
+            'success': True,
+            'task_id': task_id,
+            'status': _QUEUE_STATUS[item['status']],
+            'attempts': item['attempts'],
+            'error': item['last_error'],
+            'result': item['result']
+        }
+    else:
+        if _task_status(task_id) is None:
+            return jsonify({'success': False, 'error': f'任务 {task_id} 不存在'}), 404
+        response = {'success': True, 'task_id': task_id, **_tasks_db[task_id]}
+    profile_files = _profile_files(task_id)
+    if profile_files:
+        response['profile_files'] = profile_files
+    return jsonify(response)
+
+@app.route('/api/tasks/<task_id>/files/<path:file_path>', methods=['GET'])
+def get_task_file(task_id, file_path):
+    # 只提供分析结果，不暴露上传的票据：路径必须是 profile/... 或 attempt_<n>/profile/...，
+    # 并以 profile 目录为根交给 send_from_directory，'..' 无法离开该目录
+    parts = file_path.split('/')
+    if '..' in parts or '\\' in file_path:
+        return jsonify({'success': False, 'error': '文件不存在'}), 404
+    if len(parts) > 2 and re.fullmatch(r'attempt_\d+', parts[0]) and parts[1] == PROFILE_DIR_NAME:
+        profile_root, rel_path = os.path.join(_task_dir(task_id), parts[0], PROFILE_DIR_NAME), parts[2:]
+    elif len(parts) > 1 and parts[0] == PROFILE_DIR_NAME:
+        profile_root, rel_path = os.path.join(_task_dir(task_id), PROFILE_DIR_NAME), parts[1:]
+    else:
+        return jsonify({'success': False, 'error': '文件不存在'}), 404
+    return send_from_directory(profile_root, '/'.join(rel_path))
+
+class WorkQueueCollector:
+    """抓取时从工作队列读取各状态的任务数量。"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily('llmrpa_work_queue_items', 'Work queue items by status.', labels=['status'])
+        for status, count in _work_queue.stats().items():
+            gauge.add_metric([status], count)
+        yield gauge
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    collectors = [WorkQueueCollector()] if _work_queue is not None else []
+    body, content_type = render_metrics(collectors)
+    return Response(body, content_type=content_type)
+
 # ... (保留所有其他 API 端点，如 get_workflows, get_task_status 等)
 
 if __name__ == '__main__':
+    reset_metrics_dir()
     app.run(debug=True, port=5001)
\ No newline at end of file
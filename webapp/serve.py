@@ -0,0 +1,105 @@
+"""
+后端 API 的生产服务入口（`app.run(debug=True)` 仅用于开发）。
+
+    python webapp/serve.py --host 0.0.0.0 --port 5001 --threads 16
+
+使用 waitress 多线程 WSGI 服务器：
+- 请求体由服务器的 I/O 线程异步接收（超过 512 KB 的部分缓存在临时文件中），完整到达后才交给工作线程，
+  慢速的大文件上传不会占用处理线程，也不会阻塞其他请求；
+- 请求体上限为 `MAX_UPLOAD_BYTES`（默认 200 MB），服务器和 Flask 两层都会拒绝超限的请求；
+- 收到 SIGTERM/SIGINT 后立即对新提交的任务返回 503，停止接受连接，等待进行中的请求完成，再等待已启动的
+  执行器子进程结束。两个阶段共用 `--drain-timeout` 秒，超时的任务会被终止并标记为 FAILED。
+
+任务状态保存在进程内存中，因此只运行一个进程、用线程处理并发。需要多个服务进程（或多台机器）时，
+请设置 `WORK_QUEUE_ENABLED=true`，任务状态由共享的工作队列保存。
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.metrics_config import configure_metrics_dir
+configure_metrics_dir() # 必须在导入 prometheus_client（经由 webapp.app）之前
+
+from webapp.app import app, begin_shutdown, drain_tasks
+from src.metrics import reset_metrics_dir
+
+logging.basicConfig(level=logging.INFO)
+
+
+_stop = threading.Event()
+
+
+def _stop_on_signal(signum, frame):
+    begin_shutdown() # 信号到达时就拒绝新任务，而不是等服务器关闭之后
+    _stop.set()
+
+
+def _serving_requests(server) -> bool:
+    """是否还有请求在排队、处理中，或响应尚未发送完。"""
+    dispatcher = server.task_dispatcher
+    if dispatcher.active_count or dispatcher.queue:
+        return True
+    return any(channel.requests or channel.request is not None or channel.total_outbufs_len
+               for channel in list(server.active_channels.values()))
+
+
+def _loop(server, timeout):
+    server.asyncore.loop(timeout=timeout, map=server._map, use_poll=server.adj.asyncore_use_poll, count=1)
+
+
+def _drain_requests(server, deadline):
+    """停止接受连接，继续驱动 I/O 直到进行中的请求完成或到达 deadline。"""
+    server.accepting = False
+    while _serving_requests(server) and time.monotonic() < deadline:
+        _loop(server, 0.1)
+    # waitress 自带的 shutdown 只等 5 秒，这里按剩余的排空时间等待工作线程
+    server.task_dispatcher.shutdown(timeout=max(0.0, deadline - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the web API with a production WSGI server.")
+    parser.add_argument('--host', default=os.getenv('WEB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('WEB_PORT', '5001')))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', '16')),
+                        help="Worker threads handling requests concurrently.")
+    parser.add_argument('--drain-timeout', type=float, default=float(os.getenv('WEB_DRAIN_TIMEOUT', '300')),
+                        help="Seconds to wait for running tasks on shutdown before terminating them.")
+    args = parser.parse_args()
+
+    from waitress.server import create_server
+
+    reset_metrics_dir()
+    server = create_server(
+        app,
+        host=args.host,
+        port=args.port,
+        threads=args.threads,
+        max_request_body_size=app.config['MAX_CONTENT_LENGTH'],
+        channel_timeout=120,
+        ident='llmrpa',
+    )
+    signal.signal(signal.SIGTERM, _stop_on_signal)
+    signal.signal(signal.SIGINT, _stop_on_signal)
+    logging.info(f"Serving on http://{args.host}:{args.port} with {args.threads} threads")
+    while not _stop.is_set():
+        _loop(server, server.adj.asyncore_loop_timeout)
+
+    deadline = time.monotonic() + args.drain_timeout
+    logging.info(f"Draining requests and running tasks (timeout {args.drain_timeout:.0f}s)...")
+    try:
+        _drain_requests(server, deadline)
+    finally:
+        server.close()
+        # 请求线程已停止，drain_tasks 会重新读取子进程列表，包括最后几个请求刚启动的任务
+        summary = drain_tasks(max(0.0, deadline - time.monotonic()))
+        logging.info(f"Shutdown complete: {summary['finished']} task(s) finished, {summary['terminated']} terminated")
+
+
+if __name__ == '__main__':
+    main()